@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Buffered activity_logs writer and retention settings.
+
+log_activity() hands its document to ActivityLogWriter.write(), which only
+puts it on a bounded queue. A background thread drains the queue with
+insert_many every batch_size entries or flush_interval seconds, whichever
+comes first, and the queue is flushed when the process exits. When the queue
+is full, entries are counted as dropped instead of blocking the request.
+
+Retention: ensure_retention(collection, ttl_days) keeps a TTL index on
+timestamp so MongoDB expires old entries; 0 removes it. A capped collection
+is the alternative for a fixed disk budget; converting is a one-off
+(it locks the collection while copying).
+
+Usage:
+    python activity_log.py stats
+    python activity_log.py cap <size_mb>
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+TTL_INDEX_NAME = 'timestamp_ttl'
+
+class ActivityLogWriter:
+    """Bounded, non-blocking queue of documents inserted in batches by a background thread"""
+
+    def __init__(self, collection, queue_size=10000, batch_size=100, flush_interval=0.5):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked worker (threads do not survive fork)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, doc):
+        """Queue one document; never blocks (counts it as dropped when the queue is full)"""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _insert(self, batch):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.error(f"Error writing {len(batch)} activity log entries: {e}")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                doc = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                doc = False  # flush interval elapsed
+            if doc is None:  # close()
+                if batch:
+                    self._insert(batch)
+                return
+            if doc is not False:
+                batch.append(doc)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or doc is False):
+                self._insert(batch)
+                batch = []
+                deadline = None
+
+    def close(self, timeout=5):
+        """Flush what is queued and stop the thread (registered with atexit)"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batch_size': self.batch_size,
+            'flush_interval_ms': int(self.flush_interval * 1000)
+        }
+
+class SyncActivityLogWriter:
+    """Same interface, inserting in the calling thread (ACTIVITY_LOG_ASYNC=0)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.written = 0
+
+    def write(self, doc):
+        self.collection.insert_one(doc)
+        self.written += 1
+
+    def close(self, timeout=5):
+        pass
+
+    def stats(self):
+        return {'queued': 0, 'written': self.written, 'dropped': 0, 'failed': 0}
+
+def ensure_retention(collection, ttl_days):
+    """Keep a TTL index expiring entries ttl_days after their timestamp (0 drops it)"""
+    existing = collection.index_information().get(TTL_INDEX_NAME)
+    if not ttl_days:
+        if existing:
+            collection.drop_index(TTL_INDEX_NAME)
+        return
+    seconds = int(ttl_days * 86400)
+    if not existing:
+        collection.create_index('timestamp', name=TTL_INDEX_NAME, expireAfterSeconds=seconds)
+    elif existing.get('expireAfterSeconds') != seconds:
+        collection.database.command('collMod', collection.name,
+                                    index={'name': TTL_INDEX_NAME, 'expireAfterSeconds': seconds})
+
+def convert_to_capped(collection, size_mb):
+    """One-off conversion of the collection to a capped collection of size_mb"""
+    collection.database.command('convertToCapped', collection.name, size=int(size_mb * 1024 * 1024))
+
+if __name__ == '__main__':
+    os.environ['ENSURE_INDEXES'] = '0'
+    from app import db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'stats':
+        stats = db.command('collStats', 'activity_logs')
+        ttl = db.activity_logs.index_information().get(TTL_INDEX_NAME)
+        ttl_days = f"{ttl['expireAfterSeconds'] / 86400:g} days" if ttl else '-'
+        print(f"documents: {stats.get('count')}, size: {stats.get('size', 0) / 1024 / 1024:.1f} MB, "
+              f"capped: {stats.get('capped', False)}, ttl: {ttl_days}")
+    elif command == 'cap' and len(sys.argv) > 2:
+        convert_to_capped(db.activity_logs, float(sys.argv[2]))
+        print(f"activity_logs is now capped at {sys.argv[2]} MB")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -1,34 +1,33 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, session
+from flask import Flask, request, jsonify, render_template, send_from_directory, send_file, session, g, has_app_context, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
-from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne, ReturnDocument
+from bson import ObjectId, json_util
 from datetime import datetime, timedelta
 import urllib.parse
 import logging
 import os
 import uuid
 import hashlib
+import base64
+import threading
+import time
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
-from functools import wraps
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
+from functools import wraps, lru_cache
+from itertools import islice
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+import tempfile
+import gzip
+import json
+from db_indexes import ensure_indexes
+from bill_pdf import BillPdfCache, bill_content_hash
+from activity_log import ActivityLogWriter, SyncActivityLogWriter, ensure_retention
+from search_index import SEARCH_KEY_FIELDS, search_fields, search_query, reindex_document, backfill as backfill_search_keys
+from instrumentation import setup_logging, init_access_log, MongoMetrics
+from database import MongoConnection, LazyDatabase, LazyCollection, mongo_client_options
+
+# Configure logging: records go through a queue and are written by a listener thread (see instrumentation.py)
+setup_logging(level=os.getenv('LOG_LEVEL', 'INFO').upper(), log_file=os.getenv('LOG_FILE', 'app.log'))
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
@@ -52,15 +51,29 @@ else:
     # Extract DB name from URI if possible, or use default
     MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'hospital_management')
 
-# Connect to MongoDB
-try:
-    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=10000)
-    client.server_info()  # Test connection
-    db = client[MONGODB_DB_NAME]
-    logging.info(f"✓ Successfully connected to MongoDB Atlas database '{MONGODB_DB_NAME}'")
-except Exception as e:
-    logging.error(f"✗ MongoDB connection error: {e}")
-    raise
+# Every Mongo command is counted against the endpoint that issued it (see /api/admin/metrics);
+# a request issuing more than MONGO_QUERY_BUDGET commands logs a warning (0 disables)
+mongo_metrics = MongoMetrics(query_budget=int(os.getenv('MONGO_QUERY_BUDGET', 50)))
+
+# The MongoClient is created on first use in each process (see database.py), so the app can be
+# served by a pre-fork server; create_app() checks the connection and runs the startup tasks.
+# Pool size and timeouts: MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_*_TIMEOUT_MS
+mongo = MongoConnection(MONGODB_URI, MONGODB_DB_NAME, event_listeners=[mongo_metrics], **mongo_client_options())
+db = LazyDatabase(mongo)
+
+# Activity log writes are queued and inserted in batches by a background thread (see activity_log.py);
+# ACTIVITY_LOG_ASYNC=0 inserts in the request instead
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+ACTIVITY_LOG_FLUSH_MS = int(os.getenv('ACTIVITY_LOG_FLUSH_MS', 500))
+ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+ACTIVITY_LOG_TTL_DAYS = float(os.getenv('ACTIVITY_LOG_TTL_DAYS', 0))  # 0 keeps entries forever
+
+if os.getenv('ACTIVITY_LOG_ASYNC', '1') != '0':
+    activity_log_writer = ActivityLogWriter(LazyCollection(db, 'activity_logs'), queue_size=ACTIVITY_LOG_QUEUE_SIZE,
+                                            batch_size=ACTIVITY_LOG_BATCH_SIZE,
+                                            flush_interval=ACTIVITY_LOG_FLUSH_MS / 1000)
+else:
+    activity_log_writer = SyncActivityLogWriter(LazyCollection(db, 'activity_logs'))
 
 # Helper function to convert ObjectId to string
 def serialize_doc(doc):
@@ -72,6 +85,9 @@ def serialize_doc(doc):
         doc = doc.copy()
         if '_id' in doc:
             doc['id'] = str(doc.pop('_id'))
+        # Search keys are internal (see search_index.py)
+        for field in SEARCH_KEY_FIELDS:
+            doc.pop(field, None)
         # Convert any ObjectId fields to strings
         for key, value in doc.items():
             if isinstance(value, ObjectId):
@@ -88,6 +104,303 @@ def parse_object_id(id_str):
     except:
         return None
 
+# ==================== REFERENCE CACHE ====================
+
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))  # seconds
+REFERENCE_CACHE_SIZE = int(os.getenv('REFERENCE_CACHE_SIZE', 5000))  # entries per collection
+
+_MISSING = object()
+
+class ReferenceCache:
+    """Thread-safe LRU cache with a per-entry TTL. Stores None for ids that do not exist."""
+
+    def __init__(self, name, max_size=REFERENCE_CACHE_SIZE, ttl=REFERENCE_CACHE_TTL):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value, or _MISSING if absent or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """Drop one key, or the whole cache when key is None"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+# doctors and charge_master are keyed by _id, doctor_charges by (doctor_id, charge_master_id).
+# charge_category_master is only listed as a whole and relies on its ETag (reference_etag) instead.
+reference_caches = {
+    'doctors': ReferenceCache('doctors'),
+    'charge_master': ReferenceCache('charge_master'),
+    'doctor_charges': ReferenceCache('doctor_charges')
+}
+
+def get_reference_docs(collection, ids):
+    """
+    Return {id: doc} for a cached reference collection, loading misses with one $in query.
+    Returned documents are shared with the cache and must not be mutated.
+    Returns (docs, queries_issued).
+    """
+    reference_versions.get(collection)  # clears the cache after another worker's write
+    cache = reference_caches[collection]
+    found = {}
+    missing = []
+    for ref_id in set(ids):
+        doc = cache.get(ref_id)
+        if doc is _MISSING:
+            missing.append(ref_id)
+        elif doc is not None:
+            found[ref_id] = doc
+    if not missing:
+        return found, 0
+    loaded = {doc['_id']: doc for doc in db[collection].find({'_id': {'$in': missing}})}
+    for ref_id in missing:
+        doc = loaded.get(ref_id)
+        cache.set(ref_id, doc)
+        if doc is not None:
+            found[ref_id] = doc
+    return found, 1
+
+def get_reference_doc(collection, ref_id):
+    """Single cached lookup by _id (None if not found)"""
+    if not isinstance(ref_id, (ObjectId, str)) or not ref_id:
+        return None
+    docs, _ = get_reference_docs(collection, [ref_id])
+    return docs.get(ref_id)
+
+def get_doctor_rate_docs(pairs):
+    """
+    Return {(doctor_id, charge_master_id): doctor_charges doc} for the given pairs,
+    loading all cache misses with a single query.
+    """
+    reference_versions.get('doctor_charges')  # clears the cache after another worker's write
+    cache = reference_caches['doctor_charges']
+    found = {}
+    missing = set()
+    for pair in set(pairs):
+        doc = cache.get(pair)
+        if doc is _MISSING:
+            missing.add(pair)
+        elif doc is not None:
+            found[pair] = doc
+    if missing:
+        loaded = {}
+        for doc in db.doctor_charges.find({
+            'doctor_id': {'$in': list({d for d, _ in missing})},
+            'charge_master_id': {'$in': list({c for _, c in missing})}
+        }):
+            # Keep the first match per pair, like find_one
+            loaded.setdefault((doc.get('doctor_id'), doc.get('charge_master_id')), doc)
+        for pair in missing:
+            doc = loaded.get(pair)
+            cache.set(pair, doc)
+            if doc is not None:
+                found[pair] = doc
+    return found
+
+def invalidate_reference(collection, ref_id=None):
+    """Called by write handlers of the versioned collections (reference collections and users)"""
+    try:
+        reference_versions.bump(collection)
+    except Exception as e:
+        logging.error(f"Error bumping {collection} version: {e}")
+    cache = reference_versions.caches.get(collection)
+    if not cache:
+        return
+    if collection == 'doctor_charges':
+        # Rates are keyed by (doctor, charge)
+        cache.invalidate()
+    else:
+        cache.invalidate(ref_id)
+
+# ==================== REFERENCE VERSIONS ====================
+
+REFERENCE_VERSION_TTL = float(os.getenv('REFERENCE_VERSION_TTL', 2))  # seconds
+
+class ReferenceVersions:
+    """
+    Per-collection version counters (reference_versions collection), bumped by
+    invalidate_reference on every write. Each worker trusts its copy for ttl seconds,
+    so conditional GETs are answered without a query; a write made through another
+    worker is seen within ttl. Tokens are '<epoch>.<version>', the epoch being set
+    when the counter is created, so a recreated counter never repeats an old token.
+    caches maps collections to their per-process ReferenceCache; it is cleared when a
+    version shows up that this process did not produce, so a new ETag is never served
+    with a document cached before another worker's write.
+    """
+
+    def __init__(self, caches, ttl=REFERENCE_VERSION_TTL):
+        self.caches = dict(caches)
+        self.ttl = ttl
+        self._local = {}  # collection -> (epoch, version, expires)
+        self._lock = threading.Lock()
+
+    def _store(self, doc, own_bump=False):
+        stale = False
+        with self._lock:
+            current = self._local.get(doc['_id'])
+            # A slow read must not overwrite a newer bump
+            if current is None or current[0] != doc['epoch'] or current[1] <= doc['version']:
+                # Anything but the version last seen (plus our own bump) means writes this
+                # process has not invalidated for; on the first read, the cache predates it
+                known = current is not None and current[0] == doc['epoch']
+                stale = not known or doc['version'] > current[1] + own_bump
+                current = (doc['epoch'], doc['version'], time.monotonic() + self.ttl)
+                self._local[doc['_id']] = current
+        if stale and doc['_id'] in self.caches:
+            self.caches[doc['_id']].invalidate()
+        return f'{current[0]}.{current[1]}'
+
+    def get(self, collection):
+        entry = self._local.get(collection)
+        if entry and entry[2] > time.monotonic():
+            return f'{entry[0]}.{entry[1]}'
+        doc = db.reference_versions.find_one({'_id': collection})
+        if doc is None:
+            doc = db.reference_versions.find_one_and_update(
+                {'_id': collection},
+                {'$setOnInsert': {'epoch': uuid.uuid4().hex[:8], 'version': 0}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        return self._store(doc)
+
+    def bump(self, collection):
+        doc = db.reference_versions.find_one_and_update(
+            {'_id': collection},
+            {'$inc': {'version': 1}, '$setOnInsert': {'epoch': uuid.uuid4().hex[:8]}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        # The caller invalidates what it wrote (invalidate_reference)
+        return self._store(doc, own_bump=True)
+
+reference_versions = ReferenceVersions(reference_caches)
+
+def reference_etag(*collections):
+    """
+    Weak ETag for GETs that only read the given reference collections: their versions
+    plus a hash of the path and query string. A matching If-None-Match is answered with
+    304 before the handler (or Mongo) runs.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                versions = '-'.join(reference_versions.get(collection) for collection in collections)
+            except Exception as e:
+                logging.error(f"Error reading reference versions: {e}")
+                return f(*args, **kwargs)
+            etag = f"{versions}-{hashlib.sha1(request.full_path.encode()).hexdigest()[:12]}"
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'  # cache, but revalidate every time
+            return response
+        return decorated_function
+    return decorator
+
+# ==================== REFERENCE RESOLVER ====================
+
+def _record_resolver_savings(queries, saved):
+    """Accumulate resolver stats for the current request (reported in after_request)"""
+    if not has_app_context():
+        return
+    stats = g.setdefault('resolver_stats', {'queries': 0, 'saved': 0})
+    stats['queries'] += queries
+    stats['saved'] += saved
+
+def fetch_reference_map(collection, ids, projection=None, row_count=None):
+    """
+    Fetch all referenced documents of a collection with a single $in query.
+    Returns a dict keyed by _id. row_count is the number of per-row find_one
+    calls this replaces (defaults to len(ids)) and is used for reporting.
+    """
+    ids = list(ids)
+    if row_count is None:
+        row_count = len(ids)
+    unique_ids = list({i for i in ids if isinstance(i, (ObjectId, str)) and i})
+    if not unique_ids:
+        _record_resolver_savings(0, row_count)
+        return {}
+    if collection in reference_caches:
+        # Small reference collections are served from the process-wide cache
+        docs, queries = get_reference_docs(collection, unique_ids)
+        _record_resolver_savings(queries, row_count - queries)
+        return docs
+    docs = db[collection].find({'_id': {'$in': unique_ids}}, projection)
+    _record_resolver_savings(1, max(row_count - 1, 0))
+    return {doc['_id']: doc for doc in docs}
+
+def resolve_references(docs, id_field, collection, fields, default=None):
+    """
+    Populate fields on a page of documents from a referenced collection.
+    fields maps target key -> source key on the referenced document, e.g.
+    resolve_references(apts, 'patient_id', 'patients', {'patient_name': 'name'}).
+    When default is given, target keys are set to it for unresolved rows
+    (matching handlers that fall back to 'Unknown'); otherwise they are left unset.
+    """
+    rows = [doc for doc in docs if id_field in doc]
+    ref_map = fetch_reference_map(
+        collection,
+        (doc[id_field] for doc in rows),
+        projection={source: 1 for source in fields.values()},
+        row_count=len(rows)
+    )
+    for doc in docs:
+        ref = ref_map.get(doc.get(id_field)) if isinstance(doc.get(id_field), (ObjectId, str)) else None
+        if ref:
+            for target, source in fields.items():
+                doc[target] = ref.get(source, default if default is not None else '')
+        elif default is not None:
+            for target in fields:
+                doc[target] = default
+    return docs
+
 def is_case_closed(case_id):
     """Check if a case is closed. Returns True if closed, False otherwise."""
     if not case_id:
@@ -101,6 +414,65 @@ def is_case_closed(case_id):
     case = db.cases.find_one({'_id': case_id}, {'status': 1})
     return case and case.get('status') == 'closed'
 
+# ==================== REQUEST USER ====================
+# The X-User-Id user is resolved once per request into g.user, from a small TTL
+# cache. update_user / delete_user bump the 'users' version (invalidate_reference),
+# which clears the cache of every other worker within REFERENCE_VERSION_TTL, so a
+# deactivated, deleted or re-roled user is not honoured for the full USER_CACHE_TTL.
+
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds
+user_cache = ReferenceCache('users', max_size=1000, ttl=USER_CACHE_TTL)
+reference_versions.caches['users'] = user_cache
+
+def get_user(user_id):
+    """Cached users lookup by _id (None if not found)"""
+    user_id = parse_object_id(user_id) if isinstance(user_id, str) else user_id
+    if not user_id:
+        return None
+    reference_versions.get('users')  # clears user_cache after another worker's write
+    user = user_cache.get(user_id)
+    if user is _MISSING:
+        user = db.users.find_one({'_id': user_id})
+        user_cache.set(user_id, user)
+    return user
+
+def current_user():
+    """User of the X-User-Id header, resolved once per request (None without a valid header)"""
+    if 'user' not in g:
+        user_id = request.headers.get('X-User-Id')
+        g.user = get_user(user_id) if user_id else None
+    return g.user
+
+def is_admin_user(user):
+    return bool(user) and user.get('username') == 'sunilsahu'
+
+def auth_required(admin=False, role=None, permission=None, message='Access denied. Admin only.'):
+    """
+    Require an X-User-Id user (401 without the header) and check it (403 with message):
+    admin=True  only the admin account
+    role='x'    users whose role is x
+    permission  (module, action) as understood by check_permission
+    The user is available to the handler as g.user.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not request.headers.get('X-User-Id'):
+                return jsonify({'error': 'Unauthorized'}), 401
+            try:
+                user = current_user()
+            except Exception as e:
+                logging.error(f"Error resolving request user: {e}")
+                return jsonify({'error': str(e)}), 500
+            if (not user
+                    or (admin and not is_admin_user(user))
+                    or (role and user.get('role') != role)
+                    or (permission and not check_permission(user, *permission))):
+                return jsonify({'error': message}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -109,7 +481,7 @@ def login_required(f):
             user_id_header = request.headers.get('X-User-Id')
             if user_id_header:
                 try:
-                    user = db.users.find_one({'_id': parse_object_id(user_id_header)})
+                    user = current_user()
                     if user:
                         # Populate session for this request context
                         session['user_id'] = str(user['_id'])
@@ -131,15 +503,19 @@ def login_required(f):
 def index():
     return render_template('index.html')
 
-@app.before_request
-def log_request_info():
-    logging.debug('Headers: %s', request.headers)
-    logging.debug('Cookies: %s', request.cookies)
-    logging.debug('Session: %s', session)
-    if 'user_id' in session:
-        logging.debug(f"User ID in session: {session['user_id']}")
-    else:
-        logging.debug("No User ID in session")
+# One JSON access-log line per request; static files only when sampled (ACCESS_LOG_STATIC_SAMPLE, 0-1),
+# header/cookie/session dumps only with LOG_REQUEST_HEADERS=1 and LOG_LEVEL=DEBUG
+init_access_log(app, mongo_metrics,
+                static_sample_rate=float(os.getenv('ACCESS_LOG_STATIC_SAMPLE', 0)),
+                log_headers=os.getenv('LOG_REQUEST_HEADERS', '0') == '1')
+
+@app.after_request
+def report_resolver_savings(response):
+    stats = g.get('resolver_stats')
+    if stats:
+        response.headers['X-Resolver-Queries-Saved'] = str(stats['saved'])
+        logging.debug(f"Reference resolver: {stats['queries']} queries issued, {stats['saved']} saved for {request.path}")
+    return response
 
 
 @app.route('/static/uploads/prescriptions/<filename>')
@@ -162,49 +538,40 @@ def monthly_dashboard():
 # ==================== DOCTORS API ====================
 
 @app.route('/api/doctors', methods=['GET'])
+@reference_etag('doctors')
 def get_doctors():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * limit
         
         # Build query for search - by default only show active doctors
         query = {'$or': [{'isActive': True}, {'isActive': {'$exists': False}}]}  # Show active doctors (isActive is True or doesn't exist)
         if search:
-            search_conditions = [
-                {'name': {'$regex': search, '$options': 'i'}},
-                {'specialization': {'$regex': search, '$options': 'i'}},
-                {'phone': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}}
-            ]
+            # Indexed prefix match on name, specialization, phone and email
             query = {
                 '$and': [
                     {'$or': [{'isActive': True}, {'isActive': {'$exists': False}}]},
-                    {'$or': search_conditions}
+                    search_query('doctors', search)
                 ]
             }
         
-        # Get total count for pagination
-        total = db.doctors.count_documents(query)
-        
-        # Get paginated results
-        doctors = list(db.doctors.find(query).sort('created_at', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        doctors, page_meta = fetch_page(db.doctors, query, 'created_at', page, limit)
         
         return jsonify({
             'doctors': serialize_doc(doctors),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting doctors: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/doctors/<id>', methods=['GET'])
+@reference_etag('doctors')
 def get_doctor(id):
     try:
-        doctor = db.doctors.find_one({'_id': parse_object_id(id)})
+        doctor = get_reference_doc('doctors', parse_object_id(id))
         if doctor:
             return jsonify(serialize_doc(doctor))
         return jsonify({'error': 'Doctor not found'}), 404
@@ -234,7 +601,9 @@ def create_doctor():
             if isinstance(data['isInhouse'], str):
                 data['isInhouse'] = data['isInhouse'].lower() == 'true'
         
+        data.update(search_fields('doctors', data))
         result = db.doctors.insert_one(data)
+        invalidate_reference('doctors', result.inserted_id)
         return jsonify({'id': str(result.inserted_id), 'message': 'Doctor created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating doctor: {e}")
@@ -262,6 +631,8 @@ def update_doctor(id):
         
         data['updated_at'] = datetime.now()
         result = db.doctors.update_one({'_id': doctor_id}, {'$set': data})
+        reindex_document(db, 'doctors', doctor_id)
+        invalidate_reference('doctors', doctor_id)
         if result.modified_count or result.matched_count:
             return jsonify({'message': 'Doctor updated successfully'})
         return jsonify({'message': 'Doctor updated successfully'})  # Even if no fields changed
@@ -276,6 +647,7 @@ def delete_doctor(id):
             {'_id': parse_object_id(id)},
             {'$set': {'isActive': False, 'deactivated_at': datetime.now()}}
         )
+        invalidate_reference('doctors', parse_object_id(id))
         if result.modified_count:
             return jsonify({'message': 'Doctor deactivated successfully'})
         return jsonify({'error': 'Doctor not found'}), 404
@@ -291,30 +663,19 @@ def get_patients():
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * limit
         
         # Build query for search
         query = {}
         if search:
-            search_conditions = [
-                {'name': {'$regex': search, '$options': 'i'}},
-                {'phone': {'$regex': search, '$options': 'i'}},
-                {'email': {'$regex': search, '$options': 'i'}},
-                {'address': {'$regex': search, '$options': 'i'}}
-            ]
-            query = {'$or': search_conditions}
-        
-        # Get total count for pagination
-        total = db.patients.count_documents(query)
+            # Indexed prefix match on name, phone, email and address
+            query = search_query('patients', search)
         
-        # Get paginated results
-        patients = list(db.patients.find(query).sort('created_at', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        patients, page_meta = fetch_page(db.patients, query, 'created_at', page, limit)
         
         return jsonify({
             'patients': serialize_doc(patients),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting patients: {e}")
@@ -336,6 +697,7 @@ def create_patient():
     try:
         data = request.get_json()
         data['created_at'] = datetime.now()
+        data.update(search_fields('patients', data))
         result = db.patients.insert_one(data)
         return jsonify({'id': str(result.inserted_id), 'message': 'Patient created successfully'}), 201
     except Exception as e:
@@ -349,6 +711,7 @@ def update_patient(id):
         data['updated_at'] = datetime.now()
         result = db.patients.update_one({'_id': parse_object_id(id)}, {'$set': data})
         if result.modified_count:
+            reindex_document(db, 'patients', parse_object_id(id))
             return jsonify({'message': 'Patient updated successfully'})
         return jsonify({'error': 'Patient not found'}), 404
     except Exception as e:
@@ -366,6 +729,728 @@ def delete_patient(id):
         logging.error(f"Error deleting patient: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== PAGINATION ====================
+# List endpoints page with skip/limit and an exact count by default. Passing
+# ?after=<next_cursor> (or ?cursor=1 for the first page) switches to keyset
+# pagination on (sort field, _id): no skip, and the total is only counted
+# with ?count=exact, otherwise it is served from a short-lived cached count.
+
+LIST_COUNT_TTL = int(os.getenv('LIST_COUNT_TTL', 60))  # seconds
+
+list_count_cache = ReferenceCache('list_counts', max_size=1000, ttl=LIST_COUNT_TTL)
+
+def encode_cursor(doc, sort_field):
+    payload = json_util.dumps({'v': doc.get(sort_field), 'id': doc['_id']})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        cursor = json_util.loads(payload)
+        return cursor['v'], cursor['id']
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+@app.before_request
+def validate_page_cursor():
+    """Reject a malformed ?after= token with 400 before a list handler turns it into a 500"""
+    after = request.args.get('after')
+    if after:
+        try:
+            decode_cursor(after)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+def _keyset_filter(sort_field, value, last_id):
+    """Documents after (value, last_id) in (sort_field desc, _id desc) order; null/missing values sort last"""
+    if value is None:
+        return {sort_field: None, '_id': {'$lt': last_id}}
+    return {'$or': [
+        {sort_field: {'$lt': value}},
+        {sort_field: value, '_id': {'$lt': last_id}},
+        {sort_field: None}
+    ]}
+
+def estimated_count(collection, query):
+    """Collection metadata count for unfiltered lists, otherwise a cached count_documents"""
+    if not query:
+        return collection.estimated_document_count()
+    key = (collection.name, json_util.dumps(query, sort_keys=True))
+    total = list_count_cache.get(key)
+    if total is _MISSING:
+        total = collection.count_documents(query)
+        list_count_cache.set(key, total)
+    return total
+
+def fetch_page(collection, query, sort_field, page, limit, stages=()):
+    """
+    One page of a list endpoint, newest first by sort_field. stages are appended
+    to the pipeline (e.g. $lookups) after the page has been selected.
+    Returns (docs, meta) where meta holds the pagination keys of the response.
+    """
+    after = request.args.get('after')
+    if not after and request.args.get('cursor') not in ('1', 'true'):
+        total = collection.count_documents(query)
+        skip = (page - 1) * limit
+        if stages:
+            docs = list(collection.aggregate([
+                {'$match': query}, {'$sort': {sort_field: -1}}, {'$skip': skip}, {'$limit': limit}, *stages
+            ]))
+        else:
+            docs = list(collection.find(query).sort(sort_field, -1).skip(skip).limit(limit))
+        return docs, {'total': total, 'page': page, 'limit': limit}
+
+    page_query = query
+    if after:
+        keyset = _keyset_filter(sort_field, *decode_cursor(after))
+        page_query = {'$and': [query, keyset]} if query else keyset
+    # One extra document tells whether there is a next page
+    sort = [(sort_field, -1), ('_id', -1)]
+    if stages:
+        docs = list(collection.aggregate([
+            {'$match': page_query}, {'$sort': dict(sort)}, {'$limit': limit + 1}, *stages
+        ]))
+    else:
+        docs = list(collection.find(page_query).sort(sort).limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    docs = docs[:limit]
+
+    exact = request.args.get('count') == 'exact'
+    total = collection.count_documents(query) if exact else estimated_count(collection, query)
+    return docs, {'total': total, 'total_is_estimate': not exact, 'limit': limit, 'next_cursor': next_cursor}
+
+# ==================== CASE LEDGERS ====================
+# One case_ledgers document per case (_id = case _id) holding running totals:
+# hospital_total/hospital_count (case_charges), doctor_total/doctor_count
+# (legacy case_doctor_charges), paid_amount/payment_count (payments) and discount.
+
+LEDGER_SOURCES = {
+    # kind: (collection, amount field, ledger total field, ledger count field)
+    'charge': ('case_charges', 'total_amount', 'hospital_total', 'hospital_count'),
+    'legacy_charge': ('case_doctor_charges', 'amount', 'doctor_total', 'doctor_count'),
+    'payment': ('payments', 'amount', 'paid_amount', 'payment_count')
+}
+
+def _ledger_amount(value):
+    """Numeric value as summed by $sum (non-numeric values count as 0)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+def _build_ledgers(case_ids):
+    """Compute ledger documents for the given cases from the source collections"""
+    ledgers = {case_id: {
+        '_id': case_id,
+        'hospital_total': 0, 'hospital_count': 0,
+        'doctor_total': 0, 'doctor_count': 0,
+        'paid_amount': 0, 'payment_count': 0,
+        'discount': 0
+    } for case_id in case_ids}
+    for collection, amount_field, total_field, count_field in LEDGER_SOURCES.values():
+        pipeline = [
+            {'$match': {'case_id': {'$in': case_ids}}},
+            {'$group': {'_id': '$case_id', 'total': {'$sum': f'${amount_field}'}, 'count': {'$sum': 1}}}
+        ]
+        for row in db[collection].aggregate(pipeline):
+            if row['_id'] in ledgers:
+                ledgers[row['_id']][total_field] = row['total']
+                ledgers[row['_id']][count_field] = row['count']
+    for case in db.cases.find({'_id': {'$in': case_ids}}, {'discount': 1}):
+        ledgers[case['_id']]['discount'] = _ledger_amount(case.get('discount', 0))
+    now = datetime.now()
+    for ledger in ledgers.values():
+        ledger['updated_at'] = now
+    return ledgers
+
+def rebuild_case_ledger(case_id):
+    """Recompute one case's ledger from scratch and store it"""
+    ledger = _build_ledgers([case_id])[case_id]
+    db.case_ledgers.replace_one({'_id': case_id}, ledger, upsert=True)
+    return ledger
+
+def rebuild_case_ledgers(case_ids=None, batch_size=500):
+    """Repair command: recompute ledgers for the given cases (default: all cases). Returns the count."""
+    if case_ids is None:
+        case_ids = [case['_id'] for case in db.cases.find({}, {'_id': 1})]
+        # Drop ledgers of deleted cases
+        db.case_ledgers.delete_many({'_id': {'$nin': case_ids}})
+    rebuilt = 0
+    for i in range(0, len(case_ids), batch_size):
+        batch = case_ids[i:i + batch_size]
+        ledgers = _build_ledgers(batch)
+        db.case_ledgers.bulk_write([
+            ReplaceOne({'_id': case_id}, ledger, upsert=True) for case_id, ledger in ledgers.items()
+        ], ordered=False)
+        rebuilt += len(ledgers)
+    return rebuilt
+
+def get_case_ledgers(case_ids):
+    """Ledgers keyed by case _id; ledgers missing (e.g. cases created before ledgers existed) are built on demand"""
+    case_ids = [case_id for case_id in case_ids if case_id]
+    ledgers = {ledger['_id']: ledger for ledger in db.case_ledgers.find({'_id': {'$in': case_ids}})}
+    missing = [case_id for case_id in case_ids if case_id not in ledgers]
+    if missing:
+        rebuild_case_ledgers(missing)
+        ledgers.update({ledger['_id']: ledger for ledger in db.case_ledgers.find({'_id': {'$in': missing}})})
+    return ledgers
+
+def get_case_ledger(case_id):
+    return get_case_ledgers([case_id]).get(case_id)
+
+def ledger_totals(ledger, discount=None):
+    """Derived totals of a ledger; discount defaults to the ledger's copy of the case discount"""
+    if discount is None:
+        discount = ledger.get('discount', 0)
+    charges_total = ledger.get('hospital_total', 0) + ledger.get('doctor_total', 0)
+    total_after_discount = max(0, charges_total - discount)
+    return {
+        'charges_total': charges_total,
+        'charges_count': ledger.get('hospital_count', 0) + ledger.get('doctor_count', 0),
+        'total_after_discount': total_after_discount,
+        'paid_amount': ledger.get('paid_amount', 0),
+        'due_amount': max(0, total_after_discount - ledger.get('paid_amount', 0))
+    }
+
+def bill_totals(ledger):
+    """Totals of the billing screen, the printed bill and the close checks (balance is signed)"""
+    totals = ledger_totals(ledger)
+    return {
+        'total_charges': float(totals['charges_total']),
+        'discount': float(ledger.get('discount', 0)),
+        'total_after_discount': float(totals['total_after_discount']),
+        'total_paid': float(totals['paid_amount']),
+        'balance': float(totals['total_after_discount'] - totals['paid_amount'])
+    }
+
+def _apply_ledger_delta(case_id, inc):
+    if not case_id or not any(inc.values()):
+        return
+    result = db.case_ledgers.update_one({'_id': case_id}, {'$inc': inc, '$set': {'updated_at': datetime.now()}})
+    if not result.matched_count:
+        # No ledger yet: build it from the source collections (already includes this write)
+        rebuild_case_ledger(case_id)
+
+def update_ledger_for_change(kind, before=None, after=None):
+    """
+    Apply the ledger delta of creating (before=None), updating or deleting (after=None)
+    a case charge, legacy doctor charge or payment. Handles documents moved between cases.
+    """
+    try:
+        _, amount_field, total_field, count_field = LEDGER_SOURCES[kind]
+        old_case = before.get('case_id') if before else None
+        new_case = after.get('case_id') if after else None
+        old_amount = _ledger_amount(before.get(amount_field, 0)) if before else 0
+        new_amount = _ledger_amount(after.get(amount_field, 0)) if after else 0
+        if old_case == new_case:
+            _apply_ledger_delta(new_case, {total_field: new_amount - old_amount,
+                                           count_field: (1 if after else 0) - (1 if before else 0)})
+        else:
+            _apply_ledger_delta(old_case, {total_field: -old_amount, count_field: -1})
+            _apply_ledger_delta(new_case, {total_field: new_amount, count_field: 1})
+    except Exception as e:
+        logging.error(f"Error updating case ledger ({kind}): {e}")
+
+def set_ledger_discount(case_id, discount):
+    try:
+        result = db.case_ledgers.update_one(
+            {'_id': case_id},
+            {'$set': {'discount': _ledger_amount(discount), 'updated_at': datetime.now()}}
+        )
+        if not result.matched_count:
+            rebuild_case_ledger(case_id)
+    except Exception as e:
+        logging.error(f"Error updating case ledger discount: {e}")
+
+# ==================== MONTHLY REPORT ENGINE ====================
+# Persisted monthly report snapshots: monthly_report_snapshots holds one marker
+# document per built month (_id = 'YYYY-MM') and monthly_report_rows one row per
+# case of that month (admitted in the month or paid in the month) with the
+# month's payments, legacy doctor charges and case charges grouped by
+# (charge_master_id, charge_type, is_doctor_charge). Rows are refreshed per case
+# when charges, payments or the case change; names and charge buckets are
+# resolved when the report is read.
+
+MONTHLY_REPORT_BUCKETS = [
+    'consultation_charges', 'medical_charges', 'pathology_charges', 'pharmacy_charges',
+    'injection_charges', 'daycare_charges', 'doctor_charges', 'general_charges',
+    'nursing_charges', 'other_charges'
+]
+
+# Which date puts a charge / payment into a report month
+MONTHLY_REPORT_DATE_FIELDS = {
+    'charge': 'created_at',
+    'legacy_charge': 'created_at',
+    'payment': 'payment_date'
+}
+
+def _report_period(value):
+    return value.strftime('%Y-%m') if isinstance(value, datetime) else None
+
+def _period_range(period):
+    year, month = map(int, period.split('-'))
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return month_start, month_end
+
+def _as_double(field):
+    return {'$convert': {'input': f'${field}', 'to': 'double', 'onError': 0, 'onNull': 0}}
+
+@lru_cache(maxsize=4096)
+def charge_report_bucket(name, category, charge_category, charge_type, is_doctor_charge, has_master):
+    """Monthly report bucket of a charge; arguments are lower-cased charge_master fields and charge_type"""
+    if has_master:
+        if 'consultation' in category or 'consultation' in charge_category or charge_type == 'consultation':
+            return 'consultation_charges'
+        if 'pathology' in category or 'pathology' in charge_category or charge_type == 'pathology':
+            return 'pathology_charges'
+        if 'pharmacy' in category or 'pharmacy' in charge_category or charge_type == 'pharmacy':
+            return 'pharmacy_charges'
+        if 'injection' in category or 'injection' in charge_category:
+            return 'injection_charges'
+        if 'daycare' in category or 'daycare' in charge_category or 'day care' in category:
+            return 'daycare_charges'
+        if 'nursing' in name or 'nursing' in category:
+            return 'nursing_charges'
+        if is_doctor_charge or 'doctor' in category or 'doctor' in charge_category or charge_type == 'doctor' or 'opd_inhouse_doc' in charge_type:
+            return 'doctor_charges'
+        if 'medical' in category or 'medical' in charge_category:
+            return 'medical_charges'
+        if 'general' in category or 'general' in charge_category:
+            return 'general_charges'
+
+    # Not categorized by charge master, try charge_type
+    if is_doctor_charge or charge_type == 'doctor' or 'opd_inhouse_doc' in charge_type:
+        return 'doctor_charges'
+    if charge_type == 'pharmacy':
+        return 'pharmacy_charges'
+    if charge_type == 'pathology':
+        return 'pathology_charges'
+    if charge_type == 'consultation':
+        return 'consultation_charges'
+    return 'other_charges'
+
+def _build_monthly_rows(period, case_ids=None):
+    """Compute report rows of a month (optionally only for the given cases), keyed by case _id"""
+    month_start, month_end = _period_range(period)
+    in_month = {'$gte': month_start, '$lt': month_end}
+
+    admitted_query = {'admission_date': in_month}
+    payments_match = {'payment_date': in_month}
+    if case_ids is not None:
+        admitted_query['_id'] = {'$in': case_ids}
+        payments_match['case_id'] = {'$in': case_ids}
+
+    admitted = [case['_id'] for case in db.cases.find(admitted_query, {'_id': 1})]
+    payments = {row['_id']: row['total'] for row in db.payments.aggregate([
+        {'$match': payments_match},
+        {'$group': {'_id': '$case_id', 'total': {'$sum': _as_double('amount')}}}
+    ]) if row['_id']}
+
+    member_ids = list(set(admitted) | set(payments))
+    rows = {}
+    for case in db.cases.find({'_id': {'$in': member_ids}}, {'patient_id': 1, 'admission_date': 1, 'discount': 1}):
+        rows[case['_id']] = {
+            '_id': f"{period}:{case['_id']}",
+            'period': period,
+            'case_id': case['_id'],
+            'patient_id': case.get('patient_id'),
+            'admission_date': case.get('admission_date'),
+            'discount': float(case.get('discount', 0) or 0),
+            'payments': payments.get(case['_id'], 0),
+            'legacy_doctor_charges': 0,
+            'charge_groups': []
+        }
+    if not rows:
+        return rows
+
+    charge_groups = db.case_charges.aggregate([
+        {'$match': {'case_id': {'$in': list(rows)}, 'created_at': in_month}},
+        {'$group': {
+            '_id': {
+                'case_id': '$case_id',
+                'charge_master_id': '$charge_master_id',
+                'charge_type': {'$toLower': {'$ifNull': ['$charge_type', 'hospital']}},
+                'is_doctor_charge': {'$cond': [{'$ifNull': ['$is_doctor_charge', False]}, True, False]}
+            },
+            'amount': {'$sum': _as_double('total_amount')}
+        }}
+    ])
+    for group in charge_groups:
+        key = group['_id']
+        rows[key['case_id']]['charge_groups'].append({
+            'charge_master_id': key.get('charge_master_id'),
+            'charge_type': key['charge_type'],
+            'is_doctor_charge': key['is_doctor_charge'],
+            'amount': group['amount']
+        })
+
+    legacy_charges = db.case_doctor_charges.aggregate([
+        {'$match': {'case_id': {'$in': list(rows)}, 'created_at': in_month}},
+        {'$group': {'_id': '$case_id', 'total': {'$sum': _as_double('amount')}}}
+    ])
+    for row in legacy_charges:
+        rows[row['_id']]['legacy_doctor_charges'] = row['total']
+
+    now = datetime.now()
+    for row in rows.values():
+        row['updated_at'] = now
+    return rows
+
+def _store_monthly_rows(period, case_ids, rows):
+    """Upsert computed rows and drop rows of the given cases that are no longer part of the month"""
+    if rows:
+        db.monthly_report_rows.bulk_write([
+            ReplaceOne({'_id': row['_id']}, row, upsert=True) for row in rows.values()
+        ], ordered=False)
+    stale = {'period': period, 'case_id': {'$nin': list(rows)}}
+    if case_ids is not None:
+        stale['case_id']['$in'] = case_ids
+    db.monthly_report_rows.delete_many(stale)
+
+def build_monthly_report_snapshot(period):
+    """Compute and persist the whole month"""
+    rows = _build_monthly_rows(period)
+    _store_monthly_rows(period, None, rows)
+    now = datetime.now()
+    db.monthly_report_snapshots.update_one(
+        {'_id': period},
+        {'$set': {'built_at': now, 'updated_at': now, 'case_count': len(rows)}},
+        upsert=True
+    )
+
+def refresh_monthly_report(period, case_ids):
+    """Incrementally refresh the rows of the given cases in a month that already has a snapshot"""
+    case_ids = [case_id for case_id in case_ids if case_id]
+    if not period or not case_ids or not db.monthly_report_snapshots.find_one({'_id': period}, {'_id': 1}):
+        return
+    rows = _build_monthly_rows(period, case_ids)
+    _store_monthly_rows(period, case_ids, rows)
+    db.monthly_report_snapshots.update_one({'_id': period}, {'$set': {'updated_at': datetime.now()}})
+
+def refresh_monthly_report_for_case(case_id, *dates):
+    """Refresh every month the case appears in, plus the months of the given dates (e.g. old/new admission date)"""
+    try:
+        periods = set(db.monthly_report_rows.distinct('period', {'case_id': case_id}))
+        periods.update(_report_period(value) for value in dates)
+        for period in periods:
+            refresh_monthly_report(period, [case_id])
+    except Exception as e:
+        logging.error(f"Error refreshing monthly report for case {case_id}: {e}")
+
+def refresh_monthly_report_for_change(kind, before=None, after=None):
+    """Refresh the month(s) touched by creating, updating or deleting a charge or payment"""
+    try:
+        date_field = MONTHLY_REPORT_DATE_FIELDS[kind]
+        touched = {}
+        for doc in (before, after):
+            if doc and doc.get('case_id'):
+                period = _report_period(doc.get(date_field))
+                if period:
+                    touched.setdefault(period, set()).add(doc['case_id'])
+        for period, case_ids in touched.items():
+            refresh_monthly_report(period, list(case_ids))
+    except Exception as e:
+        logging.error(f"Error refreshing monthly report ({kind}): {e}")
+
+def on_financial_change(kind, before=None, after=None, create_payout=False):
+    """
+    Write hook for case charges, legacy doctor charges and payments: keeps ledgers, monthly reports,
+    payouts and the daily rollup current. create_payout=True creates a missing payout for a new charge's doctor.
+    """
+    update_ledger_for_change(kind, before, after)
+    refresh_monthly_report_for_change(kind, before, after)
+    if kind == 'charge':
+        sync_payouts([(doc.get('case_id'), doc.get('doctor_id')) for doc in (before, after) if doc], create=create_payout)
+    if kind == 'payment':
+        refresh_financial_rollup_for_change(kind, before, after)
+
+def get_monthly_report_rows(period, refresh=False):
+    if refresh or not db.monthly_report_snapshots.find_one({'_id': period}, {'_id': 1}):
+        build_monthly_report_snapshot(period)
+    return list(db.monthly_report_rows.find({'period': period}).sort('case_id', 1))
+
+# ==================== FINANCIAL DAILY ROLLUP ====================
+# financial_daily_rollup holds one document per IST day (_id = 'YYYY-MM-DD')
+# with the day's collections (payments) and payouts (paid payouts count their
+# doctor_charge_amount, partial_paid ones their partial_payment_amount, on
+# payment_date or else date_time). Days are computed with a $group on the
+# server the first time they are read and refreshed when a payment or a paid
+# payout of that day is written.
+
+IST_TIMEZONE = '+05:30'
+IST_OFFSET = timedelta(hours=5, minutes=30)
+PAID_PAYOUT_STATUSES = ['paid', 'partial_paid']
+
+def _ist_day(value):
+    """IST calendar day (YYYY-MM-DD) of a stored UTC datetime"""
+    return (value + IST_OFFSET).strftime('%Y-%m-%d') if isinstance(value, datetime) else None
+
+def _ist_day_bounds(first_day, last_day):
+    """UTC [start, end) covering the IST days first_day..last_day"""
+    start = datetime.strptime(first_day, '%Y-%m-%d') - IST_OFFSET
+    end = datetime.strptime(last_day, '%Y-%m-%d') + timedelta(days=1) - IST_OFFSET
+    return start, end
+
+def _day_runs(days):
+    """Consecutive runs of sorted YYYY-MM-DD days as (first, last) pairs"""
+    runs = []
+    for day in sorted(days):
+        if runs and datetime.strptime(day, '%Y-%m-%d') - datetime.strptime(runs[-1][1], '%Y-%m-%d') == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return runs
+
+def _daily_financial_totals(first_day, last_day):
+    """{day: {'collections': x, 'payouts': y}} for the IST days first_day..last_day that have any"""
+    start, end = _ist_day_bounds(first_day, last_day)
+    totals = {}
+    for row in db.payments.aggregate([
+        {'$match': {'payment_date': {'$gte': start, '$lt': end}}},
+        {'$group': {
+            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$payment_date', 'timezone': IST_TIMEZONE}},
+            'total': {'$sum': '$amount'}
+        }}
+    ]):
+        totals.setdefault(row['_id'], {'collections': 0, 'payouts': 0})['collections'] = row['total']
+    for row in db.payouts.aggregate([
+        {'$match': {
+            'payment_status': {'$in': PAID_PAYOUT_STATUSES},
+            '$or': [
+                {'payment_date': {'$gte': start, '$lt': end}},
+                {'payment_date': None, 'date_time': {'$gte': start, '$lt': end}}
+            ]
+        }},
+        {'$group': {
+            '_id': {'$dateToString': {
+                'format': '%Y-%m-%d',
+                'date': {'$ifNull': ['$payment_date', '$date_time']},
+                'timezone': IST_TIMEZONE
+            }},
+            'total': {'$sum': {'$cond': [
+                {'$eq': ['$payment_status', 'paid']},
+                _as_double('doctor_charge_amount'),
+                _as_double('partial_payment_amount')
+            ]}}
+        }}
+    ]):
+        totals.setdefault(row['_id'], {'collections': 0, 'payouts': 0})['payouts'] = row['total']
+    return totals
+
+def refresh_financial_days(days):
+    """Recompute and store the rollup of the given IST days; returns {day: document}"""
+    rows = {}
+    for first_day, last_day in _day_runs(set(days)):
+        totals = _daily_financial_totals(first_day, last_day)
+        day = datetime.strptime(first_day, '%Y-%m-%d')
+        while day.strftime('%Y-%m-%d') <= last_day:
+            key = day.strftime('%Y-%m-%d')
+            rows[key] = {'_id': key, **totals.get(key, {'collections': 0, 'payouts': 0}), 'refreshed_at': datetime.now()}
+            day += timedelta(days=1)
+    if rows:
+        db.financial_daily_rollup.bulk_write([ReplaceOne({'_id': key}, row, upsert=True) for key, row in rows.items()], ordered=False)
+    return rows
+
+def refresh_financial_rollup_for_change(kind, before=None, after=None):
+    """Refresh the already rolled-up days a payment or payout counted on before and after a write"""
+    try:
+        days = set()
+        for doc in (before, after):
+            if not doc:
+                continue
+            if kind == 'payout':
+                if doc.get('payment_status') not in PAID_PAYOUT_STATUSES:
+                    continue
+                days.update(_ist_day(doc.get(field)) for field in ('payment_date', 'date_time'))
+            else:
+                days.add(_ist_day(doc.get('payment_date')))
+        days.discard(None)
+        if days:
+            rolled_up = [row['_id'] for row in db.financial_daily_rollup.find({'_id': {'$in': list(days)}}, {'_id': 1})]
+            refresh_financial_days(rolled_up)
+    except Exception as e:
+        logging.error(f"Error refreshing financial rollup ({kind}): {e}")
+
+def get_financial_daily_rollup(first_day, last_day, refresh=False):
+    """{day: rollup document} for the IST days first_day..last_day; days not rolled up yet are computed first"""
+    rows = {}
+    if not refresh:
+        rows = {row['_id']: row for row in db.financial_daily_rollup.find({'_id': {'$gte': first_day, '$lte': last_day}})}
+    missing = []
+    day = datetime.strptime(first_day, '%Y-%m-%d')
+    while day.strftime('%Y-%m-%d') <= last_day:
+        if day.strftime('%Y-%m-%d') not in rows:
+            missing.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    if missing:
+        rows.update(refresh_financial_days(missing))
+    return rows
+
+# ==================== PAYOUT ENGINE ====================
+# A payout carries, per (case, doctor), total_charge_amount (the doctor's
+# case_charges total_amount) and doctor_charge_amount (doctor_charges rate x
+# quantity over those charges). Charge writes recompute the amounts of the
+# pairs they touch (sync_payouts); resync_payouts() does the same in bulk and
+# payout_reconciliation() lists payouts whose stored amounts differ from what
+# the charges imply. Payouts of pairs without doctor charges (entered by hand)
+# are left alone.
+
+PAYOUT_AMOUNT_TOLERANCE = 0.005
+PAYOUT_RESYNC_BATCH_SIZE = 500
+
+def payout_amount_stages():
+    """
+    Pipeline stages turning matched case_charges into one document per
+    (case, doctor) with total_charge_amount and doctor_charge_amount.
+    Quantities are summed per charge_master first so each rate is looked up once per pair.
+    """
+    return [
+        {'$group': {
+            '_id': {'case_id': '$case_id', 'doctor_id': '$doctor_id', 'charge_master_id': '$charge_master_id'},
+            'quantity': {'$sum': {'$ifNull': ['$quantity', 1]}},
+            'total_charge_amount': {'$sum': '$total_amount'}
+        }},
+        {'$lookup': {
+            'from': 'doctor_charges',
+            'let': {'doctor_id': '$_id.doctor_id', 'charge_master_id': {'$ifNull': ['$_id.charge_master_id', None]}},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$doctor_id', '$$doctor_id']},
+                    {'$eq': ['$charge_master_id', '$$charge_master_id']},
+                    {'$ne': ['$$charge_master_id', None]}
+                ]}}},
+                {'$limit': 1},
+                {'$project': {'_id': 0, 'amount': 1}}
+            ],
+            'as': 'rate'
+        }},
+        {'$project': {
+            'total_charge_amount': 1,
+            'doctor_charge_amount': {'$multiply': ['$quantity', {'$ifNull': [{'$arrayElemAt': ['$rate.amount', 0]}, 0]}]}
+        }},
+        {'$group': {
+            '_id': {'case_id': '$_id.case_id', 'doctor_id': '$_id.doctor_id'},
+            'total_charge_amount': {'$sum': '$total_charge_amount'},
+            'doctor_charge_amount': {'$sum': '$doctor_charge_amount'}
+        }}
+    ]
+
+def expected_payout_amounts(match=None):
+    """{(case_id, doctor_id): (total_charge_amount, doctor_charge_amount)} implied by the case charges matching match"""
+    pipeline = [
+        {'$match': {'doctor_id': {'$exists': True, '$ne': None}, **(match or {})}},
+        *payout_amount_stages()
+    ]
+    return {
+        (row['_id']['case_id'], row['_id']['doctor_id']): (row['total_charge_amount'], row['doctor_charge_amount'])
+        for row in db.case_charges.aggregate(pipeline, allowDiskUse=True)
+    }
+
+def _new_payout_fields(case_id, doctor_id):
+    """Descriptive fields of a newly created pending payout"""
+    case = db.cases.find_one({'_id': case_id}, {'case_number': 1, 'patient_name': 1, 'patient_id': 1})
+    doctor = get_reference_doc('doctors', doctor_id)
+    fields = {
+        'case_number': case.get('case_number') if case else '',
+        'patient_name': case.get('patient_name') if case else '',
+        'doctor_name': doctor.get('name') if doctor else '',
+        'payment_status': 'pending',
+        'created_at': datetime.now()
+    }
+    if not fields['patient_name'] and case and case.get('patient_id'):
+        pat = db.patients.find_one({'_id': case['patient_id']}, {'name': 1})
+        if pat:
+            fields['patient_name'] = pat.get('name')
+    return fields
+
+def sync_payouts(pairs, create=False):
+    """
+    Recompute the amounts of the (case, doctor) pairs' payouts from their charges and $set them.
+    With create=True a pair without a payout gets a pending one in the same upsert.
+    """
+    try:
+        pairs = {(case_id, doctor_id) for case_id, doctor_id in pairs if case_id and doctor_id}
+        if not pairs:
+            return
+        expected = expected_payout_amounts({'$or': [{'case_id': case_id, 'doctor_id': doctor_id} for case_id, doctor_id in pairs]})
+        for case_id, doctor_id in pairs:
+            total, share = expected.get((case_id, doctor_id), (0, 0))
+            update = {'$set': {'total_charge_amount': total, 'doctor_charge_amount': share, 'updated_at': datetime.now()}}
+            upsert = create and not db.payouts.find_one({'case_id': case_id, 'doctor_id': doctor_id}, {'_id': 1})
+            if upsert:
+                update['$setOnInsert'] = _new_payout_fields(case_id, doctor_id)
+            payout = db.payouts.find_one_and_update(
+                {'case_id': case_id, 'doctor_id': doctor_id}, update,
+                upsert=upsert, return_document=ReturnDocument.AFTER
+            )
+            if payout:
+                refresh_financial_rollup_for_change('payout', after=payout)
+    except Exception as e:
+        logging.error(f"Error syncing payouts: {e}")
+
+def _amounts_differ(stored, expected):
+    if isinstance(stored, bool) or not isinstance(stored, (int, float)):
+        return True
+    return abs(stored - expected) > PAYOUT_AMOUNT_TOLERANCE
+
+def payout_reconciliation(case_ids=None, start=None, end=None):
+    """
+    Payouts whose stored amounts differ from what their case charges imply.
+    Limited to case_ids and/or the cases with doctor charges created in [start, end).
+    """
+    if start or end:
+        created_at = {}
+        if start:
+            created_at['$gte'] = start
+        if end:
+            created_at['$lt'] = end
+        in_range = db.case_charges.distinct('case_id', {'doctor_id': {'$exists': True, '$ne': None}, 'created_at': created_at})
+        case_ids = in_range if case_ids is None else list(set(case_ids) & set(in_range))
+    match = {'case_id': {'$in': list(case_ids)}} if case_ids is not None else {}
+    expected = expected_payout_amounts(match)
+    
+    mismatches = []
+    projection = ['case_id', 'doctor_id', 'case_number', 'doctor_name', 'payment_status', 'total_charge_amount', 'doctor_charge_amount']
+    for payout in db.payouts.find(match, projection):
+        amounts = expected.get((payout.get('case_id'), payout.get('doctor_id')))
+        if amounts is None:
+            continue
+        total, share = amounts
+        if _amounts_differ(payout.get('total_charge_amount'), total) or _amounts_differ(payout.get('doctor_charge_amount'), share):
+            mismatches.append({
+                'payout_id': payout['_id'],
+                'case_id': payout.get('case_id'),
+                'doctor_id': payout.get('doctor_id'),
+                'case_number': payout.get('case_number'),
+                'doctor_name': payout.get('doctor_name'),
+                'payment_status': payout.get('payment_status'),
+                'stored_total_charge_amount': payout.get('total_charge_amount'),
+                'expected_total_charge_amount': total,
+                'stored_doctor_charge_amount': payout.get('doctor_charge_amount'),
+                'expected_doctor_charge_amount': share
+            })
+    return mismatches
+
+def resync_payouts(case_ids=None, start=None, end=None):
+    """Rewrite the amounts of every payout payout_reconciliation() reports (same scope arguments). Returns the count."""
+    mismatches = payout_reconciliation(case_ids, start, end)
+    now = datetime.now()
+    for offset in range(0, len(mismatches), PAYOUT_RESYNC_BATCH_SIZE):
+        batch = mismatches[offset:offset + PAYOUT_RESYNC_BATCH_SIZE]
+        db.payouts.bulk_write([
+            UpdateOne({'_id': row['payout_id']}, {'$set': {
+                'total_charge_amount': row['expected_total_charge_amount'],
+                'doctor_charge_amount': row['expected_doctor_charge_amount'],
+                'updated_at': now
+            }})
+            for row in batch
+        ], ordered=False)
+    # Paid payouts count towards the daily financial rollup
+    paid_ids = [row['payout_id'] for row in mismatches if row['payment_status'] in PAID_PAYOUT_STATUSES]
+    for payout in db.payouts.find({'_id': {'$in': paid_ids}}) if paid_ids else []:
+        refresh_financial_rollup_for_change('payout', after=payout)
+    return len(mismatches)
+
 # ==================== CASES API ====================
 
 @app.route('/api/cases', methods=['GET'])
@@ -375,7 +1460,6 @@ def get_cases():
         limit = int(request.args.get('limit', 10))
         search = request.args.get('search', '').strip()
         patient_id = request.args.get('patient_id')
-        skip = (page - 1) * limit
         
         # Build query
         filters = []
@@ -398,18 +1482,12 @@ def get_cases():
         
         # Filter by search
         if search:
-            # Search by case_number (exact match preferred)
-            cases_by_number = list(db.cases.find({'case_number': {'$regex': search, '$options': 'i'}}))
+            # Search by case_number
+            cases_by_number = list(db.cases.find(search_query('cases', search), {'_id': 1}))
             case_ids = [case['_id'] for case in cases_by_number]
             
-            # Also search in patients by name, phone, email
-            patients = list(db.patients.find({
-                '$or': [
-                    {'name': {'$regex': search, '$options': 'i'}},
-                    {'phone': {'$regex': search, '$options': 'i'}},
-                    {'email': {'$regex': search, '$options': 'i'}}
-                ]
-            }))
+            # Also search in patients (name, phone, email, address)
+            patients = list(db.patients.find(search_query('patients', search), {'_id': 1}))
             patient_ids = [patient['_id'] for patient in patients]
             
             search_conditions = []
@@ -431,16 +1509,8 @@ def get_cases():
         else:
             query = {}
         
-        # Get total count for pagination
-        total = db.cases.count_documents(query)
-        
-        # Aggregation Pipeline
+        # Lookups run on the selected page only
         pipeline = [
-            {'$match': query},
-            {'$sort': {'created_at': -1}},
-            {'$skip': skip},
-            {'$limit': limit},
-            
             # Lookup Patient
             {'$lookup': {
                 'from': 'patients',
@@ -452,28 +1522,12 @@ def get_cases():
                 'patient_name': {'$ifNull': [{'$arrayElemAt': ['$patient_doc.name', 0]}, '']}
             }},
             
-            # Lookup Hospital Charges
-            {'$lookup': {
-                'from': 'case_charges',
-                'localField': '_id',
-                'foreignField': 'case_id',
-                'as': 'hospital_charges_list'
-            }},
-            
-            # Lookup Doctor Charges (Legacy)
-            {'$lookup': {
-                'from': 'case_doctor_charges',
-                'localField': '_id',
-                'foreignField': 'case_id',
-                'as': 'doctor_charges_list'
-            }},
-            
-            # Lookup Payments
+            # Lookup materialized financial totals (one document per case)
             {'$lookup': {
-                'from': 'payments',
+                'from': 'case_ledgers',
                 'localField': '_id',
-                'foreignField': 'case_id',
-                'as': 'payments_list'
+                'foreignField': '_id',
+                'as': 'ledger_doc'
             }},
             
             # Lookup Appointments (with doctor info)
@@ -497,45 +1551,33 @@ def get_cases():
                 'as': 'appointments_data'
             }},
             
-            # Calculate Totals
-            {'$addFields': {
-                'hospital_total': {'$sum': '$hospital_charges_list.total_amount'},
-                'hospital_count': {'$size': '$hospital_charges_list'},
-                'doctor_total': {'$sum': '$doctor_charges_list.amount'},
-                'doctor_count': {'$size': '$doctor_charges_list'},
-                'paid_amount': {'$sum': '$payments_list.amount'},
-                'discount_val': {'$ifNull': ['$discount', 0]} 
-            }},
-            
             {'$addFields': {
-                'charges_total': {'$add': ['$hospital_total', '$doctor_total']},
-                'charges_count': {'$add': ['$hospital_count', '$doctor_count']},
-                'due_amount': {'$max': [0, {'$subtract': [
-                    {'$max': [0, {'$subtract': [{'$add': ['$hospital_total', '$doctor_total']}, '$discount_val']}]}, 
-                    '$paid_amount'
-                ]}]},
+                'ledger': {'$arrayElemAt': ['$ledger_doc', 0]},
+                'discount_val': {'$ifNull': ['$discount', 0]},
                 'appointments_count': {'$size': '$appointments_data'}
             }},
             
             # Cleanup temporary fields
             {'$project': {
                 'patient_doc': 0,
-                'hospital_charges_list': 0,
-                'doctor_charges_list': 0,
-                'payments_list': 0,
-                'hospital_total': 0,
-                'doctor_total': 0,
-                'doctor_count': 0,
-                'hospital_count': 0
+                'ledger_doc': 0
             }}
         ]
         
-        cases = list(db.cases.aggregate(pipeline))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        cases, page_meta = fetch_page(db.cases, query, 'created_at', page, limit, stages=pipeline)
+        
+        # Cases created before ledgers existed get theirs built on first read
+        missing_ledgers = get_case_ledgers([case['_id'] for case in cases if not case.get('ledger')])
         
         # Post-process appointments (logic difficult to do purely in aggregation)
         now_date = datetime.now().date()
         
         for case in cases:
+            # Totals from the case ledger
+            ledger = case.pop('ledger', None) or missing_ledgers.get(case['_id'], {})
+            case.update(ledger_totals(ledger, discount=_ledger_amount(case['discount_val'])))
+            
             # Ensure status
             if 'status' not in case:
                 case['status'] = 'open'
@@ -595,137 +1637,155 @@ def get_cases():
             
         return jsonify({
             'cases': serialize_doc(cases),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting cases: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _name_lookup(local_field, collection, as_field, fields=('name',)):
+    """$lookup stage that joins only the given fields of a referenced document"""
+    return {'$lookup': {
+        'from': collection,
+        'let': {'refId': '$' + local_field},
+        'pipeline': [
+            {'$match': {'$expr': {'$eq': ['$_id', '$$refId']}}},
+            {'$project': {field: 1 for field in fields}}
+        ],
+        'as': as_field
+    }}
+
+def _case_children_lookup(collection, as_field, sort=None, name_lookups=()):
+    """$lookup stage for the documents of a collection that belong to the case"""
+    pipeline = [{'$match': {'$expr': {'$eq': ['$case_id', '$$caseId']}}}]
+    if sort:
+        pipeline.append({'$sort': sort})
+    pipeline.extend(name_lookups)
+    return {'$lookup': {
+        'from': collection,
+        'let': {'caseId': '$_id'},
+        'pipeline': pipeline,
+        'as': as_field
+    }}
+
+def _apply_joined_name(doc, as_field, target, source='name'):
+    """Copy a field from a joined reference (if it was found) and drop the join array"""
+    joined = doc.pop(as_field, None)
+    if joined:
+        doc[target] = joined[0].get(source, '')
+
+def build_case_detail(case_id):
+    """
+    Build the GET /api/cases/<id> payload with a single aggregation.
+    Patient, referrer, charges, legacy doctor charges, appointments, prescriptions
+    and case studies (with their patient/doctor/charge names) are joined server-side.
+    Returns None if the case does not exist.
+    """
+    to_object_id = lambda field: {'$convert': {'input': field, 'to': 'objectId', 'onError': None, 'onNull': None}}
+    pipeline = [
+        {'$match': {'_id': case_id}},
+        {'$addFields': {
+            '_patient_oid': to_object_id('$patient_id'),
+            '_referred_by_oid': to_object_id('$referred_by_id')
+        }},
+        {'$lookup': {'from': 'patients', 'localField': '_patient_oid', 'foreignField': '_id', 'as': '_patient'}},
+        _name_lookup('_referred_by_oid', 'patients', '_referrer_patient'),
+        _name_lookup('_referred_by_oid', 'doctors', '_referrer_doctor'),
+        _case_children_lookup('case_charges', '_charges', sort={'created_at': -1}, name_lookups=[
+            _name_lookup('charge_master_id', 'charge_master', '_charge_master'),
+            _name_lookup('doctor_id', 'doctors', '_doctor')
+        ]),
+        _case_children_lookup('case_doctor_charges', '_legacy_doctor_charges', name_lookups=[
+            _name_lookup('doctor_id', 'doctors', '_doctor')
+        ]),
+        _case_children_lookup('appointments', '_appointments', name_lookups=[
+            _name_lookup('patient_id', 'patients', '_patient'),
+            _name_lookup('doctor_id', 'doctors', '_doctor')
+        ]),
+        _case_children_lookup('prescriptions', '_prescriptions', sort={'created_at': -1}, name_lookups=[
+            _name_lookup('patient_id', 'patients', '_patient'),
+            _name_lookup('doctor_id', 'doctors', '_doctor')
+        ]),
+        _case_children_lookup('case_studies', '_case_studies', sort={'created_at': -1}, name_lookups=[
+            _name_lookup('doctor_id', 'doctors', '_doctor')
+        ])
+    ]
+    result = list(db.cases.aggregate(pipeline))
+    if not result:
+        return None
+    case = result[0]
+    case.pop('_patient_oid', None)
+    case.pop('_referred_by_oid', None)
+    
+    # Populate patient
+    patient = case.pop('_patient', [])
+    if 'patient_id' in case and patient:
+        case['patient'] = serialize_doc(patient[0])
+    
+    # Populate referred_by name
+    referrer_patient = case.pop('_referrer_patient', [])
+    referrer_doctor = case.pop('_referrer_doctor', [])
+    if 'referred_by_id' in case and 'referred_by_type' in case and case['referred_by_id']:
+        referred_by = referrer_patient if case['referred_by_type'] == 'patient' else referrer_doctor
+        if referred_by:
+            case['referred_by_name'] = referred_by[0].get('name', '')
+    
+    # Split case charges (patient charges) into categories
+    hospital_charges = []
+    pathology_charges = []
+    pharmacy_charges = []
+    new_doctor_charges = []
+    for charge in case.pop('_charges', []):
+        _apply_joined_name(charge, '_charge_master', 'charge_name')
+        _apply_joined_name(charge, '_doctor', 'doctor_name')
+        ctype = charge.get('charge_type', 'hospital')
+        if charge.get('is_doctor_charge'):
+            # Normalize for doctor charges UI expectations
+            charge['amount'] = charge.get('total_amount', 0)
+            charge['date'] = charge.get('charge_date')
+            new_doctor_charges.append(charge)
+        elif ctype == 'pathology':
+            pathology_charges.append(charge)
+        elif ctype == 'pharmacy':
+            pharmacy_charges.append(charge)
+        else:
+            hospital_charges.append(charge)
+    case['charges'] = serialize_doc(hospital_charges)
+    case['pathology_charges'] = serialize_doc(pathology_charges)
+    case['pharmacy_charges'] = serialize_doc(pharmacy_charges)
+    
+    # Combine legacy and new doctor charges
+    case_doctor_charges = case.pop('_legacy_doctor_charges', [])
+    for charge in case_doctor_charges:
+        _apply_joined_name(charge, '_doctor', 'doctor_name')
+    case['doctor_charges'] = serialize_doc(case_doctor_charges + new_doctor_charges)
+    
+    case_appointments = case.pop('_appointments', [])
+    for apt in case_appointments:
+        _apply_joined_name(apt, '_patient', 'patient_name')
+        _apply_joined_name(apt, '_doctor', 'doctor_name')
+    case['appointments'] = serialize_doc(case_appointments)
+    
+    case_prescriptions = case.pop('_prescriptions', [])
+    for pres in case_prescriptions:
+        _apply_joined_name(pres, '_patient', 'patient_name')
+        _apply_joined_name(pres, '_doctor', 'doctor_name')
+    case['prescriptions'] = serialize_doc(case_prescriptions)
+    
+    case_studies = case.pop('_case_studies', [])
+    for study in case_studies:
+        _apply_joined_name(study, '_doctor', 'doctor_name')
+    case['case_studies'] = serialize_doc(case_studies)
+    
+    return serialize_doc(case)
+
 @app.route('/api/cases/<id>', methods=['GET'])
 def get_case(id):
     try:
-        case = db.cases.find_one({'_id': parse_object_id(id)})
+        case = build_case_detail(parse_object_id(id))
         if not case:
             return jsonify({'error': 'Case not found'}), 404
-        
-        # Populate patient
-        if 'patient_id' in case:
-            patient_id_obj = case['patient_id']
-            # Convert patient_id to ObjectId if it's a string
-            if isinstance(patient_id_obj, str):
-                patient_id_obj = parse_object_id(patient_id_obj)
-            if patient_id_obj:
-                patient = db.patients.find_one({'_id': patient_id_obj})
-                if patient:
-                    case['patient'] = serialize_doc(patient)
-        
-        # Populate referred_by name
-        if 'referred_by_id' in case and 'referred_by_type' in case and case['referred_by_id']:
-            referred_by_id_obj = case['referred_by_id']
-            # Convert to ObjectId if it's a string
-            if isinstance(referred_by_id_obj, str):
-                referred_by_id_obj = parse_object_id(referred_by_id_obj)
-            if referred_by_id_obj:
-                if case['referred_by_type'] == 'patient':
-                    referred_by = db.patients.find_one({'_id': referred_by_id_obj})
-                else:  # doctor
-                    referred_by = db.doctors.find_one({'_id': referred_by_id_obj})
-                if referred_by:
-                    case['referred_by_name'] = referred_by.get('name', '')
-        
-        # Get case charges (patient charges)
-        all_charges = list(db.case_charges.find({'case_id': parse_object_id(id)}).sort('created_at', -1))
-        
-        hospital_charges = []
-        pathology_charges = []
-        pharmacy_charges = []
-        new_doctor_charges = []
-        
-        # Populate charge master names and doctor names
-        for charge in all_charges:
-            ctype = charge.get('charge_type', 'hospital')
-            
-            if 'charge_master_id' in charge:
-                charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
-                if charge_master:
-                    charge['charge_name'] = charge_master.get('name', '')
-            
-            # Populate doctor name if doctor_id exists
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
-            
-            # Split into categories
-            if charge.get('is_doctor_charge'):
-                # Normalize for doctor charges UI expectations
-                charge['amount'] = charge.get('total_amount', 0)
-                charge['date'] = charge.get('charge_date')
-                new_doctor_charges.append(charge)
-            elif ctype == 'pathology':
-                pathology_charges.append(charge)
-            elif ctype == 'pharmacy':
-                pharmacy_charges.append(charge)
-            else:
-                hospital_charges.append(charge)
-                
-        case['charges'] = serialize_doc(hospital_charges)
-        case['pathology_charges'] = serialize_doc(pathology_charges)
-        case['pharmacy_charges'] = serialize_doc(pharmacy_charges)
-        
-        # Get case doctor charges (legacy)
-        case_doctor_charges = list(db.case_doctor_charges.find({'case_id': parse_object_id(id)}))
-        # Populate doctor names
-        for charge in case_doctor_charges:
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
-                    
-        # Combine legacy and new doctor charges
-        case['doctor_charges'] = serialize_doc(case_doctor_charges + new_doctor_charges)
-        
-        # Get appointments for this case
-        case_appointments = list(db.appointments.find({'case_id': parse_object_id(id)}))
-        # Populate patient names and doctor names
-        for apt in case_appointments:
-            if 'patient_id' in apt:
-                patient = db.patients.find_one({'_id': apt['patient_id']})
-                if patient:
-                    apt['patient_name'] = patient.get('name', '')
-            if 'doctor_id' in apt:
-                doctor = db.doctors.find_one({'_id': apt['doctor_id']})
-                if doctor:
-                    apt['doctor_name'] = doctor.get('name', '')
-        case['appointments'] = serialize_doc(case_appointments)
-        
-        # Get prescriptions for this case
-        case_prescriptions = list(db.prescriptions.find({'case_id': parse_object_id(id)}).sort('created_at', -1))
-        # Populate patient and doctor names
-        for pres in case_prescriptions:
-            if 'patient_id' in pres and pres['patient_id']:
-                patient = db.patients.find_one({'_id': pres['patient_id']})
-                if patient:
-                    pres['patient_name'] = patient.get('name', '')
-            if 'doctor_id' in pres and pres['doctor_id']:
-                doctor = db.doctors.find_one({'_id': pres['doctor_id']})
-                if doctor:
-                    pres['doctor_name'] = doctor.get('name', '')
-        case['prescriptions'] = serialize_doc(case_prescriptions)
-
-        # Get case studies
-        case_studies = list(db.case_studies.find({'case_id': parse_object_id(id)}).sort('created_at', -1))
-        # Populate doctor names
-        for study in case_studies:
-            if 'doctor_id' in study and study['doctor_id']:
-                doctor = db.doctors.find_one({'_id': study['doctor_id']})
-                if doctor:
-                    study['doctor_name'] = doctor.get('name', '')
-        case['case_studies'] = serialize_doc(case_studies)
-        
-        return jsonify(serialize_doc(case))
+        return jsonify(case)
     except Exception as e:
         logging.error(f"Error getting case: {e}")
         return jsonify({'error': str(e)}), 500
@@ -784,6 +1844,7 @@ def create_case():
                 pass  # Keep as string if parsing fails, or handle error
 
         data['created_at'] = datetime.now()
+        data.update(search_fields('cases', data))
         result = db.cases.insert_one(data)
         
         # Auto-add default IPD charges
@@ -814,6 +1875,9 @@ def create_case():
                 if case_charges:
                     db.case_charges.insert_many(case_charges)
 
+        rebuild_case_ledger(result.inserted_id)
+        refresh_monthly_report_for_case(result.inserted_id, data.get('admission_date'))
+
         return jsonify({'id': str(result.inserted_id), 'message': 'Case created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating case: {e}")
@@ -833,28 +1897,11 @@ def update_case(id):
         
         # Check if trying to close the case
         if data.get('status') == 'closed':
-            # Calculate total charges
-            pipeline_charges = [
-                {'$match': {'case_id': case_id_obj}},
-                {'$group': {'_id': None, 'total': {'$sum': '$total_amount'}}}
-            ]
-            charges_result = list(db.case_charges.aggregate(pipeline_charges))
-            total_charges = charges_result[0]['total'] if charges_result else 0
-            
-            # Add legacy doctor charges
-            doctor_charges_legacy = list(db.case_doctor_charges.find({'case_id': case_id_obj}))
-            total_charges += sum(c.get('amount', 0) for c in doctor_charges_legacy)
+            # Totals from a freshly rebuilt ledger, as in close_case
+            totals = bill_totals(rebuild_case_ledger(case_id_obj))
             
-            # Calculate total payments
-            pipeline_payments = [
-                {'$match': {'case_id': case_id_obj}},
-                {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-            ]
-            payments_result = list(db.payments.aggregate(pipeline_payments))
-            total_payments = payments_result[0]['total'] if payments_result else 0
-            
-            if total_payments < total_charges:
-                return jsonify({'error': f'Cannot close case. Payment overdue. Total: {total_charges}, Paid: {total_payments}'}), 400
+            if totals['balance'] > 0.01:
+                return jsonify({'error': f"Cannot close case. Payment overdue. Total: {totals['total_after_discount']}, Paid: {totals['total_paid']}"}), 400
 
         # Convert patient_id to ObjectId if present
         if 'patient_id' in data and data['patient_id']:
@@ -866,6 +1913,12 @@ def update_case(id):
         
         data['updated_at'] = datetime.now()
         result = db.cases.update_one({'_id': case_id_obj}, {'$set': data})
+        if 'case_number' in data and result.modified_count:
+            reindex_document(db, 'cases', case_id_obj)
+        if 'discount' in data and result.matched_count:
+            set_ledger_discount(case_id_obj, data['discount'])
+        if result.modified_count and {'admission_date', 'discount', 'patient_id'} & data.keys():
+            refresh_monthly_report_for_case(case_id_obj, data.get('admission_date'))
         if result.modified_count:
             return jsonify({'message': 'Case updated successfully'})
         return jsonify({'message': 'Case updated successfully (No changes made)'}) # Handle no changes but valid request
@@ -874,22 +1927,16 @@ def update_case(id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cases/<id>', methods=['DELETE'])
+@auth_required(role='admin', message='Forbidden: Only admin can delete cases')
 def delete_case(id):
     try:
-        # Role check
-        user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not user or user.get('role') != 'admin':
-            return jsonify({'error': 'Forbidden: Only admin can delete cases'}), 403
-
         if is_case_closed(id):
             return jsonify({'error': 'Cannot delete a closed case'}), 400
 
         result = db.cases.delete_one({'_id': parse_object_id(id)})
         if result.deleted_count:
+            db.case_ledgers.delete_one({'_id': parse_object_id(id)})
+            db.monthly_report_rows.delete_many({'case_id': parse_object_id(id)})
             return jsonify({'message': 'Case deleted successfully'})
         return jsonify({'error': 'Case not found'}), 404
     except Exception as e:
@@ -903,7 +1950,6 @@ def get_appointments():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        skip = (page - 1) * limit
         
         # Build Query
         query = {}
@@ -928,33 +1974,120 @@ def get_appointments():
         elif len(filters) == 1:
             query = filters[0]
         
-        # Get total count for pagination
-        total = db.appointments.count_documents(query)
-        
-        # Get paginated results
-        appointments = list(db.appointments.find(query).sort('created_at', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        appointments, page_meta = fetch_page(db.appointments, query, 'created_at', page, limit)
         
         # Populate patient names and doctor names
-        for apt in appointments:
-            if 'patient_id' in apt:
-                patient = db.patients.find_one({'_id': apt['patient_id']})
-                if patient:
-                    apt['patient_name'] = patient.get('name', '')
-            if 'doctor_id' in apt:
-                doctor = db.doctors.find_one({'_id': apt['doctor_id']})
-                if doctor:
-                    apt['doctor_name'] = doctor.get('name', '')
+        resolve_references(appointments, 'patient_id', 'patients', {'patient_name': 'name'})
+        resolve_references(appointments, 'doctor_id', 'doctors', {'doctor_name': 'name'})
         
         return jsonify({
             'appointments': serialize_doc(appointments),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting appointments: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Calendar rows are streamed in batches; names are resolved with one $in per batch
+CALENDAR_BATCH_SIZE = int(os.getenv('CALENDAR_BATCH_SIZE', 500))
+CALENDAR_FIELDS = {'patient_id': 1, 'doctor_id': 1, 'case_id': 1,
+                   'appointment_date': 1, 'appointment_time': 1, 'status': 1}
+
+def calendar_query(start, end, doctor_id=None):
+    """
+    Appointments with appointment_date in [start, end). The UI stores dates as
+    'YYYY-MM-DD' strings and imports as datetimes; each type gets its own
+    bounded range so both are served by the appointment_date index.
+    """
+    query = {'$or': [
+        {'appointment_date': {'$gte': start.strftime('%Y-%m-%d'), '$lt': end.strftime('%Y-%m-%d')}},
+        {'appointment_date': {'$gte': start, '$lt': end}}
+    ]}
+    if doctor_id:
+        query['doctor_id'] = doctor_id
+    return query
+
+def calendar_day_counts(query):
+    """Number of matching appointments per day, keyed by 'YYYY-MM-DD'"""
+    pipeline = [
+        {'$match': query},
+        {'$group': {
+            '_id': {'$cond': [
+                {'$eq': [{'$type': '$appointment_date'}, 'date']},
+                {'$dateToString': {'format': '%Y-%m-%d', 'date': '$appointment_date'}},
+                {'$substrCP': ['$appointment_date', 0, 10]}
+            ]},
+            'count': {'$sum': 1}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+    return {row['_id']: row['count'] for row in db.appointments.aggregate(pipeline)}
+
+def stream_calendar(cursor, meta, endpoint):
+    """JSON body of meta plus every appointment of cursor, produced one batch at a time"""
+    def dumps(obj):
+        return app.json.dumps(obj, separators=(',', ':'))
+
+    total = 0
+    try:
+        yield dumps(meta)[:-1] + ',"appointments":['  # meta without its closing brace
+        while True:
+            # Commands issued after the view returned still count towards its endpoint
+            with mongo_metrics.attributed_to(endpoint):
+                batch = list(islice(cursor, CALENDAR_BATCH_SIZE))
+                if not batch:
+                    break
+                resolve_references(batch, 'patient_id', 'patients', {'patient_name': 'name'}, default='Unknown')
+                resolve_references(batch, 'doctor_id', 'doctors', {'doctor_name': 'name'}, default='Unknown')
+            rows = ','.join(dumps(row) for row in serialize_doc(batch))
+            yield (',' if total else '') + rows
+            total += len(batch)
+        yield f'],"total":{total}}}'
+    except Exception as e:
+        # Headers are already sent; the truncated body fails to parse on the client
+        logging.error(f"Error streaming calendar appointments: {e}")
+    finally:
+        cursor.close()
+
+@app.route('/api/appointments/calendar', methods=['GET'])
+def get_calendar_appointments():
+    """
+    Appointments from start to end (YYYY-MM-DD, both inclusive), optionally for one
+    doctor_id, ordered by date and time. Streams all of them as compact rows with
+    patient and doctor names; with counts=1 returns only per-day counts (month view).
+    """
+    try:
+        try:
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d')
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1)
+        except (KeyError, ValueError):
+            return jsonify({'error': 'start and end are required as YYYY-MM-DD'}), 400
+        if end <= start:
+            return jsonify({'error': 'end must not be before start'}), 400
+        
+        doctor_id = None
+        if request.args.get('doctor_id'):
+            doctor_id = parse_object_id(request.args.get('doctor_id'))
+            if not doctor_id:
+                return jsonify({'error': 'Invalid doctor_id'}), 400
+        
+        query = calendar_query(start, end, doctor_id)
+        meta = {'start': request.args['start'], 'end': request.args['end']}
+        
+        if request.args.get('counts') in ('1', 'true'):
+            days = calendar_day_counts(query)
+            return jsonify({**meta, 'days': days, 'total': sum(days.values())})
+        
+        cursor = db.appointments.find(query, CALENDAR_FIELDS).sort(
+            [('appointment_date', 1), ('appointment_time', 1)]
+        ).batch_size(CALENDAR_BATCH_SIZE)
+        return app.response_class(stream_with_context(stream_calendar(cursor, meta, request.endpoint)),
+                                  mimetype='application/json')
+    except Exception as e:
+        logging.error(f"Error getting calendar appointments: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/appointments', methods=['POST'])
 def create_appointment():
     try:
@@ -1031,7 +2164,6 @@ def get_prescriptions():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        skip = (page - 1) * limit
         case_id = request.args.get('case_id')
         
         # Build query
@@ -1039,28 +2171,16 @@ def get_prescriptions():
         if case_id:
             query['case_id'] = parse_object_id(case_id)
         
-        # Get total count for pagination
-        total = db.prescriptions.count_documents(query)
-        
-        # Get paginated results
-        prescriptions = list(db.prescriptions.find(query).sort('created_at', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        prescriptions, page_meta = fetch_page(db.prescriptions, query, 'created_at', page, limit)
         
         # Populate patient and doctor names
-        for pres in prescriptions:
-            if 'patient_id' in pres and pres['patient_id']:
-                patient = db.patients.find_one({'_id': pres['patient_id']})
-                if patient:
-                    pres['patient_name'] = patient.get('name', '')
-            if 'doctor_id' in pres and pres['doctor_id']:
-                doctor = db.doctors.find_one({'_id': pres['doctor_id']})
-                if doctor:
-                    pres['doctor_name'] = doctor.get('name', '')
+        resolve_references(prescriptions, 'patient_id', 'patients', {'patient_name': 'name'})
+        resolve_references(prescriptions, 'doctor_id', 'doctors', {'doctor_name': 'name'})
         
         return jsonify({
             'prescriptions': serialize_doc(prescriptions),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting prescriptions: {e}")
@@ -1180,6 +2300,7 @@ def delete_prescription(id):
 # ==================== CHARGE MASTER API ====================
 
 @app.route('/api/charge-master', methods=['GET'])
+@reference_etag('charge_master')
 def get_charge_master():
     try:
         page = int(request.args.get('page', 1))
@@ -1192,13 +2313,8 @@ def get_charge_master():
         # Build query for search
         query = {}
         if search:
-            query = {
-                '$or': [
-                    {'name': {'$regex': search, '$options': 'i'}},
-                    {'category': {'$regex': search, '$options': 'i'}},
-                    {'charge_category': {'$regex': search, '$options': 'i'}}
-                ]
-            }
+            # Indexed prefix match on name, category and charge_category
+            query = search_query('charge_master', search)
             
         # Get total count for pagination
         total = db.charge_master.count_documents(query)
@@ -1217,9 +2333,10 @@ def get_charge_master():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/charge-master/<id>', methods=['GET'])
+@reference_etag('charge_master')
 def get_charge_master_item(id):
     try:
-        charge = db.charge_master.find_one({'_id': parse_object_id(id)})
+        charge = get_reference_doc('charge_master', parse_object_id(id))
         if not charge:
             return jsonify({'error': 'Charge not found'}), 404
         return jsonify(serialize_doc(charge))
@@ -1232,7 +2349,9 @@ def create_charge_master():
     try:
         data = request.get_json()
         data['created_at'] = datetime.now()
+        data.update(search_fields('charge_master', data))
         result = db.charge_master.insert_one(data)
+        invalidate_reference('charge_master', result.inserted_id)
         return jsonify({'id': str(result.inserted_id), 'message': 'Charge created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating charge: {e}")
@@ -1244,6 +2363,8 @@ def update_charge_master(id):
         data = request.get_json()
         data['updated_at'] = datetime.now()
         result = db.charge_master.update_one({'_id': parse_object_id(id)}, {'$set': data})
+        reindex_document(db, 'charge_master', parse_object_id(id))
+        invalidate_reference('charge_master', parse_object_id(id))
         if result.modified_count:
             return jsonify({'message': 'Charge updated successfully'})
         return jsonify({'error': 'Charge not found'}), 404
@@ -1255,6 +2376,7 @@ def update_charge_master(id):
 def delete_charge_master(id):
     try:
         result = db.charge_master.delete_one({'_id': parse_object_id(id)})
+        invalidate_reference('charge_master', parse_object_id(id))
         if result.deleted_count:
             return jsonify({'message': 'Charge deleted successfully'})
         return jsonify({'error': 'Charge not found'}), 404
@@ -1265,6 +2387,7 @@ def delete_charge_master(id):
 # ==================== CHARGE CATEGORY MASTER API ====================
 
 @app.route('/api/charge-category-master', methods=['GET'])
+@reference_etag('charge_category_master')
 def get_charge_categories():
     try:
         categories = list(db.charge_category_master.find().sort('name', 1))
@@ -1289,11 +2412,58 @@ def create_charge_category():
         data['name'] = name
         data['created_at'] = datetime.now()
         result = db.charge_category_master.insert_one(data)
+        invalidate_reference('charge_category_master')
         return jsonify({'id': str(result.inserted_id), 'message': 'Category created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating charge category: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== BOOTSTRAP API ====================
+
+# Lookup lists behind the UI's dropdowns; the response is rebuilt only when one of their versions changes
+BOOTSTRAP_COLLECTIONS = ('doctors', 'charge_master', 'charge_category_master')
+bootstrap_cache = ReferenceCache('bootstrap', max_size=4)
+
+def build_bootstrap():
+    """Compact projections of the lookup lists (active doctors, charge master, charge categories)"""
+    doctors = db.doctors.find(
+        {'$or': [{'isActive': True}, {'isActive': {'$exists': False}}]},
+        {'name': 1, 'specialization': 1, 'isInhouse': 1}
+    ).sort([('created_at', -1), ('_id', -1)])
+    charges = db.charge_master.find(
+        {}, {'name': 1, 'amount': 1, 'category': 1, 'charge_category': 1}
+    ).sort([('created_at', -1), ('_id', -1)])
+    categories = db.charge_category_master.find({}, {'name': 1}).sort('name', 1)
+    return {
+        'doctors': serialize_doc(list(doctors)),
+        'charges': serialize_doc(list(charges)),
+        'categories': serialize_doc(list(categories))
+    }
+
+@app.route('/api/bootstrap', methods=['GET'])
+@reference_etag(*BOOTSTRAP_COLLECTIONS)
+def get_bootstrap():
+    """All dropdown lookup lists in one compact, gzip-compressed response, cached per version"""
+    try:
+        version = '-'.join(reference_versions.get(collection) for collection in BOOTSTRAP_COLLECTIONS)
+        bodies = bootstrap_cache.get(version)
+        if bodies is _MISSING:
+            payload = dict(build_bootstrap(), version=version)
+            body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+            bodies = (body, gzip.compress(body))
+            bootstrap_cache.set(version, bodies)
+        
+        if 'gzip' in request.accept_encodings:
+            response = app.response_class(bodies[1], mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = app.response_class(bodies[0], mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        return response
+    except Exception as e:
+        logging.error(f"Error getting bootstrap data: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== CASE CHARGES API (Patient Charges) ====================
 
 @app.route('/api/case-charges', methods=['GET'])
@@ -1306,11 +2476,7 @@ def get_case_charges():
         charges = list(db.case_charges.find(query))
         
         # Populate charge master names
-        for charge in charges:
-            if 'charge_master_id' in charge:
-                charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
-                if charge_master:
-                    charge['charge_name'] = charge_master.get('name', '')
+        resolve_references(charges, 'charge_master_id', 'charge_master', {'charge_name': 'name'})
         
         return jsonify(serialize_doc(charges))
     except Exception as e:
@@ -1395,106 +2561,17 @@ def create_case_charge():
             data['file_path'] = file_path
 
         result = db.case_charges.insert_one(data)
-        
-        # Sync Payout Logic (Auto-Create/Update)
-        if 'doctor_id' in data and data['doctor_id']:
-             sync_payout_for_case(data['case_id'], data['doctor_id'])
+        # Also auto-creates the doctor's payout
+        on_financial_change('charge', after=data, create_payout=True)
         
         return jsonify({'message': 'Case charge added successfully', 'id': str(result.inserted_id)}), 201
     except Exception as e:
         logging.error(f"Error creating case charge: {e}")
         return jsonify({'error': str(e)}), 500
 
-def sync_payout_for_case(case_id, doctor_id):
-    """
-    Calculates total doctor share for a specific case and doctor.
-    Creates or updates the Payout record.
-    """
-    try:
-        # Calculate Total Doctor Share
-        pipeline = [
-            {
-                '$match': {
-                    'case_id': case_id,
-                    'doctor_id': doctor_id
-                }
-            },
-            {
-                '$group': {
-                    '_id': None,
-                    'charges': {'$push': '$$ROOT'}
-                }
-            }
-        ]
-        
-        agg = list(db.case_charges.aggregate(pipeline))
-        if not agg:
-            return 
-            
-        charges = agg[0]['charges']
-        total_doc_amount = 0
-        total_hospital_amount = 0
-        
-        for charge in charges:
-            qty = charge.get('quantity', 1)
-            total_hospital_amount += charge.get('total_amount', 0)
-            
-            doc_rate = 0
-            # Check doctor specific rate
-            dc = db.doctor_charges.find_one({
-                'doctor_id': doctor_id,
-                'charge_master_id': charge['charge_master_id']
-            })
-            
-            if dc:
-                doc_rate = dc.get('amount', 0)
-            else:
-                pass 
-                
-            total_doc_amount += doc_rate * qty
-
-        # Find Existing Payout
-        existing_payout = db.payouts.find_one({
-            'case_id': case_id,
-            'doctor_id': doctor_id
-        })
-        
-        if existing_payout:
-            update_data = {
-                'total_charge_amount': total_hospital_amount,
-                'doctor_charge_amount': total_doc_amount,
-                'updated_at': datetime.now()
-            }
-            db.payouts.update_one({'_id': existing_payout['_id']}, {'$set': update_data})
-        else:
-            case = db.cases.find_one({'_id': case_id})
-            doctor = db.doctors.find_one({'_id': doctor_id})
-            
-            new_payout = {
-                'case_id': case_id,
-                'doctor_id': doctor_id,
-                'case_number': case.get('case_number') if case else '',
-                'patient_name': case.get('patient_name') if case else '',
-                'doctor_name': doctor.get('name') if doctor else '',
-                'total_charge_amount': total_hospital_amount,
-                'doctor_charge_amount': total_doc_amount,
-                'payment_status': 'pending', 
-                'created_at': datetime.now(),
-                'updated_at': datetime.now()
-            }
-            if not new_payout['patient_name'] and case and case.get('patient_id'):
-                 pat = db.patients.find_one({'_id': case['patient_id']})
-                 if pat:
-                     new_payout['patient_name'] = pat.get('name')
-                     
-            db.payouts.insert_one(new_payout)
-            
-    except Exception as e:
-        logging.error(f"Error syncing payout for case {case_id}: {e}")
-
-@app.route('/api/case-charges/<id>', methods=['PUT'])
-@login_required
-def update_case_charge(id):
+@app.route('/api/case-charges/<id>', methods=['PUT'])
+@login_required
+def update_case_charge(id):
     try:
         data = request.get_json()
         
@@ -1538,6 +2615,7 @@ def update_case_charge(id):
         data['updated_at'] = datetime.now()
         result = db.case_charges.update_one({'_id': parse_object_id(id)}, {'$set': data})
         if result.modified_count:
+            on_financial_change('charge', existing_charge, {**existing_charge, **data})
             return jsonify({'message': 'Case charge updated successfully'})
         return jsonify({'error': 'Case charge not found'}), 404
     except Exception as e:
@@ -1571,6 +2649,7 @@ def delete_case_charge(id):
             
         result = db.case_charges.delete_one({'_id': charge_id})
         if result.deleted_count:
+            on_financial_change('charge', before=charge)
             return jsonify({'message': 'Case charge deleted successfully'})
         return jsonify({'error': 'Case charge not found'}), 404
     except Exception as e:
@@ -1580,45 +2659,34 @@ def delete_case_charge(id):
 # ==================== DOCTOR CHARGES API ====================
 
 @app.route('/api/doctor-charges', methods=['GET'])
+@reference_etag('doctor_charges', 'doctors', 'charge_master')
 def get_doctor_charges():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        skip = (page - 1) * limit
         
         doctor_id = request.args.get('doctor_id')
         query = {}
         if doctor_id:
             query['doctor_id'] = parse_object_id(doctor_id)
         
-        # Get total count for pagination
-        total = db.doctor_charges.count_documents(query)
-        
-        # Get paginated results
-        charges = list(db.doctor_charges.find(query).sort('created_at', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        charges, page_meta = fetch_page(db.doctor_charges, query, 'created_at', page, limit)
         
         # Populate doctor names and charge master names
-        for charge in charges:
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
-            if 'charge_master_id' in charge:
-                charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
-                if charge_master:
-                    charge['charge_master_name'] = charge_master.get('name', '')
+        resolve_references(charges, 'doctor_id', 'doctors', {'doctor_name': 'name'})
+        resolve_references(charges, 'charge_master_id', 'charge_master', {'charge_master_name': 'name'})
         
         return jsonify({
             'charges': serialize_doc(charges),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting doctor charges: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/doctors-by-charge', methods=['GET'])
+@reference_etag('doctor_charges', 'doctors')
 def get_doctors_by_charge():
     try:
         charge_master_id = request.args.get('charge_master_id')
@@ -1644,6 +2712,7 @@ def get_doctors_by_charge():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/doctor-charges/<id>', methods=['GET'])
+@reference_etag('doctor_charges', 'doctors', 'charge_master')
 def get_doctor_charge(id):
     try:
         charge = db.doctor_charges.find_one({'_id': parse_object_id(id)})
@@ -1652,11 +2721,11 @@ def get_doctor_charge(id):
         
         # Populate names
         if 'doctor_id' in charge:
-            doctor = db.doctors.find_one({'_id': charge['doctor_id']})
+            doctor = get_reference_doc('doctors', charge['doctor_id'])
             if doctor:
                 charge['doctor_name'] = doctor.get('name', '')
         if 'charge_master_id' in charge:
-            charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
+            charge_master = get_reference_doc('charge_master', charge['charge_master_id'])
             if charge_master:
                 charge['charge_master_name'] = charge_master.get('name', '')
         
@@ -1676,7 +2745,7 @@ def create_doctor_charge():
             data['doctor_id'] = doctor_id
             
             # Check if doctor is Inhouse
-            doctor = db.doctors.find_one({'_id': doctor_id})
+            doctor = get_reference_doc('doctors', doctor_id)
             if doctor and doctor.get('isInhouse'):
                 return jsonify({'error': 'Cannot configure charges for Inhouse doctors'}), 400
                 
@@ -1685,6 +2754,7 @@ def create_doctor_charge():
         
         data['created_at'] = datetime.now()
         result = db.doctor_charges.insert_one(data)
+        invalidate_reference('doctor_charges')
         return jsonify({'id': str(result.inserted_id), 'message': 'Doctor charge created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating doctor charge: {e}")
@@ -1703,6 +2773,7 @@ def update_doctor_charge(id):
         
         data['updated_at'] = datetime.now()
         result = db.doctor_charges.update_one({'_id': parse_object_id(id)}, {'$set': data})
+        invalidate_reference('doctor_charges')
         if result.modified_count:
             return jsonify({'message': 'Doctor charge updated successfully'})
         return jsonify({'error': 'Doctor charge not found'}), 404
@@ -1714,6 +2785,7 @@ def update_doctor_charge(id):
 def delete_doctor_charge(id):
     try:
         result = db.doctor_charges.delete_one({'_id': parse_object_id(id)})
+        invalidate_reference('doctor_charges')
         if result.deleted_count:
             return jsonify({'message': 'Doctor charge deleted successfully'})
         return jsonify({'error': 'Doctor charge not found'}), 404
@@ -1734,11 +2806,7 @@ def get_case_doctor_charges():
         charges = list(db.case_doctor_charges.find(query))
         
         # Populate doctor names
-        for charge in charges:
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
+        resolve_references(charges, 'doctor_id', 'doctors', {'doctor_name': 'name'})
         
         return jsonify(serialize_doc(charges))
     except Exception as e:
@@ -1759,7 +2827,7 @@ def get_case_doctor_charge(id):
         
         # Populate doctor name
         if 'doctor_id' in charge:
-            doctor = db.doctors.find_one({'_id': charge['doctor_id']})
+            doctor = get_reference_doc('doctors', charge['doctor_id'])
             if doctor:
                 charge['doctor_name'] = doctor.get('name', '')
         
@@ -1789,7 +2857,7 @@ def create_case_doctor_charge():
         charge_type = 'Consultation'
         
         if charge_master_id:
-            cm = db.charge_master.find_one({'_id': parse_object_id(charge_master_id)})
+            cm = get_reference_doc('charge_master', parse_object_id(charge_master_id))
             if cm:
                 charge_name = cm.get('name', 'Doctor Charge')
                 charge_type = cm.get('category', 'Consultation')
@@ -1811,6 +2879,7 @@ def create_case_doctor_charge():
         }
         
         result = db.case_charges.insert_one(charge_record)
+        on_financial_change('charge', after=charge_record)
         return jsonify({'id': str(result.inserted_id), 'message': 'Doctor charge added successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating doctor charge: {e}")
@@ -1837,7 +2906,7 @@ def update_case_doctor_charge(id):
         if 'charge_master_id' in data: 
             cm_id = data['charge_master_id']
             update_fields['charge_master_id'] = parse_object_id(cm_id)
-            cm = db.charge_master.find_one({'_id': parse_object_id(cm_id)})
+            cm = get_reference_doc('charge_master', parse_object_id(cm_id))
             if cm:
                 update_fields['charge_name'] = cm.get('name', 'Doctor Charge')
                 update_fields['charge_type'] = cm.get('category', 'Consultation')
@@ -1853,7 +2922,10 @@ def update_case_doctor_charge(id):
         if 'notes' in data: update_fields['notes'] = data['notes']
         update_fields['updated_at'] = datetime.now()
         
-        collection.update_one({'_id': target_id}, {'$set': update_fields})
+        result = collection.update_one({'_id': target_id}, {'$set': update_fields})
+        if existing and result.modified_count:
+            on_financial_change('charge' if is_new_collection else 'legacy_charge',
+                                existing, {**existing, **update_fields})
         return jsonify({'message': 'Doctor charge updated successfully'})
     except Exception as e:
         logging.error(f"Error updating case doctor charge: {e}")
@@ -1865,18 +2937,21 @@ def delete_case_doctor_charge(id):
         charge_id = parse_object_id(id)
         
         # Check if closed (Checking both collections)
-        existing = db.case_charges.find_one({'_id': charge_id}) or db.case_doctor_charges.find_one({'_id': charge_id})
+        new_charge = db.case_charges.find_one({'_id': charge_id})
+        existing = new_charge or db.case_doctor_charges.find_one({'_id': charge_id})
         if existing and is_case_closed(existing.get('case_id')):
             return jsonify({'error': 'Cannot delete doctor charges for a closed case'}), 400
 
         # Try deleting from case_charges first (new schema)
         result = db.case_charges.delete_one({'_id': charge_id})
         if result.deleted_count:
+             on_financial_change('charge', before=new_charge)
              return jsonify({'message': 'Case doctor charge deleted successfully'})
              
         # Fallback to legacy
         result = db.case_doctor_charges.delete_one({'_id': charge_id})
         if result.deleted_count:
+            on_financial_change('legacy_charge', before=existing)
             return jsonify({'message': 'Case doctor charge deleted successfully'})
             
         return jsonify({'error': 'Case doctor charge not found'}), 404
@@ -2117,6 +3192,7 @@ def create_payment():
         
         # Save payment to payments collection (NO payout updates - payments are independent)
         result = db.payments.insert_one(data)
+        on_financial_change('payment', after=data)
         payment_id = str(result.inserted_id)
         logging.info(f"Payment created successfully: {payment_id} for case: {case_id}, amount: {data.get('amount')}")
         return jsonify({'id': payment_id, 'message': 'Payment created successfully'}), 201
@@ -2136,6 +3212,7 @@ def update_payment(id):
         data['updated_at'] = datetime.now()
         result = db.payments.update_one({'_id': payment_id}, {'$set': data})
         if result.modified_count:
+            on_financial_change('payment', payment, {**payment, **data})
             return jsonify({'message': 'Payment updated successfully'})
         return jsonify({'error': 'Payment not found'}), 404
     except Exception as e:
@@ -2152,6 +3229,7 @@ def delete_payment(id):
             
         result = db.payments.delete_one({'_id': payment_id})
         if result.deleted_count:
+            on_financial_change('payment', before=payment)
             return jsonify({'message': 'Payment deleted successfully'})
         return jsonify({'error': 'Payment not found'}), 404
     except Exception as e:
@@ -2174,6 +3252,7 @@ def admin_update_payment_date(id):
             new_payment_date = datetime.fromisoformat(new_payment_date.replace('Z', '+00:00'))
         
         # Update the payment
+        payment = db.payments.find_one({'_id': payment_id})
         result = db.payments.update_one(
             {'_id': payment_id},
             {'$set': {
@@ -2183,6 +3262,7 @@ def admin_update_payment_date(id):
         )
         
         if result.modified_count:
+            on_financial_change('payment', payment, {**payment, 'payment_date': new_payment_date})
             return jsonify({'message': 'Payment date updated successfully', 'payment_id': str(payment_id)})
         return jsonify({'error': 'Payment not found'}), 404
     except Exception as e:
@@ -2193,95 +3273,98 @@ def admin_update_payment_date(id):
 
 @app.route('/api/doctor-payouts', methods=['GET'])
 def get_doctor_payouts():
+    """
+    Per-case doctor payout breakdown of the cases admitted on ?date=YYYY-MM-DD,
+    or from ?start_date= to ?end_date= (inclusive)
+    """
     try:
         date = request.args.get('date')  # Format: YYYY-MM-DD
-        if not date:
+        first_day = request.args.get('start_date') or date
+        last_day = request.args.get('end_date') or date or first_day
+        if not first_day:
             return jsonify({'error': 'Date parameter is required'}), 400
         
-        # Parse date
-        date_obj = datetime.strptime(date, '%Y-%m-%d')
-        start_date = datetime.combine(date_obj.date(), datetime.min.time())
-        end_date = datetime.combine(date_obj.date(), datetime.max.time())
+        # Parse dates
+        start_date = datetime.combine(datetime.strptime(first_day, '%Y-%m-%d').date(), datetime.min.time())
+        end_date = datetime.combine(datetime.strptime(last_day, '%Y-%m-%d').date(), datetime.max.time())
         
-        # Find all cases for the date (using admission_date)
-        cases = list(db.cases.find({
-            'admission_date': {
-                '$gte': start_date,
-                '$lte': end_date
-            }
-        }))
+        # Cases admitted in range with their charges, in one round trip
+        cases = list(db.cases.aggregate([
+            {'$match': {'admission_date': {'$gte': start_date, '$lte': end_date}}},
+            {'$sort': {'admission_date': 1, '_id': 1}},
+            {'$project': {'case_number': 1, 'case_type': 1, 'patient_id': 1, 'doctor_id': 1, 'admission_date': 1}},
+            {'$lookup': {
+                'from': 'case_charges',
+                'localField': '_id',
+                'foreignField': 'case_id',
+                'pipeline': [{'$project': {'doctor_id': 1, 'charge_master_id': 1, 'quantity': 1, 'total_amount': 1}}],
+                'as': 'charges'
+            }}
+        ]))
+        
+        # Rate table, patient and doctor names for the whole range
+        rates = get_doctor_rate_docs(
+            (charge['doctor_id'], charge['charge_master_id'])
+            for case in cases for charge in case['charges']
+            if charge.get('doctor_id') and charge.get('charge_master_id')
+        )
+        resolve_references(cases, 'patient_id', 'patients', {'patient_name': 'name'})
+        doctor_ids = {doctor_id for (doctor_id, _) in rates}
+        doctor_ids.update(case['doctor_id'] for case in cases if case.get('doctor_id'))
+        doctors, _ = get_reference_docs('doctors', [doctor_id for doctor_id in doctor_ids if isinstance(doctor_id, (ObjectId, str))])
         
         payouts = []
         for case in cases:
-            # Get patient name
-            patient_name = ''
-            if 'patient_id' in case:
-                patient = db.patients.find_one({'_id': case['patient_id']})
-                if patient:
-                    patient_name = patient.get('name', '')
+            case['total_charge_amount'] = sum(charge.get('total_amount', 0) for charge in case['charges'])
             
-            # Calculate total charge amount (from case_charges)
-            case_charges = list(db.case_charges.find({'case_id': case['_id']}))
-            total_charge_amount = sum(charge.get('total_amount', 0) for charge in case_charges)
-            
-            # Get doctor charge amounts from doctor_charges collection based on charge_master_id
-            # For each case_charge with doctor_id, look up the doctor_charges amount for that category
+            # Doctor share per doctor: doctor_charges rate x quantity for each charge with a configured rate
             doctor_charges_by_doctor = {}
-            for charge in case_charges:
-                if 'doctor_id' in charge and charge['doctor_id'] and 'charge_master_id' in charge and charge['charge_master_id']:
-                    doctor_id = charge['doctor_id']
-                    charge_master_id = charge['charge_master_id']
-                    quantity = charge.get('quantity', 1)
-                    
-                    # Look up doctor_charges to get the amount for this doctor and charge category
-                    doctor_charge = db.doctor_charges.find_one({
-                        'doctor_id': doctor_id,
-                        'charge_master_id': charge_master_id
-                    })
-                    
-                    if doctor_charge:
-                        # Get the amount from doctor_charges and multiply by quantity
-                        doctor_charge_amount = doctor_charge.get('amount', 0) * quantity
-                        
-                        doctor_id_str = str(doctor_id)
-                        if doctor_id_str not in doctor_charges_by_doctor:
-                            doctor_charges_by_doctor[doctor_id_str] = {
-                                'doctor_id': doctor_id_str,
-                                'doctor_name': '',
-                                'total_amount': 0
-                            }
-                        doctor_charges_by_doctor[doctor_id_str]['total_amount'] += doctor_charge_amount
-            
-            # Populate doctor names
-            for doctor_id_str, doctor_charge_data in doctor_charges_by_doctor.items():
-                doctor = db.doctors.find_one({'_id': parse_object_id(doctor_id_str)})
-                if doctor:
-                    doctor_charge_data['doctor_name'] = doctor.get('name', '')
-            
-            # If no doctor charges found in case_charges, check case_doctor_charges for backward compatibility
-            if not doctor_charges_by_doctor and 'doctor_id' in case:
-                doctor = db.doctors.find_one({'_id': case['doctor_id']})
-                if doctor:
-                    case_doc_charges = list(db.case_doctor_charges.find({'case_id': case['_id'], 'doctor_id': case['doctor_id']}))
-                    if case_doc_charges:
-                        total_doc_amount = sum(charge.get('amount', 0) for charge in case_doc_charges)
-                        doctor_charges_by_doctor[str(case['doctor_id'])] = {
-                            'doctor_id': str(case['doctor_id']),
-                            'doctor_name': doctor.get('name', ''),
-                            'total_amount': total_doc_amount
+            for charge in case['charges']:
+                doctor_charge = rates.get((charge.get('doctor_id'), charge.get('charge_master_id')))
+                if doctor_charge:
+                    doctor_id_str = str(charge['doctor_id'])
+                    if doctor_id_str not in doctor_charges_by_doctor:
+                        doctor = doctors.get(charge['doctor_id'])
+                        doctor_charges_by_doctor[doctor_id_str] = {
+                            'doctor_id': doctor_id_str,
+                            'doctor_name': doctor.get('name', '') if doctor else '',
+                            'total_amount': 0
                         }
+                    doctor_charges_by_doctor[doctor_id_str]['total_amount'] += doctor_charge.get('amount', 0) * charge.get('quantity', 1)
             
-            # Calculate total doctor charge amount for the case
-            total_doctor_charge_amount = sum(doc_charge['total_amount'] for doc_charge in doctor_charges_by_doctor.values())
-            
+            case['doctor_charges_by_doctor'] = doctor_charges_by_doctor
+        
+        # If no doctor charges found in case_charges, check case_doctor_charges for backward compatibility
+        fallback = [case for case in cases
+                    if not case['doctor_charges_by_doctor'] and case.get('doctor_id') in doctors]
+        legacy_totals = {}
+        if fallback:
+            for charge in db.case_doctor_charges.find(
+                {'case_id': {'$in': [case['_id'] for case in fallback]}},
+                {'case_id': 1, 'doctor_id': 1, 'amount': 1}
+            ):
+                key = (charge.get('case_id'), charge.get('doctor_id'))
+                legacy_totals[key] = legacy_totals.get(key, 0) + charge.get('amount', 0)
+        for case in fallback:
+            key = (case['_id'], case['doctor_id'])
+            if key in legacy_totals:
+                case['doctor_charges_by_doctor'][str(case['doctor_id'])] = {
+                    'doctor_id': str(case['doctor_id']),
+                    'doctor_name': doctors[case['doctor_id']].get('name', ''),
+                    'total_amount': legacy_totals[key]
+                }
+        
+        for case in cases:
+            doctor_charges = list(case['doctor_charges_by_doctor'].values())
             payouts.append({
                 'case_id': str(case['_id']),
                 'case_number': case.get('case_number', ''),
-                'patient_name': patient_name,
+                'patient_name': case.get('patient_name', ''),
                 'case_type': case.get('case_type', ''),
-                'total_charge_amount': total_charge_amount,
-                'doctor_charge_amount': total_doctor_charge_amount,
-                'doctor_charges': list(doctor_charges_by_doctor.values())  # List of doctor charges with doctor names
+                'admission_date': case.get('admission_date'),
+                'total_charge_amount': case['total_charge_amount'],
+                'doctor_charge_amount': sum(doc_charge['total_amount'] for doc_charge in doctor_charges),
+                'doctor_charges': doctor_charges  # List of doctor charges with doctor names
             })
         
         return jsonify(serialize_doc(payouts))
@@ -2314,16 +3397,13 @@ def get_case_payout_summary(id):
             charge_name = 'Unknown Charge'
             
             if cc.get('charge_master_id'):
-                cm = db.charge_master.find_one({'_id': cc.get('charge_master_id')})
+                cm = get_reference_doc('charge_master', cc.get('charge_master_id'))
                 if cm:
                     charge_name = cm.get('name', 'Unknown')
                 
                 # Check for specific doctor charge config
                 if cc.get('doctor_id'):
-                    dc = db.doctor_charges.find_one({
-                        'doctor_id': cc['doctor_id'],
-                        'charge_master_id': cc['charge_master_id']
-                    })
+                    dc = get_doctor_rate_docs([(cc['doctor_id'], cc['charge_master_id'])]).get((cc['doctor_id'], cc['charge_master_id']))
                     if dc:
                         doc_amount = dc.get('amount', 0) * qty
             
@@ -2360,12 +3440,75 @@ def get_case_payout_summary(id):
 
 # ==================== PAYOUTS API ====================
 
+def add_payout_charge_details(payouts):
+    """
+    Set charge_details (name, doctor amount, quantity per charge) on a page of payouts.
+    The charges of all (case, doctor) pairs on the page are fetched with one query;
+    rates and charge names come from the reference caches.
+    """
+    pairs = {(payout['case_id'], payout['doctor_id']) for payout in payouts if 'case_id' in payout and 'doctor_id' in payout}
+    if not pairs:
+        return payouts
+    charges_by_pair = {}
+    for cc in db.case_charges.find(
+        {'case_id': {'$in': list({case_id for case_id, _ in pairs})},
+         'doctor_id': {'$in': list({doctor_id for _, doctor_id in pairs})}},
+        {'case_id': 1, 'doctor_id': 1, 'charge_master_id': 1, 'quantity': 1}
+    ):
+        pair = (cc.get('case_id'), cc.get('doctor_id'))
+        if pair in pairs:
+            charges_by_pair.setdefault(pair, []).append(cc)
+    
+    charges = [cc for pair_charges in charges_by_pair.values() for cc in pair_charges]
+    rates = get_doctor_rate_docs(
+        (cc['doctor_id'], cc['charge_master_id']) for cc in charges if cc.get('doctor_id') and cc.get('charge_master_id')
+    )
+    charge_masters, _ = get_reference_docs('charge_master', [
+        cc['charge_master_id'] for cc in charges if isinstance(cc.get('charge_master_id'), (ObjectId, str)) and cc['charge_master_id']
+    ])
+    
+    # Fallback to case_doctor_charges for pairs without case_charges (backward compatibility)
+    legacy_by_pair = {}
+    legacy_pairs = pairs - set(charges_by_pair)
+    if legacy_pairs:
+        for c in db.case_doctor_charges.find(
+            {'case_id': {'$in': list({case_id for case_id, _ in legacy_pairs})},
+             'doctor_id': {'$in': list({doctor_id for _, doctor_id in legacy_pairs})}},
+            {'case_id': 1, 'doctor_id': 1, 'charge_name': 1, 'amount': 1}
+        ):
+            pair = (c.get('case_id'), c.get('doctor_id'))
+            if pair in legacy_pairs:
+                legacy_by_pair.setdefault(pair, []).append(c)
+    
+    for payout in payouts:
+        if 'case_id' not in payout or 'doctor_id' not in payout:
+            continue
+        pair = (payout['case_id'], payout['doctor_id'])
+        charge_details = []
+        for cc in charges_by_pair.get(pair, []):
+            cm = charge_masters.get(cc.get('charge_master_id'))
+            # case_charges stores the HOSPITAL rate; the doctor's share comes from doctor_charges
+            rate = rates.get((cc.get('doctor_id'), cc.get('charge_master_id')))
+            qty = cc.get('quantity', 1)
+            charge_details.append({
+                'name': cm.get('name', 'Unknown') if cm else 'Unknown',
+                'amount': (rate.get('amount', 0) if rate else 0) * qty,
+                'quantity': qty
+            })
+        for c in legacy_by_pair.get(pair, []):
+            charge_details.append({
+                'name': c.get('charge_name', 'Charge'),
+                'amount': c.get('amount', 0),
+                'quantity': 1
+            })
+        payout['charge_details'] = charge_details
+    return payouts
+
 @app.route('/api/payouts', methods=['GET'])
 def get_payouts():
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        skip = (page - 1) * limit
         
         # Optional filters
         case_id = request.args.get('case_id')
@@ -2398,72 +3541,19 @@ def get_payouts():
                 '$lte': datetime.combine(date_obj.date(), datetime.max.time())
             }
         
-        # Get total count
-        total = db.payouts.count_documents(query)
-        
-        # Get paginated results
-        payouts = list(db.payouts.find(query).sort('date_time', -1).skip(skip).limit(limit))
+        # Get paginated results (page/limit, or keyset with ?after=)
+        payouts, page_meta = fetch_page(db.payouts, query, 'date_time', page, limit)
         
         # Populate doctor names
-        # Populate doctor names and charge details
-        for payout in payouts:
-            if 'doctor_id' in payout and payout['doctor_id']:
-                doctor = db.doctors.find_one({'_id': payout['doctor_id']})
-                if doctor:
-                    payout['doctor_name'] = doctor.get('name', '')
-            
-            # Fetch charge breakdown
-            if 'case_id' in payout and 'doctor_id' in payout:
-                charge_details = []
-                case_charges = list(db.case_charges.find({
-                    'case_id': payout['case_id'], 
-                    'doctor_id': payout['doctor_id']
-                }))
-                
-                for cc in case_charges:
-                    cm = db.charge_master.find_one({'_id': cc.get('charge_master_id')})
-                    charge_name = cm.get('name', 'Unknown') if cm else 'Unknown'
-                    
-                    # Calculate amount for doctor (qty * rate from doctor_charges)
-                    # Note: case_charges stores the HOSPITAL rate. We need doctor rate.
-                    doc_rate = 0
-                    if cc.get('doctor_id') and cc.get('charge_master_id'):
-                        dc = db.doctor_charges.find_one({
-                            'doctor_id': cc['doctor_id'],
-                            'charge_master_id': cc['charge_master_id']
-                        })
-                        if dc:
-                            doc_rate = dc.get('amount', 0)
-                    
-                    qty = cc.get('quantity', 1)
-                    total = doc_rate * qty
-                    
-                    charge_details.append({
-                        'name': charge_name,
-                        'amount': total,
-                        'quantity': qty
-                    })
-                
-                # Fallback to case_doctor_charges if no case_charges found (backward compatibility)
-                if not charge_details:
-                    cdc = list(db.case_doctor_charges.find({
-                        'case_id': payout['case_id'],
-                        'doctor_id': payout['doctor_id']
-                    }))
-                    for c in cdc:
-                        charge_details.append({
-                            'name': c.get('charge_name', 'Charge'),
-                            'amount': c.get('amount', 0),
-                            'quantity': 1
-                        })
-                        
-                payout['charge_details'] = charge_details
+        resolve_references(payouts, 'doctor_id', 'doctors', {'doctor_name': 'name'})
+        
+        # Populate charge details (?charge_details=0 skips them for summary tables)
+        if request.args.get('charge_details') not in ('0', 'false'):
+            add_payout_charge_details(payouts)
         
         return jsonify({
             'payouts': serialize_doc(payouts),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting payouts: {e}")
@@ -2496,106 +3586,114 @@ def create_payout():
         
         data['created_at'] = datetime.now()
         result = db.payouts.insert_one(data)
+        refresh_financial_rollup_for_change('payout', after=data)
         return jsonify({'id': str(result.inserted_id), 'message': 'Payout created successfully'}), 201
     except Exception as e:
         logging.error(f"Error creating payout: {e}")
         return jsonify({'error': str(e)}), 500
 
+def pending_payouts_pipeline():
+    """
+    (case, doctor) pairs with doctor charges, no payout yet (other than a cancelled
+    one) and a positive doctor share (see payout_amount_stages).
+    """
+    return [
+        {'$match': {
+            'doctor_id': {'$exists': True, '$ne': None},
+            'charge_master_id': {'$exists': True}
+        }},
+        *payout_amount_stages(),
+        {'$match': {'doctor_charge_amount': {'$gt': 0}}},
+        # Anti-join: skip pairs that already have a (non-cancelled) payout
+        {'$lookup': {
+            'from': 'payouts',
+            'let': {'case_id': '$_id.case_id', 'doctor_id': '$_id.doctor_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$case_id', '$$case_id']},
+                    {'$eq': ['$doctor_id', '$$doctor_id']},
+                    {'$ne': ['$payment_status', 'cancelled']}
+                ]}}},
+                {'$limit': 1},
+                {'$project': {'_id': 1}}
+            ],
+            'as': 'payout'
+        }},
+        {'$match': {'payout': {'$size': 0}}},
+        {'$lookup': {
+            'from': 'cases',
+            'localField': '_id.case_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'case_number': 1, 'created_at': 1, 'patient_name': 1, 'patient_id': 1}}],
+            'as': 'case'
+        }},
+        {'$unwind': '$case'},
+        {'$lookup': {
+            'from': 'doctors',
+            'localField': '_id.doctor_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'name': 1}}],
+            'as': 'doctor'
+        }},
+        {'$unwind': '$doctor'},
+        {'$sort': {'case.created_at': -1, '_id.case_id': -1, '_id.doctor_id': 1}}
+    ]
+
 @app.route('/api/payouts/pending', methods=['GET'])
 def get_pending_payouts():
+    """
+    Pending doctor payouts. Returns the full list, or with ?page= / ?limit= a
+    page of it as {'pending_payouts': [...], 'total', 'page', 'limit'}.
+    """
     try:
-        # Find cases with doctor charges
-        # Method 1: Aggregate case_charges to find unique (case_id, doctor_id)
-        pipeline = [
-            {
-                '$match': {
-                    'doctor_id': {'$exists': True, '$ne': None},
-                    'charge_master_id': {'$exists': True}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        'case_id': '$case_id',
-                        'doctor_id': '$doctor_id'
-                    },
-                    'charges': {'$push': '$$ROOT'}
-                }
-            }
-        ]
+        paginate = 'page' in request.args or 'limit' in request.args
+        pipeline = pending_payouts_pipeline()
+        if paginate:
+            page = max(int(request.args.get('page', 1)), 1)
+            limit = max(int(request.args.get('limit', 10)), 1)
+            pipeline.append({'$facet': {
+                'rows': [{'$skip': (page - 1) * limit}, {'$limit': limit}],
+                'total': [{'$count': 'value'}]
+            }})
+            result = next(db.case_charges.aggregate(pipeline, allowDiskUse=True), {})
+            groups = result.get('rows', [])
+            total = _facet_value(result, 'total')
+        else:
+            groups = list(db.case_charges.aggregate(pipeline, allowDiskUse=True))
         
-        pending_payouts = []
-        grouped_charges = list(db.case_charges.aggregate(pipeline))
+        # Cases without a stored patient_name fall back to the patient's name
+        patients = fetch_reference_map(
+            'patients',
+            [group['case'].get('patient_id') for group in groups if not group['case'].get('patient_name')],
+            projection={'name': 1}
+        )
         
-        for group in grouped_charges:
-            case_id = group['_id']['case_id']
-            doctor_id = group['_id']['doctor_id']
-            
-            # Check if payout already exists for this case+doctor
-            existing_payout = db.payouts.find_one({
-                'case_id': case_id,
-                'doctor_id': doctor_id,
-                'payment_status': {'$ne': 'cancelled'} 
-            })
+        pending_payouts = []
+        for group in groups:
+            case = group['case']
+            created_at = case.get('created_at')
+            date_str = None
+            if isinstance(created_at, datetime):
+                date_str = created_at.strftime('%Y-%m-%d')
+            elif isinstance(created_at, str):
+                date_str = created_at
             
-            if existing_payout:
-                continue
-                
-            # Get Context
-            case = db.cases.find_one({'_id': case_id})
-            doctor = db.doctors.find_one({'_id': doctor_id})
+            patient_name = case.get('patient_name')
+            if not patient_name and case.get('patient_id') in patients:
+                patient_name = patients[case['patient_id']].get('name')
             
-            if not case or not doctor:
-                continue
-                
-            # Calculate Amount
-            total_doc_amount = 0
-            try:
-                for charge in group['charges']:
-                    qty = charge.get('quantity', 1)
-                    doc_rate = 0
-                    
-                    # Check doctor specific rate
-                    dc = db.doctor_charges.find_one({
-                        'doctor_id': doctor_id,
-                        'charge_master_id': charge['charge_master_id']
-                    })
-                    
-                    if dc:
-                        doc_rate = dc.get('amount', 0)
-                    else:
-                        # Fallback logic here if needed
-                        pass 
-                        
-                    total_doc_amount += doc_rate * qty
-                
-                if total_doc_amount > 0:
-                    created_at = case.get('created_at')
-                    date_str = None
-                    if isinstance(created_at, datetime):
-                        date_str = created_at.strftime('%Y-%m-%d')
-                    elif isinstance(created_at, str):
-                        date_str = created_at
-                    
-                    patient_name = case.get('patient_name')
-                    if not patient_name and case.get('patient_id'):
-                        patient = db.patients.find_one({'_id': case.get('patient_id')})
-                        if patient:
-                            patient_name = patient.get('name')
-
-                    pending_payouts.append({
-                        'case_id': str(case_id),
-                        'doctor_id': str(doctor_id),
-                        'case_number': case.get('case_number'),
-                        'patient_name': patient_name,
-                        'doctor_name': doctor.get('name'),
-                        'amount': total_doc_amount,
-                        'date': date_str
-                    })
-            except Exception as loop_e:
-                logging.error(f"Error processing pending payout for case {case_id}: {loop_e}")
-                continue
-                
+            pending_payouts.append({
+                'case_id': str(group['_id']['case_id']),
+                'doctor_id': str(group['_id']['doctor_id']),
+                'case_number': case.get('case_number'),
+                'patient_name': patient_name,
+                'doctor_name': group['doctor'].get('name'),
+                'amount': group['doctor_charge_amount'],
+                'date': date_str
+            })
+        
+        if paginate:
+            return jsonify({'pending_payouts': pending_payouts, 'total': total, 'page': page, 'limit': limit})
         return jsonify(pending_payouts)
     except Exception as e:
         logging.error(f"Error getting pending payouts: {e}")
@@ -2625,8 +3723,10 @@ def update_payout(id):
         if len(update_data) == 1:  # Only updated_at
             return jsonify({'error': 'No valid fields to update'}), 400
         
+        payout = db.payouts.find_one({'_id': parse_object_id(id)})
         result = db.payouts.update_one({'_id': parse_object_id(id)}, {'$set': update_data})
         if result.modified_count:
+            refresh_financial_rollup_for_change('payout', payout, {**payout, **update_data})
             return jsonify({'message': 'Payout updated successfully'})
         return jsonify({'error': 'Payout not found'}), 404
     except Exception as e:
@@ -2650,6 +3750,13 @@ def get_summary():
         logging.error(f"Error getting summary: {e}")
         return jsonify({'error': str(e)}), 500
 
+PAYOUT_EXPORT_BATCH_SIZE = 1000
+PAYOUT_EXPORT_PROJECTION = [
+    'date_time', 'case_number', 'patient_name', 'doctor_id', 'case_type', 'total_charge_amount',
+    'doctor_charge_amount', 'payment_status', 'payment_date', 'payment_mode',
+    'payment_reference_number', 'partial_payment_amount', 'payment_comment'
+]
+
 @app.route('/api/payouts/export-excel', methods=['GET'])
 def export_payouts_excel():
     try:
@@ -2678,122 +3785,24 @@ def export_payouts_excel():
                 '$lte': datetime.combine(end_date_obj.date(), datetime.max.time())
             }
         
-        # Get all payouts matching the query (no pagination for export)
-        payouts = list(db.payouts.find(query).sort('date_time', -1))
-        
-        # Populate doctor names
-        for payout in payouts:
-            if 'doctor_id' in payout and payout['doctor_id']:
-                doctor = db.doctors.find_one({'_id': payout['doctor_id']})
-                if doctor:
-                    payout['doctor_name'] = doctor.get('name', '')
-        
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Payouts Report"
-        
-        # Define header style
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Define column headers
-        headers = [
-            'Date & Time',
-            'Case Number',
-            'Patient Name',
-            'Doctor Name',
-            'OPD/IPD',
-            'Total Charge Amount',
-            'Doctor Charge Amount',
-            'Payment Status',
-            'Payment Date',
-            'Payment Mode',
-            'Payment Reference',
-            'Partial Payment Amount',
-            'Payment Comment'
-        ]
-        
-        # Write headers
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Write data rows
-        for row_num, payout in enumerate(payouts, 2):
-            date_time = payout.get('date_time', '')
-            if date_time:
-                if isinstance(date_time, datetime):
-                    date_time = date_time.strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    date_time = str(date_time)
-            
-            payment_date = payout.get('payment_date', '')
-            if payment_date:
-                if isinstance(payment_date, datetime):
-                    payment_date = payment_date.strftime('%Y-%m-%d')
-                else:
-                    payment_date = str(payment_date)
-            
-            # Set row color based on payment status
-            row_fill = None
-            if payout.get('payment_status') == 'paid':
-                row_fill = PatternFill(start_color="d4edda", end_color="d4edda", fill_type="solid")
-            elif payout.get('payment_status') == 'partial_paid':
-                row_fill = PatternFill(start_color="cfe2ff", end_color="cfe2ff", fill_type="solid")
-            elif payout.get('payment_status') in ['pending', 'cancelled']:
-                row_fill = PatternFill(start_color="fff3cd", end_color="fff3cd", fill_type="solid")
-            
-            row_data = [
-                date_time,
-                payout.get('case_number', ''),
-                payout.get('patient_name', ''),
-                payout.get('doctor_name', ''),
-                payout.get('case_type', ''),
-                payout.get('total_charge_amount', 0),
-                payout.get('doctor_charge_amount', 0),
-                payout.get('payment_status', ''),
-                payment_date,
-                payout.get('payment_mode', ''),
-                payout.get('payment_reference_number', ''),
-                payout.get('partial_payment_amount', 0),
-                payout.get('payment_comment', '')
-            ]
-            
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=row_num, column=col_num, value=value)
-                if row_fill:
-                    cell.fill = row_fill
-                # Format numeric columns
-                if col_num in [6, 7, 12]:  # Amount columns
-                    if isinstance(value, (int, float)):
-                        cell.number_format = '#,##0.00'
-        
-        # Auto-adjust column widths
-        for col_num, header in enumerate(headers, 1):
-            column_letter = get_column_letter(col_num)
-            max_length = len(str(header))
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=col_num, max_col=col_num):
-                for cell in row:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-            ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
-        
-        # Add summary row
-        summary_row = ws.max_row + 2
-        ws.cell(row=summary_row, column=1, value="TOTAL").font = Font(bold=True)
-        ws.cell(row=summary_row, column=6, value=sum(p.get('total_charge_amount', 0) for p in payouts)).font = Font(bold=True)
-        ws.cell(row=summary_row, column=6).number_format = '#,##0.00'
-        ws.cell(row=summary_row, column=7, value=sum(p.get('doctor_charge_amount', 0) for p in payouts)).font = Font(bold=True)
-        ws.cell(row=summary_row, column=7).number_format = '#,##0.00'
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        from payout_export import PayoutExcelWriter  # openpyxl is only loaded for exports
+        
+        # Stream payouts from the cursor in batches, resolving doctor names per batch
+        writer = PayoutExcelWriter()
+        cursor = db.payouts.find(query, PAYOUT_EXPORT_PROJECTION).sort('date_time', -1).batch_size(PAYOUT_EXPORT_BATCH_SIZE)
+        batch = []
+        for payout in cursor:
+            batch.append(payout)
+            if len(batch) >= PAYOUT_EXPORT_BATCH_SIZE:
+                resolve_references(batch, 'doctor_id', 'doctors', {'doctor_name': 'name'})
+                writer.write(batch)
+                batch = []
+        if batch:
+            resolve_references(batch, 'doctor_id', 'doctors', {'doctor_name': 'name'})
+            writer.write(batch)
+        
+        # Written to a temporary file, streamed from disk
+        output = writer.save()
         
         # Generate filename
         filename = f"payouts_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
@@ -2830,36 +3839,20 @@ def get_case_billing_details(case_id):
         
         # Get case charges (patient charges)
         case_charges = list(db.case_charges.find({'case_id': parse_object_id(case_id)}))
-        for charge in case_charges:
-            if 'charge_master_id' in charge:
-                charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
-                if charge_master:
-                    charge['charge_name'] = charge_master.get('name', '')
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
-                    charge['doctor_specialization'] = doctor.get('specialization', '')
+        resolve_references(case_charges, 'charge_master_id', 'charge_master', {'charge_name': 'name'})
+        resolve_references(case_charges, 'doctor_id', 'doctors', {'doctor_name': 'name', 'doctor_specialization': 'specialization'})
         
         # Get payments
         payments = list(db.payments.find({'case_id': parse_object_id(case_id)}).sort('payment_date', -1))
         
-        # Calculate totals
-        total_charges = sum(float(c.get('total_amount', 0) or 0) for c in case_charges)
-        discount = float(case.get('discount', 0) or 0)
-        total_after_discount = max(0, total_charges - discount)  # Ensure non-negative
-        total_paid = sum(float(p.get('amount', 0) or 0) for p in payments)
-        balance = total_after_discount - total_paid
+        # Totals (hospital + legacy doctor charges, payments, discount) from the case ledger
+        totals = bill_totals(get_case_ledger(case['_id']) or {})
         
         return jsonify({
             'case': serialize_doc(case),
             'charges': serialize_doc(case_charges),
             'payments': serialize_doc(payments),
-            'total_charges': total_charges,
-            'discount': discount,
-            'total_after_discount': total_after_discount,
-            'total_paid': total_paid,
-            'balance': balance
+            **totals
         })
     except Exception as e:
         logging.error(f"Error getting case billing details: {e}")
@@ -2897,12 +3890,23 @@ def update_case_charge_for_billing(charge_id):
         data['updated_at'] = datetime.now()
         result = db.case_charges.update_one({'_id': parse_object_id(charge_id)}, {'$set': data})
         if result.modified_count:
+            on_financial_change('charge', existing_charge, {**existing_charge, **data})
             return jsonify({'message': 'Charge updated successfully'})
         return jsonify({'error': 'Charge not found'}), 404
     except Exception as e:
         logging.error(f"Error updating case charge: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Rendered bills, keyed by content hash. BILL_PDF_CACHE_MB=0 disables the cache.
+BILL_PDF_CACHE_DIR = os.getenv('BILL_PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bill_pdf_cache'))
+BILL_PDF_CACHE_MB = int(os.getenv('BILL_PDF_CACHE_MB', 200))
+bill_pdf_cache = None
+if BILL_PDF_CACHE_MB > 0:
+    try:
+        bill_pdf_cache = BillPdfCache(BILL_PDF_CACHE_DIR, BILL_PDF_CACHE_MB * 1024 * 1024)
+    except OSError as e:
+        logging.warning(f"Bill PDF cache disabled: {e}")
+
 @app.route('/api/billing/generate-pdf/<case_id>', methods=['GET'])
 def generate_bill_pdf(case_id):
     """Generate PDF invoice for a case"""
@@ -2922,209 +3926,44 @@ def generate_bill_pdf(case_id):
         
         # Get charges
         case_charges = list(db.case_charges.find({'case_id': parse_object_id(case_id)}))
-        for charge in case_charges:
-            if 'charge_master_id' in charge:
-                charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
-                if charge_master:
-                    charge['charge_name'] = charge_master.get('name', '')
-            if 'doctor_id' in charge:
-                doctor = db.doctors.find_one({'_id': charge['doctor_id']})
-                if doctor:
-                    charge['doctor_name'] = doctor.get('name', '')
+        resolve_references(case_charges, 'charge_master_id', 'charge_master', {'charge_name': 'name'})
+        resolve_references(case_charges, 'doctor_id', 'doctors', {'doctor_name': 'name'})
         
         # Get payments
         payments = list(db.payments.find({'case_id': parse_object_id(case_id)}).sort('payment_date', -1))
         
-        # Calculate totals
-        total_charges = sum(c.get('total_amount', 0) for c in case_charges)
-        discount = case.get('discount', 0) or 0
-        total_after_discount = max(0, total_charges - discount)  # Ensure non-negative
-        total_paid = sum(p.get('amount', 0) for p in payments)
-        balance = total_after_discount - total_paid
-        
-        # Create PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-        story = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#2563eb'),
-            spaceAfter=30,
-            alignment=1  # Center
-        )
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#1f2937'),
-            spaceAfter=12
-        )
-        
-        # Title
-        story.append(Paragraph("INVOICE / BILL", title_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Hospital Info (you can customize this)
-        hospital_info = [
-            ["Life Plus Hospital"],
-            ["Hospital Management System"],
-            [f"Bill Date: {datetime.now().strftime('%d-%m-%Y %H:%M')}"]
-        ]
-        hospital_table = Table(hospital_info, colWidths=[4*inch])
-        hospital_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (0, 0), 16),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        story.append(hospital_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Patient and Case Info
-        patient_info = []
-        if patient:
-            patient_info.append(["Patient Name:", patient.get('name', '')])
-            patient_info.append(["Phone:", patient.get('phone', '')])
-            patient_info.append(["Email:", patient.get('email', '')])
-            if 'address' in patient:
-                patient_info.append(["Address:", patient.get('address', '')])
-        patient_info.append(["Case Number:", case.get('case_number', '')])
-        patient_info.append(["Case Type:", case.get('case_type', '')])
-        if case.get('admission_date'):
-            patient_info.append(["Admission Date:", case.get('admission_date').strftime('%d-%m-%Y') if isinstance(case.get('admission_date'), datetime) else str(case.get('admission_date'))])
-        
-        patient_table = Table(patient_info, colWidths=[2*inch, 4*inch])
-        patient_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-        ]))
-        story.append(patient_table)
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Charges Table
-        story.append(Paragraph("Charges Details", heading_style))
-        charge_data = [["Date", "Charge Name", "Doctor", "Qty", "Unit Amount", "Total Amount"]]
-        for charge in case_charges:
-            charge_date = ''
-            if charge.get('created_at'):
-                charge_date = charge['created_at'].strftime('%d-%m-%Y') if isinstance(charge['created_at'], datetime) else str(charge['created_at'])[:10]
-            charge_data.append([
-                charge_date,
-                charge.get('charge_name', ''),
-                charge.get('doctor_name', ''),
-                str(charge.get('quantity', 1)),
-                f"{charge.get('unit_amount', 0):.2f}",
-                f"{charge.get('total_amount', 0):.2f}"
-            ])
-        
-        charge_table = Table(charge_data, colWidths=[1*inch, 2*inch, 1.5*inch, 0.5*inch, 1*inch, 1*inch])
-        charge_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (3, 0), (5, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-        ]))
-        story.append(charge_table)
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Payments Table
-        if payments:
-            story.append(Paragraph("Payment History", heading_style))
-            payment_data = [["Date", "Amount", "Mode", "Reference", "Notes"]]
-            for payment in payments:
-                payment_date = ''
-                if payment.get('payment_date'):
-                    payment_date = payment['payment_date'].strftime('%d-%m-%Y') if isinstance(payment['payment_date'], datetime) else str(payment['payment_date'])[:10]
-                payment_data.append([
-                    payment_date,
-                    f"{payment.get('amount', 0):.2f}",
-                    payment.get('payment_mode', ''),
-                    payment.get('payment_reference_number', ''),
-                    payment.get('notes', '')
-                ])
-            
-            payment_table = Table(payment_data, colWidths=[1.2*inch, 1*inch, 1*inch, 1.2*inch, 2.6*inch])
-            payment_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('TOPPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
-            ]))
-            story.append(payment_table)
-            story.append(Spacer(1, 0.2*inch))
-        
-        # Summary
-        story.append(Paragraph("Bill Summary", heading_style))
-        summary_data = [
-            ["Total Charges:", f"₹ {total_charges:.2f}"]
-        ]
-        if discount > 0:
-            summary_data.append(["Discount:", f"-₹ {discount:.2f}"])
-            summary_data.append(["Total After Discount:", f"₹ {total_after_discount:.2f}"])
-        summary_data.extend([
-            ["Total Paid:", f"₹ {total_paid:.2f}"],
-            ["Balance Amount:", f"₹ {balance:.2f}"]
-        ])
-        summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
-        # Calculate balance row index (last row)
-        balance_row_idx = len(summary_data) - 1
-        table_style = [
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ('TOPPADDING', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-            ('BACKGROUND', (0, balance_row_idx), (1, balance_row_idx), colors.HexColor('#fef3c7')),
-        ]
-        # Add discount row styling if discount exists
-        if discount > 0:
-            discount_row_idx = 1  # Discount is second row
-            table_style.append(('TEXTCOLOR', (0, discount_row_idx), (1, discount_row_idx), colors.HexColor('#f59e0b')))
-        summary_table.setStyle(TableStyle(table_style))
-        story.append(summary_table)
-        
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
+        # Totals from the case ledger, as on the billing screen
+        totals = bill_totals(get_case_ledger(case['_id']) or {})
+        
+        # Same content on the same day -> same bill; serve it from the cache
+        bill_date = datetime.now()
+        content_hash = bill_content_hash(case, patient, case_charges, payments, totals, bill_date)
+        if request.if_none_match.contains(content_hash):
+            response = app.response_class(status=304)
+            response.set_etag(content_hash)
+            return response
+        
+        pdf = bill_pdf_cache.get(content_hash) if bill_pdf_cache else None
+        if pdf is None:
+            from bill_render import render_bill_pdf  # reportlab is only loaded to render bills
+            pdf = render_bill_pdf(case, patient, case_charges, payments, totals, bill_date)
+            if bill_pdf_cache:
+                try:
+                    bill_pdf_cache.set(content_hash, pdf)
+                except OSError as e:
+                    logging.warning(f"Could not cache bill PDF: {e}")
         
-        filename = f"Bill_{case.get('case_number', case_id)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filename = f"Bill_{case.get('case_number', case_id)}_{bill_date.strftime('%Y%m%d_%H%M%S')}.pdf"
         
-        return send_file(
-            buffer,
+        response = send_file(
+            io.BytesIO(pdf),
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            etag=content_hash
         )
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         logging.error(f"Error generating bill PDF: {e}")
         return jsonify({'error': str(e)}), 500
@@ -3153,6 +3992,8 @@ def update_case_discount(case_id):
             {'$set': {'discount': discount, 'updated_at': datetime.now()}}
         )
         if result.modified_count or result.matched_count:
+            set_ledger_discount(parse_object_id(case_id), discount)
+            refresh_monthly_report_for_case(parse_object_id(case_id))
             return jsonify({'message': 'Discount updated successfully', 'discount': discount})
         return jsonify({'error': 'Case not found'}), 404
     except Exception as e:
@@ -3171,15 +4012,8 @@ def close_case(case_id):
         if case.get('status') == 'closed':
             return jsonify({'error': 'Case is already closed'}), 400
         
-        # Calculate balance to ensure case is fully paid
-        case_charges = list(db.case_charges.find({'case_id': parse_object_id(case_id)}))
-        payments = list(db.payments.find({'case_id': parse_object_id(case_id)}))
-        
-        total_charges = sum(float(c.get('total_amount', 0) or 0) for c in case_charges)
-        discount = float(case.get('discount', 0) or 0)
-        total_after_discount = max(0, total_charges - discount)
-        total_paid = sum(float(p.get('amount', 0) or 0) for p in payments)
-        balance = total_after_discount - total_paid
+        # Balance from a freshly rebuilt ledger: maintenance scripts write payments without updating it
+        balance = bill_totals(rebuild_case_ledger(case['_id']))['balance']
         
         # Only allow closing if balance is zero (fully paid)
         if abs(balance) > 0.01:  # Allow small floating point differences
@@ -3243,7 +4077,7 @@ def log_activity(user_id, username, action, module, details=None):
             'ip_address': request.remote_addr,
             'timestamp': datetime.now()
         }
-        db.activity_logs.insert_one(activity)
+        activity_log_writer.write(activity)
     except Exception as e:
         logging.error(f"Error logging activity: {e}")
 
@@ -3269,9 +4103,6 @@ def initialize_admin_user():
     except Exception as e:
         logging.error(f"Error initializing admin user: {e}")
 
-# Initialize admin on startup
-initialize_admin_user()
-
 # ==================== AUTHENTICATION API ====================
 
 @app.route('/api/auth/login', methods=['POST'])
@@ -3339,8 +4170,8 @@ def check_auth():
         if not user_id:
             return jsonify({'authenticated': False}), 401
         
-        user = db.users.find_one({'_id': parse_object_id(user_id), 'is_active': True})
-        if not user:
+        user = current_user()
+        if not user or not user.get('is_active'):
             return jsonify({'authenticated': False}), 401
         
         user_data = serialize_doc(user)
@@ -3353,16 +4184,12 @@ def check_auth():
 # ==================== USERS MANAGEMENT API ====================
 
 @app.route('/api/users', methods=['GET'])
+@auth_required(admin=True)
 def get_users():
     """Get all users (admin only)"""
     try:
         user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        user = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not user or user.get('username') != 'sunilsahu':
-            return jsonify({'error': 'Access denied. Admin only.'}), 403
+        user = g.user
         
         users = list(db.users.find({}).sort('created_at', -1))
         for u in users:
@@ -3375,16 +4202,12 @@ def get_users():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/users', methods=['POST'])
+@auth_required(admin=True)
 def create_user():
     """Create new user (admin only)"""
     try:
         user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        admin = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not admin or admin.get('username') != 'sunilsahu':
-            return jsonify({'error': 'Access denied. Admin only.'}), 403
+        admin = g.user
         
         data = request.get_json()
         username = data.get('username', '').strip()
@@ -3422,16 +4245,12 @@ def create_user():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/users/<id>', methods=['PUT'])
+@auth_required(admin=True)
 def update_user(id):
     """Update user (admin only)"""
     try:
         user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        admin = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not admin or admin.get('username') != 'sunilsahu':
-            return jsonify({'error': 'Access denied. Admin only.'}), 403
+        admin = g.user
         
         data = request.get_json()
         update_data = {}
@@ -3450,6 +4269,7 @@ def update_user(id):
         update_data['updated_at'] = datetime.now()
         
         result = db.users.update_one({'_id': parse_object_id(id)}, {'$set': update_data})
+        invalidate_reference('users', parse_object_id(id))
         if result.modified_count:
             target_user = db.users.find_one({'_id': parse_object_id(id)})
             target_user.pop('password', None)
@@ -3461,23 +4281,20 @@ def update_user(id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/users/<id>', methods=['DELETE'])
+@auth_required(admin=True)
 def delete_user(id):
     """Delete user (admin only)"""
     try:
         user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        admin = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not admin or admin.get('username') != 'sunilsahu':
-            return jsonify({'error': 'Access denied. Admin only.'}), 403
+        admin = g.user
         
         # Prevent deleting admin user
-        target_user = db.users.find_one({'_id': parse_object_id(id)})
+        target_user = get_user(id)
         if target_user and target_user.get('username') == 'sunilsahu':
             return jsonify({'error': 'Cannot delete admin user'}), 400
         
         result = db.users.delete_one({'_id': parse_object_id(id)})
+        invalidate_reference('users', parse_object_id(id))
         if result.deleted_count:
             log_activity(user_id, admin.get('username'), 'delete', 'users', {'target_user_id': id})
             return jsonify({'message': 'User deleted successfully'})
@@ -3489,20 +4306,15 @@ def delete_user(id):
 # ==================== ACTIVITY LOGS API ====================
 
 @app.route('/api/activity-logs', methods=['GET'])
+@auth_required(admin=True)
 def get_activity_logs():
     """Get activity logs (admin only)"""
     try:
         user_id = request.headers.get('X-User-Id')
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        admin = db.users.find_one({'_id': parse_object_id(user_id)})
-        if not admin or admin.get('username') != 'sunilsahu':
-            return jsonify({'error': 'Access denied. Admin only.'}), 403
+        admin = g.user
         
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 50))
-        skip = (page - 1) * limit
         
         # Optional filters
         username_filter = request.args.get('username', '').strip()
@@ -3517,111 +4329,196 @@ def get_activity_logs():
         if action_filter:
             query['action'] = action_filter
         
-        total = db.activity_logs.count_documents(query)
-        logs = list(db.activity_logs.find(query).sort('timestamp', -1).skip(skip).limit(limit))
+        logs, page_meta = fetch_page(db.activity_logs, query, 'timestamp', page, limit)
         
         log_activity(user_id, admin.get('username'), 'view', 'activity-logs')
         return jsonify({
             'logs': serialize_doc(logs),
-            'total': total,
-            'page': page,
-            'limit': limit
+            **page_meta
         })
     except Exception as e:
         logging.error(f"Error getting activity logs: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== ADMIN API ====================
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@auth_required(admin=True)
+def get_cache_stats():
+    """Reference cache hit/miss counters (admin only)"""
+    try:
+        stats = {name: cache.stats() for name, cache in reference_caches.items()}
+        stats['users'] = user_cache.stats()
+        stats['bootstrap'] = bootstrap_cache.stats()
+        stats['activity_log_writer'] = activity_log_writer.stats()
+        return jsonify(stats)
+    except Exception as e:
+        logging.error(f"Error getting cache stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/metrics', methods=['GET'])
+@auth_required(admin=True)
+def get_metrics():
+    """
+    Mongo command metrics per endpoint (admin only); ?format=prometheus for the text exposition format.
+    Counters belong to the gunicorn worker that answers, identified by 'worker' / the worker label.
+    """
+    try:
+        if request.args.get('format') == 'prometheus':
+            return app.response_class(mongo_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+        return jsonify(mongo_metrics.snapshot())
+    except Exception as e:
+        logging.error(f"Error getting metrics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _parse_day_range(args):
+    """(start, end) datetimes from start_date / end_date (YYYY-MM-DD, inclusive); None where not given"""
+    start = datetime.strptime(args['start_date'], '%Y-%m-%d') if args.get('start_date') else None
+    end = datetime.strptime(args['end_date'], '%Y-%m-%d') + timedelta(days=1) if args.get('end_date') else None
+    return start, end
+
+@app.route('/api/admin/payouts/reconciliation', methods=['GET'])
+@auth_required(admin=True)
+def get_payout_reconciliation():
+    """Payouts whose amounts differ from their case charges (admin only); optional case_id, start_date, end_date"""
+    try:
+        start, end = _parse_day_range(request.args)
+        case_ids = [parse_object_id(request.args['case_id'])] if request.args.get('case_id') else None
+        mismatches = payout_reconciliation(case_ids, start, end)
+        return jsonify({'mismatches': serialize_doc(mismatches), 'count': len(mismatches)})
+    except Exception as e:
+        logging.error(f"Error reconciling payouts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/payouts/resync', methods=['POST'])
+@auth_required(admin=True)
+def post_payout_resync():
+    """Recompute payout amounts from case charges (admin only); optional case_ids, start_date, end_date"""
+    try:
+        user_id = request.headers.get('X-User-Id')
+        admin = g.user
+
+        data = request.get_json(silent=True) or {}
+        start, end = _parse_day_range(data)
+        case_ids = [parse_object_id(case_id) for case_id in data['case_ids']] if data.get('case_ids') else None
+        updated = resync_payouts(case_ids, start, end)
+        log_activity(user_id, admin.get('username'), 'resync', 'payouts', details={'updated': updated})
+        return jsonify({'updated': updated})
+    except Exception as e:
+        logging.error(f"Error resyncing payouts: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== DASHBOARD API ====================
 
+# Stats are shared by every open dashboard for a short window; one request recomputes them at a time
+DASHBOARD_STATS_TTL = int(os.getenv('DASHBOARD_STATS_TTL', 15))  # seconds
+dashboard_stats_cache = ReferenceCache('dashboard_stats', max_size=1, ttl=DASHBOARD_STATS_TTL)
+_dashboard_stats_lock = threading.Lock()
+
+def _facet_value(result, name, field='value'):
+    """Single value of a $facet branch ending in $count / $group, 0 if the branch matched nothing"""
+    rows = result.get(name) or []
+    return rows[0].get(field, 0) if rows else 0
+
+def _trend(current, previous):
+    return round(((current - previous) / max(previous, 1)) * 100, 1) if previous > 0 else 0
+
+def compute_dashboard_stats():
+    """Dashboard counters and revenue: one $facet aggregation per collection"""
+    # Adjust for IST (UTC+5:30)
+    ist_offset = timedelta(hours=5, minutes=30)
+    # today_start is server local time 00:00, but DB has UTC.
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    utc_today_start = today_start - ist_offset
+    utc_tomorrow_start = utc_today_start + timedelta(days=1)
+    utc_yesterday_start = utc_today_start - timedelta(days=1)
+    week_ago = datetime.now() - timedelta(days=7)
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if month_start.month == 1:
+        last_month_start = month_start.replace(year=month_start.year - 1, month=12)
+    else:
+        last_month_start = month_start.replace(month=month_start.month - 1)
+
+    patients = next(db.patients.aggregate([
+        {'$facet': {
+            'total': [{'$count': 'value'}],
+            'this_week': [{'$match': {'created_at': {'$gte': week_ago}}}, {'$count': 'value'}]
+        }}
+    ]), {})
+    cases = next(db.cases.aggregate([
+        {'$facet': {
+            # Active cases (status is 'open' or 'Open' or doesn't exist)
+            'active': [
+                {'$match': {'$or': [
+                    {'status': {'$regex': '^open$', '$options': 'i'}},
+                    {'status': {'$exists': False}}
+                ]}},
+                {'$count': 'value'}
+            ],
+            'today': [{'$match': {'created_at': {'$gte': utc_today_start}}}, {'$count': 'value'}]
+        }}
+    ]), {})
+    appointments = next(db.appointments.aggregate([
+        {'$match': {'appointment_date': {'$gte': utc_yesterday_start, '$lt': utc_tomorrow_start}}},
+        {'$facet': {
+            'today': [{'$match': {'appointment_date': {'$gte': utc_today_start}}}, {'$count': 'value'}],
+            'yesterday': [{'$match': {'appointment_date': {'$lt': utc_today_start}}}, {'$count': 'value'}]
+        }}
+    ]), {})
+    payments = next(db.payments.aggregate([
+        {'$match': {'payment_date': {'$gte': min(last_month_start, utc_today_start)}}},
+        {'$facet': {
+            'this_month': [
+                {'$match': {'payment_date': {'$gte': month_start}}},
+                {'$group': {'_id': None, 'value': {'$sum': '$amount'}}}
+            ],
+            'last_month': [
+                {'$match': {'payment_date': {'$gte': last_month_start, '$lt': month_start}}},
+                {'$group': {'_id': None, 'value': {'$sum': '$amount'}}}
+            ],
+            'today': [
+                {'$match': {'payment_date': {'$gte': utc_today_start, '$lt': utc_tomorrow_start}}},
+                {'$group': {'_id': None, 'value': {'$sum': '$amount'}}}
+            ]
+        }}
+    ]), {})
+
+    total_patients = _facet_value(patients, 'total')
+    patients_this_week = _facet_value(patients, 'this_week')
+    active_cases = _facet_value(cases, 'active')
+    cases_today = _facet_value(cases, 'today')
+    today_appointments = _facet_value(appointments, 'today')
+    revenue_this_month = _facet_value(payments, 'this_month')
+
+    return {
+        'total_patients': total_patients,
+        'patients_trend': round((patients_this_week / max(total_patients - patients_this_week, 1)) * 100, 1) if total_patients > 0 else 0,
+        'active_cases': active_cases,
+        'cases_trend': round((cases_today / max(active_cases - cases_today, 1)) * 100, 1) if active_cases > 0 else 0,
+        'today_appointments': today_appointments,
+        'appointments_trend': _trend(today_appointments, _facet_value(appointments, 'yesterday')),
+        'revenue_this_month': revenue_this_month,
+        'revenue_trend': _trend(revenue_this_month, _facet_value(payments, 'last_month')),
+        'today_collections': _facet_value(payments, 'today')
+    }
+
+def get_cached_dashboard_stats():
+    """Memoized compute_dashboard_stats(); concurrent misses wait for the one recomputation in flight"""
+    stats = dashboard_stats_cache.get('stats')
+    if stats is not _MISSING:
+        return stats
+    with _dashboard_stats_lock:
+        stats = dashboard_stats_cache.get('stats')
+        if stats is _MISSING:
+            stats = compute_dashboard_stats()
+            dashboard_stats_cache.set('stats', stats)
+        return stats
+
 @app.route('/api/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
-        # Total patients
-        total_patients = db.patients.count_documents({})
-        
-        # Patients added this week
-        week_ago = datetime.now() - timedelta(days=7)
-        patients_this_week = db.patients.count_documents({'created_at': {'$gte': week_ago}})
-        patients_trend = round((patients_this_week / max(total_patients - patients_this_week, 1)) * 100, 1) if total_patients > 0 else 0
-        
-        # Active cases (status is 'open' or 'Open' or doesn't exist)
-        active_cases = db.cases.count_documents({
-            '$or': [
-                {'status': {'$regex': '^open$', '$options': 'i'}},
-                {'status': {'$exists': False}}
-            ]
-        })
-        
-        # Adjust for IST (UTC+5:30)
-        ist_offset = timedelta(hours=5, minutes=30)
-        # today_start is server local time 00:00, but DB has UTC.
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        utc_today_start = today_start - ist_offset
-        
-        # Cases added today
-        cases_today = db.cases.count_documents({'created_at': {'$gte': utc_today_start}})
-        cases_trend = round((cases_today / max(active_cases - cases_today, 1)) * 100, 1) if active_cases > 0 else 0
-        
-        # Today's appointments
-        today_appointments = db.appointments.count_documents({
-            'appointment_date': {
-                '$gte': utc_today_start,
-                '$lt': utc_today_start + timedelta(days=1)
-            }
-        })
-        
-        # Yesterday's appointments for comparison
-        utc_yesterday_start = utc_today_start - timedelta(days=1)
-        yesterday_appointments = db.appointments.count_documents({
-            'appointment_date': {
-                '$gte': utc_yesterday_start,
-                '$lt': utc_today_start
-            }
-        })
-        appointments_trend = round(((today_appointments - yesterday_appointments) / max(yesterday_appointments, 1)) * 100, 1) if yesterday_appointments > 0 else 0
-        
-        # Revenue this month (Keep simplified for now or adjust purely for month)
-        month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        payments_this_month = list(db.payments.find({'payment_date': {'$gte': month_start}}))
-        revenue_this_month = sum(payment.get('amount', 0) for payment in payments_this_month)
-        
-        # Revenue last month for comparison
-        if month_start.month == 1:
-            last_month_start = month_start.replace(year=month_start.year - 1, month=12)
-        else:
-            last_month_start = month_start.replace(month=month_start.month - 1)
-        
-        payments_last_month = list(db.payments.find({
-            'payment_date': {
-                '$gte': last_month_start,
-                '$lt': month_start
-            }
-        }))
-        revenue_last_month = sum(payment.get('amount', 0) for payment in payments_last_month)
-        revenue_trend = round(((revenue_this_month - revenue_last_month) / max(revenue_last_month, 1)) * 100, 1) if revenue_last_month > 0 else 0
-        
-        # Today's Collections
-        payments_today = list(db.payments.find({
-            'payment_date': {
-                '$gte': utc_today_start,
-                '$lt': utc_today_start + timedelta(days=1)
-            }
-        }))
-        today_collections = sum(payment.get('amount', 0) for payment in payments_today)
-
-        return jsonify({
-            'total_patients': total_patients,
-            'patients_trend': patients_trend,
-            'active_cases': active_cases,
-            'cases_trend': cases_trend,
-            'today_appointments': today_appointments,
-            'appointments_trend': appointments_trend,
-            'revenue_this_month': revenue_this_month,
-            'revenue_trend': revenue_trend,
-            'today_collections': today_collections
-        })
+        return jsonify(get_cached_dashboard_stats())
     except Exception as e:
         logging.error(f"Error getting dashboard stats: {e}")
         return jsonify({'error': str(e)}), 500
@@ -3644,88 +4541,20 @@ def get_financial_grid():
         else:
             start_date = end_date - timedelta(days=9) # Last 10 days including today
             
-        # Ensure start/end cover full days
-        start_dt = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_dt = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        # Adjust for IST storage (IST is UTC+5:30)
-        # We want to query based on IST days. 
-        # IST Day Start (00:00 IST) is Prev Day 18:30 UTC.
-        ist_offset = timedelta(hours=5, minutes=30)
-        
-        query_start = start_dt - ist_offset
-        query_end = end_dt - ist_offset
-        
-        # 1. Collections (Payments)
-        # Filter by payment_date
-        payment_query = {
-            'payment_date': {
-                '$gte': query_start,
-                '$lte': query_end
-            }
-        }
-        payments = list(db.payments.find(payment_query))
-        
-        # Group by Date (YYYY-MM-DD)
-        daily_collections = {}
-        for p in payments:
-            p_date = p.get('payment_date')
-            if p_date:
-                # Convert UTC to IST for display grouping
-                local_date = p_date + ist_offset
-                d_str = local_date.strftime('%Y-%m-%d')
-                daily_collections[d_str] = daily_collections.get(d_str, 0) + (p.get('amount') or 0)
-                
-        # 2. Payouts
-        # Filter by status 'paid' or 'partial_paid'
-        payout_query = {
-            'payment_status': {'$in': ['paid', 'partial_paid']},
-            '$or': [
-                {'payment_date': {'$gte': query_start, '$lte': query_end}},
-                {'payment_date': None, 'date_time': {'$gte': query_start, '$lte': query_end}}
-            ]
-        }
-        payouts = list(db.payouts.find(payout_query))
+        # Per-day totals of the IST days in range, from the daily rollup
+        rollup = get_financial_daily_rollup(
+            start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'),
+            refresh=request.args.get('refresh') == '1'
+        )
         
-        daily_payouts = {}
-        for p in payouts:
-            # Determine effective data date
-            eff_date = p.get('payment_date') or p.get('date_time')
-            if not eff_date:
-                continue
-                
-            # Filter again in python using query window
-            if not (query_start <= eff_date <= query_end):
-                continue
-                
-            # Convert to IST for display grouping
-            local_date = eff_date + ist_offset
-            d_str = local_date.strftime('%Y-%m-%d')
-            
-            amount = 0
-            status = p.get('payment_status')
-            
-            if status == 'paid':
-                try:
-                     amount = float(p.get('doctor_charge_amount') or 0)
-                except:
-                     amount = 0
-            elif status == 'partial_paid':
-                try:
-                    amount = float(p.get('partial_payment_amount') or 0)
-                except:
-                    amount = 0
-            
-            daily_payouts[d_str] = daily_payouts.get(d_str, 0) + amount
-            
-        # 3. Merge
         # Generate all dates in range
         grid_data = []
         curr = start_date
         while curr <= end_date:
             d_str = curr.strftime('%Y-%m-%d')
-            coll = daily_collections.get(d_str, 0)
-            pay = daily_payouts.get(d_str, 0)
+            day = rollup.get(d_str, {})
+            coll = day.get('collections', 0)
+            pay = day.get('payouts', 0)
             
             grid_data.append({
                 'date': d_str,
@@ -3770,19 +4599,14 @@ def get_financial_details():
         }
         payments = list(db.payments.find(payment_query))
         
+        # Resolve patient names and case numbers for the whole day at once
+        resolve_references(payments, 'patient_id', 'patients', {'patient_name': 'name'}, default='Unknown')
+        resolve_references(payments, 'case_id', 'cases', {'case_number': 'case_number'}, default='N/A')
+        
         collections_data = []
         for p in payments:
-            patient_name = 'Unknown'
-            if 'patient_id' in p:
-                patient = db.patients.find_one({'_id': p['patient_id']})
-                if patient:
-                    patient_name = patient.get('name', 'Unknown')
-                    
-            case_number = 'N/A'
-            if 'case_id' in p:
-                case = db.cases.find_one({'_id': p['case_id']})
-                if case:
-                    case_number = case.get('case_number', 'N/A')
+            patient_name = p['patient_name']
+            case_number = p['case_number']
             
             collections_data.append({
                 'patient_name': patient_name,
@@ -3800,6 +4624,7 @@ def get_financial_details():
             ]
         }
         payouts = list(db.payouts.find(payout_query))
+        resolve_references(payouts, 'doctor_id', 'doctors', {'doctor_name': 'name'}, default='Unknown')
         
         payouts_data = []
         for p in payouts:
@@ -3808,11 +4633,7 @@ def get_financial_details():
             if not eff_date or not (query_start <= eff_date <= query_end):
                 continue
                 
-            doctor_name = 'Unknown'
-            if 'doctor_id' in p:
-                doctor = db.doctors.find_one({'_id': p['doctor_id']})
-                if doctor:
-                    doctor_name = doctor.get('name', 'Unknown')
+            doctor_name = p['doctor_name']
             
             amount = 0
             status = p.get('payment_status')
@@ -3858,9 +4679,9 @@ def get_dashboard_activity():
         
         # Recent appointments
         recent_appointments = list(db.appointments.find().sort('created_at', -1).limit(3))
+        resolve_references(recent_appointments, 'patient_id', 'patients', {'patient_name': 'name'}, default='Unknown')
         for apt in recent_appointments:
-            patient = db.patients.find_one({'_id': apt.get('patient_id')})
-            patient_name = patient.get('name', 'Unknown') if patient else 'Unknown'
+            patient_name = apt['patient_name']
             activities.append({
                 'type': 'appointment',
                 'icon': 'calendar',
@@ -3912,24 +4733,8 @@ def get_upcoming_appointments():
         }).sort('appointment_time', 1))
         
         # Populate patient and doctor names
-        for apt in appointments:
-            if 'patient_id' in apt and apt['patient_id']:
-                patient = db.patients.find_one({'_id': apt['patient_id']})
-                if patient:
-                    apt['patient_name'] = patient.get('name', 'Unknown')
-                else:
-                    apt['patient_name'] = 'Unknown'
-            else:
-                apt['patient_name'] = 'Unknown'
-            
-            if 'doctor_id' in apt and apt['doctor_id']:
-                doctor = db.doctors.find_one({'_id': apt['doctor_id']})
-                if doctor:
-                    apt['doctor_name'] = doctor.get('name', 'Unknown')
-                else:
-                    apt['doctor_name'] = 'Unknown'
-            else:
-                apt['doctor_name'] = 'Unknown'
+        resolve_references(appointments, 'patient_id', 'patients', {'patient_name': 'name'}, default='Unknown')
+        resolve_references(appointments, 'doctor_id', 'doctors', {'doctor_name': 'name'}, default='Unknown')
         
         return jsonify({
             'appointments': serialize_doc(appointments),
@@ -3947,50 +4752,23 @@ def get_monthly_report():
         month = int(request.args.get('month', 1))
         year = int(request.args.get('year', 2026))
         
-        # Calculate date range
-        month_start = datetime(year, month, 1)
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1)
-        else:
-            month_end = datetime(year, month + 1, 1)
+        period = f'{year:04d}-{month:02d}'
+        month_start, _ = _period_range(period)
         
-        # Get all cases with admission_date in the specified month
-        cases_admitted_this_month = list(db.cases.find({
-            'admission_date': {
-                '$gte': month_start,
-                '$lt': month_end
-            }
-        }))
+        # Cases admitted this month OR with payments this month, from the persisted snapshot
+        rows = get_monthly_report_rows(period, refresh=request.args.get('refresh') in ('1', 'true'))
         
-        # Get all payments made in the specified month
-        payments_this_month = list(db.payments.find({
-            'payment_date': {
-                '$gte': month_start,
-                '$lt': month_end
-            }
-        }))
-        
-        # Get case IDs from payments (cases that received payments this month)
-        case_ids_with_payments = list(set([p['case_id'] for p in payments_this_month if p.get('case_id')]))
-        
-        # Get cases that received payments this month (may include cases from previous months)
-        cases_with_payments = list(db.cases.find({
-            '_id': {'$in': case_ids_with_payments}
-        }))
-        
-        # Combine both sets of cases (admitted this month OR received payments this month)
-        all_case_ids = set([c['_id'] for c in cases_admitted_this_month] + [c['_id'] for c in cases_with_payments])
-        all_cases = list(db.cases.find({'_id': {'$in': list(all_case_ids)}}))
+        patient_ids = [row['patient_id'] for row in rows if row.get('patient_id')]
+        patients = {p['_id']: p for p in db.patients.find({'_id': {'$in': patient_ids}}, {'name': 1})}
+        charge_masters, _ = get_reference_docs('charge_master', [
+            group['charge_master_id'] for row in rows for group in row['charge_groups'] if group.get('charge_master_id')
+        ])
         
         # Aggregate data by patient
         patient_data = {}
         
-        for case in all_cases:
-            patient_id = case.get('patient_id')
-            case_id = case['_id']
-            
-            # Get patient details
-            patient = db.patients.find_one({'_id': patient_id})
+        for row in rows:
+            patient = patients.get(row.get('patient_id'))
             if not patient:
                 continue
             
@@ -3998,158 +4776,54 @@ def get_monthly_report():
             
             if patient_name not in patient_data:
                 patient_data[patient_name] = {
-                    'patient_id': str(patient_id),
+                    'patient_id': str(row['patient_id']),
                     'patient_name': patient_name,
                     'num_cases': 0,
                     'total_payments': 0,
                     'total_charges': 0,
                     'total_discounts': 0,
                     # Detailed charge categories
-                    'consultation_charges': 0,
-                    'medical_charges': 0,
-                    'pathology_charges': 0,
-                    'pharmacy_charges': 0,
-                    'injection_charges': 0,
-                    'daycare_charges': 0,
-                    'doctor_charges': 0,
-                    'general_charges': 0,
-                    'nursing_charges': 0,
-                    'other_charges': 0,
+                    **{bucket: 0 for bucket in MONTHLY_REPORT_BUCKETS},
                     'case_ids': [],
                     'admission_dates': []
                 }
+            entry = patient_data[patient_name]
             
-            patient_data[patient_name]['num_cases'] += 1
-            patient_data[patient_name]['case_ids'].append(str(case_id))
+            entry['num_cases'] += 1
+            entry['case_ids'].append(str(row['case_id']))
             
             # Track admission date
-            admission_date = case.get('admission_date')
+            admission_date = row.get('admission_date')
             if admission_date:
                 # Handle both datetime objects and strings
                 if isinstance(admission_date, str):
-                    date_str = admission_date
-                    is_old = False  # Can't compare string dates easily
+                    entry['admission_dates'].append({'date': admission_date, 'is_old': False})
                 else:
-                    date_str = admission_date.strftime('%d-%b-%Y')
-                    is_old = admission_date < month_start
-                
-                patient_data[patient_name]['admission_dates'].append({
-                    'date': date_str,
-                    'is_old': is_old
-                })
-            
-            # Add discount from this case
-            case_discount = float(case.get('discount', 0) or 0)
-            patient_data[patient_name]['total_discounts'] += case_discount
-        
-        # Process charges and payments for all cases
-        for case in all_cases:
-            patient_id = case.get('patient_id')
-            case_id = case['_id']
-            
-            # Get patient details
-            patient = db.patients.find_one({'_id': patient_id})
-            if not patient:
-                continue
-            
-            patient_name = patient.get('name', 'Unknown')
-            
-            # Skip if patient not in our data (shouldn't happen, but safety check)
-            if patient_name not in patient_data:
-                continue
-            
-            # Get payments for this case ONLY from the selected month (by payment_date)
-            payments = list(db.payments.find({
-                'case_id': case_id,
-                'payment_date': {
-                    '$gte': month_start,
-                    '$lt': month_end
-                }
-            }))
-            for payment in payments:
-                patient_data[patient_name]['total_payments'] += float(payment.get('amount', 0) or 0)
+                    entry['admission_dates'].append({
+                        'date': admission_date.strftime('%d-%b-%Y'),
+                        'is_old': admission_date < month_start
+                    })
             
-            # Get case charges ONLY from the selected month
-            case_charges = list(db.case_charges.find({
-                'case_id': case_id,
-                'created_at': {
-                    '$gte': month_start,
-                    '$lt': month_end
-                }
-            }))
+            entry['total_discounts'] += row['discount']
+            entry['total_payments'] += row['payments']
             
-            for charge in case_charges:
-                charge_amount = float(charge.get('total_amount', 0) or 0)
-                charge_type = charge.get('charge_type', 'hospital').lower()
-                
-                # Add to total charges
-                patient_data[patient_name]['total_charges'] += charge_amount
-                
-                # Get charge master details to determine category
-                charge_master_id = charge.get('charge_master_id')
-                categorized = False
-                
-                if charge_master_id:
-                    charge_master = db.charge_master.find_one({'_id': charge_master_id})
-                    if charge_master:
-                        charge_name = charge_master.get('name', '').lower()
-                        category = charge_master.get('category', '').lower()
-                        charge_category = charge_master.get('charge_category', '').lower()
-                        
-                        # Categorize charges based on category, charge_category, charge_type, and name
-                        if 'consultation' in category or 'consultation' in charge_category or charge_type == 'consultation':
-                            patient_data[patient_name]['consultation_charges'] += charge_amount
-                            categorized = True
-                        elif 'pathology' in category or 'pathology' in charge_category or charge_type == 'pathology':
-                            patient_data[patient_name]['pathology_charges'] += charge_amount
-                            categorized = True
-                        elif 'pharmacy' in category or 'pharmacy' in charge_category or charge_type == 'pharmacy':
-                            patient_data[patient_name]['pharmacy_charges'] += charge_amount
-                            categorized = True
-                        elif 'injection' in category or 'injection' in charge_category:
-                            patient_data[patient_name]['injection_charges'] += charge_amount
-                            categorized = True
-                        elif 'daycare' in category or 'daycare' in charge_category or 'day care' in category:
-                            patient_data[patient_name]['daycare_charges'] += charge_amount
-                            categorized = True
-                        elif 'nursing' in charge_name or 'nursing' in category:
-                            patient_data[patient_name]['nursing_charges'] += charge_amount
-                            categorized = True
-                        elif charge.get('is_doctor_charge') or 'doctor' in category or 'doctor' in charge_category or charge_type == 'doctor' or 'opd_inhouse_doc' in charge_type:
-                            patient_data[patient_name]['doctor_charges'] += charge_amount
-                            categorized = True
-                        elif 'medical' in category or 'medical' in charge_category:
-                            patient_data[patient_name]['medical_charges'] += charge_amount
-                            categorized = True
-                        elif 'general' in category or 'general' in charge_category:
-                            patient_data[patient_name]['general_charges'] += charge_amount
-                            categorized = True
-                
-                # If not categorized by charge master, try charge_type
-                if not categorized:
-                    if charge.get('is_doctor_charge') or charge_type == 'doctor' or 'opd_inhouse_doc' in charge_type:
-                        patient_data[patient_name]['doctor_charges'] += charge_amount
-                    elif charge_type == 'pharmacy':
-                        patient_data[patient_name]['pharmacy_charges'] += charge_amount
-                    elif charge_type == 'pathology':
-                        patient_data[patient_name]['pathology_charges'] += charge_amount
-                    elif charge_type == 'consultation':
-                        patient_data[patient_name]['consultation_charges'] += charge_amount
-                    else:
-                        patient_data[patient_name]['other_charges'] += charge_amount
+            # Case charges of this month, bucketed by charge master / charge type
+            for group in row['charge_groups']:
+                charge_master = charge_masters.get(group.get('charge_master_id')) or {}
+                bucket = charge_report_bucket(
+                    (charge_master.get('name') or '').lower(),
+                    (charge_master.get('category') or '').lower(),
+                    (charge_master.get('charge_category') or '').lower(),
+                    group['charge_type'],
+                    group['is_doctor_charge'],
+                    bool(charge_master)
+                )
+                entry[bucket] += group['amount']
+                entry['total_charges'] += group['amount']
             
-            # Get legacy doctor charges ONLY from the selected month
-            doctor_charges = list(db.case_doctor_charges.find({
-                'case_id': case_id,
-                'created_at': {
-                    '$gte': month_start,
-                    '$lt': month_end
-                }
-            }))
-            for charge in doctor_charges:
-                amount = float(charge.get('amount', 0) or 0)
-                patient_data[patient_name]['doctor_charges'] += amount
-                patient_data[patient_name]['total_charges'] += amount
+            # Legacy doctor charges of this month
+            entry['doctor_charges'] += row['legacy_doctor_charges']
+            entry['total_charges'] += row['legacy_doctor_charges']
         
         # Calculate summary
         total_cases = sum(p['num_cases'] for p in patient_data.values())
@@ -4291,6 +4965,78 @@ def get_case_study(id):
         logging.error(f"Error getting case study: {e}")
         return jsonify({'error': str(e)}), 500
 
+# ==================== APP FACTORY ====================
+
+WARMUP_RETRY_SECONDS = int(os.getenv('WARMUP_RETRY_SECONDS', 10))
+
+app_ready = threading.Event()
+_warmup_state = {'pid': None, 'started_at': None, 'ready_at': None}
+_startup_lock = threading.Lock()
+
+def warm_up():
+    """
+    Startup tasks: check the MongoDB connection (retried until it answers), ensure
+    indexes and activity log retention, index documents written without search keys,
+    create the admin user. Sets app_ready when done.
+    """
+    while True:
+        try:
+            db.command('ping')
+            logging.info(f"✓ Successfully connected to MongoDB Atlas database '{MONGODB_DB_NAME}'")
+            break
+        except Exception as e:
+            logging.error(f"✗ MongoDB connection error (retrying in {WARMUP_RETRY_SECONDS} s): {e}")
+            time.sleep(WARMUP_RETRY_SECONDS)
+
+    # Create declared indexes (see db_indexes.py); set ENSURE_INDEXES=0 to skip
+    if os.getenv('ENSURE_INDEXES', '1') != '0':
+        try:
+            ensure_indexes(db)
+            ensure_retention(db.activity_logs, ACTIVITY_LOG_TTL_DAYS)
+        except Exception as e:
+            logging.error(f"Error ensuring indexes: {e}")
+
+    # Documents without search keys (imports, data from before search_index.py) are invisible
+    # to search; set SEARCH_BACKFILL=0 to skip
+    if os.getenv('SEARCH_BACKFILL', '1') != '0':
+        try:
+            indexed = {name: count for name, count in backfill_search_keys(db, missing_only=True).items() if count}
+            if indexed:
+                logging.info(f"Search keys backfilled: {indexed}")
+        except Exception as e:
+            logging.error(f"Error backfilling search keys: {e}")
+
+    initialize_admin_user()
+    _warmup_state['ready_at'] = time.time()
+    app_ready.set()
+
+def create_app(wait=False):
+    """
+    Return the app and start warm_up() in a background thread, once per process, so
+    the server can accept requests while the Atlas handshake runs. wait=True blocks
+    until warm-up has finished. Used by wsgi.py and the development server; importing
+    app.py alone does no I/O.
+    """
+    with _startup_lock:
+        if _warmup_state['pid'] != os.getpid():
+            _warmup_state.update(pid=os.getpid(), started_at=time.time(), ready_at=None)
+            app_ready.clear()
+            threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    if wait:
+        app_ready.wait()
+    return app
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Readiness probe: 200 once warm-up has finished, 503 before"""
+    ready = app_ready.is_set()
+    body = {'status': 'ready' if ready else 'starting'}
+    if ready:
+        body['startup_seconds'] = round(_warmup_state['ready_at'] - _warmup_state['started_at'], 3)
+    return jsonify(body), 200 if ready else 503
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    # Development server; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
+    create_app().run(host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', 5001)),
+                     debug=os.getenv('FLASK_DEBUG', '1') == '1', threaded=True)
 # Trigger reload
@@ -0,0 +1,54 @@
+import sys
+import time
+import resource
+from datetime import datetime, timedelta
+from payout_export import PayoutExcelWriter
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+BATCH_SIZE = 1000
+STATUSES = ['paid', 'partial_paid', 'pending', 'cancelled']
+
+def fake_payouts(count):
+    """Synthetic payouts shaped like the payouts collection (doctor_name already resolved)"""
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        yield {
+            'date_time': start + timedelta(minutes=5 * i),
+            'case_number': f'CASE-2025-{i:06d}',
+            'patient_name': f'Patient {i % 7919}',
+            'doctor_name': f'Dr. Doctor {i % 97}',
+            'case_type': 'IPD' if i % 3 else 'OPD',
+            'total_charge_amount': float(500 + i % 1000),
+            'doctor_charge_amount': float(200 + i % 300),
+            'payment_status': STATUSES[i % 4],
+            'payment_date': start + timedelta(days=i % 365),
+            'payment_mode': 'cash' if i % 2 else 'upi',
+            'payment_reference_number': f'REF{i}',
+            'partial_payment_amount': 0,
+            'payment_comment': ''
+        }
+
+def benchmark(rows):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+
+    writer = PayoutExcelWriter()
+    batch = []
+    for payout in fake_payouts(rows):
+        batch.append(payout)
+        if len(batch) >= BATCH_SIZE:
+            writer.write(batch)
+            batch = []
+    writer.write(batch)
+    output = writer.save()
+
+    elapsed = time.perf_counter() - started
+    peak_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024  # ru_maxrss is in KB on Linux
+
+    output.seek(0, 2)
+    size = output.tell()
+    output.close()
+    print(f"{rows} rows: {elapsed:.2f} s, peak RSS growth {peak_growth:.1f} MB, file {size / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    benchmark(ROWS)
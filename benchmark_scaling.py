@@ -0,0 +1,103 @@
+"""
+Throughput of the gunicorn setup at different worker counts.
+
+Starts `gunicorn -c gunicorn.conf.py wsgi:app` once per worker count, waits
+until /api/health reports the workers ready (warm-up done), then hammers one endpoint from concurrent client threads for a
+fixed time and reports requests per second.
+
+Usage:
+    python benchmark_scaling.py [path] [--workers 1,2,4] [--threads 8] [--clients 32] [--seconds 10]
+
+Set BENCH_USER_ID to send X-User-Id for endpoints that need a login.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import requests
+
+PORT = int(os.getenv('BENCH_PORT', 5055))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+def parse_args(args):
+    options = {'path': '/api/cases?page=1&limit=10', 'workers': [1, 2, 4], 'threads': 8, 'clients': 32, 'seconds': 10}
+    if args and not args[0].startswith('--'):
+        options['path'] = args[0]
+    for name in ('workers', 'threads', 'clients', 'seconds'):
+        if f'--{name}' in args:
+            value = args[args.index(f'--{name}') + 1]
+            options[name] = [int(v) for v in value.split(',')] if name == 'workers' else int(value)
+    return options
+
+def start_server(workers, threads):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads), PORT=str(PORT),
+               HOST='127.0.0.1', LOG_LEVEL='WARNING')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              env=env, start_new_session=True)
+    # Ready once warm-up (connection, indexes) has finished, not when the port first answers.
+    # Each check opens a new connection, so consecutive 200s come from different workers.
+    deadline = time.time() + 60
+    ready = 0
+    while time.time() < deadline:
+        try:
+            ready = ready + 1 if requests.get(f"{BASE_URL}/api/health", timeout=1).status_code == 200 else 0
+        except requests.RequestException:
+            ready = 0
+        if ready >= 2 * workers:
+            return server
+        time.sleep(0.1 if ready else 0.5)
+    stop_server(server)
+    raise RuntimeError("gunicorn did not become ready within 60 seconds")
+
+def stop_server(server):
+    os.killpg(server.pid, signal.SIGTERM)
+    server.wait(timeout=30)
+
+def run_load(path, clients, seconds):
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID']} if os.getenv('BENCH_USER_ID') else {}
+    counts = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client():
+        session = requests.Session()
+        ok = failed = 0
+        while time.time() < stop_at:
+            try:
+                if session.get(BASE_URL + path, headers=headers, timeout=30).status_code == 200:
+                    ok += 1
+                else:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+        with lock:
+            counts['ok'] += ok
+            counts['failed'] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+if __name__ == "__main__":
+    options = parse_args(sys.argv[1:])
+    print(f"GET {options['path']}: {options['clients']} clients, {options['seconds']} s per run, "
+          f"{options['threads']} threads per worker")
+    baseline = None
+    for workers in options['workers']:
+        server = start_server(workers, options['threads'])
+        try:
+            run_load(options['path'], options['clients'], 2)  # warm up pools and caches
+            counts = run_load(options['path'], options['clients'], options['seconds'])
+        finally:
+            stop_server(server)
+        throughput = counts['ok'] / options['seconds']
+        if baseline is None:
+            baseline = throughput
+        scaling = f"{throughput / baseline:.2f}x" if baseline else '-'
+        print(f"workers={workers}: {throughput:.1f} req/s ({scaling}), {counts['failed']} failed")
@@ -0,0 +1,56 @@
+import re
+import time
+import statistics
+from app import db
+from search_index import search_query
+
+# Same shape as the autocomplete in main.js: count + first 20 by created_at
+LIMIT = 20
+TRIALS = 5
+
+REGEX_FIELDS = {
+    'patients': ['name', 'phone', 'email', 'address'],
+    'doctors': ['name', 'specialization', 'phone', 'email'],
+    'charge_master': ['name', 'category', 'charge_category'],
+}
+
+def regex_query(collection, term):
+    return {'$or': [{field: {'$regex': re.escape(term), '$options': 'i'}} for field in REGEX_FIELDS[collection]]}
+
+def sample_terms(collection, count=10):
+    """Prefixes of existing names (1-4 characters, like keystrokes) plus a phone prefix"""
+    terms = []
+    for doc in db[collection].aggregate([{'$sample': {'size': count}}, {'$project': {'name': 1, 'phone': 1}}]):
+        name = str(doc.get('name') or '').strip()
+        if name:
+            terms.extend(name[:length] for length in (1, 2, 4))
+        digits = re.sub(r'\D', '', str(doc.get('phone') or ''))
+        if len(digits) >= 5:
+            terms.append(digits[:5])
+    return terms
+
+def time_query(collection, query):
+    times = []
+    for _ in range(TRIALS):
+        start = time.perf_counter()
+        db[collection].count_documents(query)
+        list(db[collection].find(query).sort('created_at', -1).limit(LIMIT))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def benchmark(collection):
+    terms = sample_terms(collection)
+    if not terms:
+        print(f"{collection}: no documents to sample")
+        return
+    regex_times, token_times = [], []
+    for term in terms:
+        regex_times.append(time_query(collection, regex_query(collection, term)))
+        token_times.append(time_query(collection, search_query(collection, term)))
+    print(f"{collection} ({db[collection].estimated_document_count()} docs, {len(terms)} terms)")
+    print(f"  regex:  median {statistics.median(regex_times) * 1000:.1f} ms, max {max(regex_times) * 1000:.1f} ms")
+    print(f"  tokens: median {statistics.median(token_times) * 1000:.1f} ms, max {max(token_times) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    for collection in REGEX_FIELDS:
+        benchmark(collection)
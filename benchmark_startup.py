@@ -0,0 +1,57 @@
+"""
+Startup time of the app.
+
+Each run starts a fresh interpreter and measures how long `import app` takes
+and how long create_app() then needs until warm-up has finished (connection,
+indexes, admin user). With --importtime the import is also run under
+`python -X importtime` and the slowest modules are listed.
+
+Usage:
+    python benchmark_startup.py [--runs 5] [--importtime]
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app(wait=True)
+ready = time.perf_counter()
+heavy = [name for name in ('openpyxl', 'reportlab') if name in __import__('sys').modules]
+print(json.dumps({'import': imported - started, 'ready': ready - started, 'heavy_modules': heavy}))
+"""
+
+def run_probe():
+    output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(limit=15):
+    """(cumulative seconds, module) of the slowest imports under -X importtime"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative) / 1e6, module.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    runs = int(args[args.index('--runs') + 1]) if '--runs' in args else 5
+    results = [run_probe() for _ in range(runs)]
+    for name in ('import', 'ready'):
+        times = [result[name] for result in results]
+        print(f"{name:>6}: median {statistics.median(times):.3f} s, min {min(times):.3f} s, max {max(times):.3f} s")
+    heavy = results[-1]['heavy_modules']
+    print(f"heavy modules loaded at startup: {', '.join(heavy) if heavy else 'none'}")
+    if '--importtime' in args:
+        print("\nslowest imports (cumulative):")
+        for seconds, module in slowest_imports():
+            print(f"  {seconds:.3f} s  {module}")
@@ -0,0 +1,87 @@
+"""
+Bill PDF content hash and on-disk cache.
+
+A bill is keyed by a hash of everything printed on it (patient, case,
+charges, payments, the ledger totals and the bill day), so reprints of an unchanged
+bill are served from the cache and revalidated with ETag / If-None-Match.
+Rendering lives in bill_render.py, which pulls in reportlab and is imported
+on the first cache miss.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+# ==================== CONTENT HASH ====================
+
+PATIENT_FIELDS = ('name', 'phone', 'email', 'address')
+CASE_FIELDS = ('case_number', 'case_type', 'admission_date', 'discount')
+CHARGE_FIELDS = ('created_at', 'charge_name', 'doctor_name', 'quantity', 'unit_amount', 'total_amount')
+PAYMENT_FIELDS = ('payment_date', 'amount', 'payment_mode', 'payment_reference_number', 'notes')
+
+def bill_content_hash(case, patient, charges, payments, totals, bill_date):
+    """Hash of everything the bill prints; the bill day is included because the bill shows its date"""
+    def pick(doc, fields):
+        return [(field, doc.get(field)) for field in fields if field in doc] if doc else None
+    content = {
+        'patient': pick(patient, PATIENT_FIELDS),
+        'case': pick(case, CASE_FIELDS),
+        'charges': [pick(charge, CHARGE_FIELDS) for charge in charges],
+        'payments': [pick(payment, PAYMENT_FIELDS) for payment in payments],
+        'totals': totals,
+        'bill_day': bill_date.strftime('%Y-%m-%d')
+    }
+    return hashlib.sha256(json.dumps(content, default=str, sort_keys=True).encode()).hexdigest()
+
+# ==================== DISK CACHE ====================
+
+class BillPdfCache:
+    """Bounded on-disk cache of rendered bills, one <hash>.pdf per entry, least recently used evicted first"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+            return data
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, data):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logging.warning(f"Could not evict cached bill {path}: {e}")
@@ -0,0 +1,208 @@
+"""
+Bill PDF rendering with reportlab.
+
+Kept apart from bill_pdf.py (hash and disk cache) so reportlab is only
+imported when a bill is actually rendered; paragraph and table styles are
+built once, on that first import.
+"""
+
+import io
+from datetime import datetime
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+
+# ==================== STYLES (built once per process) ====================
+
+_SAMPLE_STYLES = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_SAMPLE_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#2563eb'),
+    spaceAfter=30,
+    alignment=1  # Center
+)
+HEADING_STYLE = ParagraphStyle(
+    'CustomHeading',
+    parent=_SAMPLE_STYLES['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor('#1f2937'),
+    spaceAfter=12
+)
+HOSPITAL_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (0, 0), 16),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+PATIENT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+])
+CHARGE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (3, 0), (5, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
+])
+PAYMENT_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0fdf4')]),
+])
+SUMMARY_TABLE_COMMANDS = [
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#374151')),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+]
+
+# ==================== RENDERING ====================
+
+def render_bill_pdf(case, patient, case_charges, payments, totals, bill_date):
+    """
+    PDF bytes of a case bill; case_charges carry charge_name/doctor_name already resolved,
+    totals are the case ledger's bill totals (app.bill_totals)
+    """
+    total_charges = totals['total_charges']
+    discount = totals['discount']
+    total_after_discount = totals['total_after_discount']
+    total_paid = totals['total_paid']
+    balance = totals['balance']
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    story = []
+
+    # Title
+    story.append(Paragraph("INVOICE / BILL", TITLE_STYLE))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Hospital Info (you can customize this)
+    hospital_info = [
+        ["Life Plus Hospital"],
+        ["Hospital Management System"],
+        [f"Bill Date: {bill_date.strftime('%d-%m-%Y %H:%M')}"]
+    ]
+    hospital_table = Table(hospital_info, colWidths=[4*inch])
+    hospital_table.setStyle(HOSPITAL_TABLE_STYLE)
+    story.append(hospital_table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Patient and Case Info
+    patient_info = []
+    if patient:
+        patient_info.append(["Patient Name:", patient.get('name', '')])
+        patient_info.append(["Phone:", patient.get('phone', '')])
+        patient_info.append(["Email:", patient.get('email', '')])
+        if 'address' in patient:
+            patient_info.append(["Address:", patient.get('address', '')])
+    patient_info.append(["Case Number:", case.get('case_number', '')])
+    patient_info.append(["Case Type:", case.get('case_type', '')])
+    if case.get('admission_date'):
+        patient_info.append(["Admission Date:", case.get('admission_date').strftime('%d-%m-%Y') if isinstance(case.get('admission_date'), datetime) else str(case.get('admission_date'))])
+    
+    patient_table = Table(patient_info, colWidths=[2*inch, 4*inch])
+    patient_table.setStyle(PATIENT_TABLE_STYLE)
+    story.append(patient_table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Charges Table
+    story.append(Paragraph("Charges Details", HEADING_STYLE))
+    charge_data = [["Date", "Charge Name", "Doctor", "Qty", "Unit Amount", "Total Amount"]]
+    for charge in case_charges:
+        charge_date = ''
+        if charge.get('created_at'):
+            charge_date = charge['created_at'].strftime('%d-%m-%Y') if isinstance(charge['created_at'], datetime) else str(charge['created_at'])[:10]
+        charge_data.append([
+            charge_date,
+            charge.get('charge_name', ''),
+            charge.get('doctor_name', ''),
+            str(charge.get('quantity', 1)),
+            f"{charge.get('unit_amount', 0):.2f}",
+            f"{charge.get('total_amount', 0):.2f}"
+        ])
+    
+    charge_table = Table(charge_data, colWidths=[1*inch, 2*inch, 1.5*inch, 0.5*inch, 1*inch, 1*inch])
+    charge_table.setStyle(CHARGE_TABLE_STYLE)
+    story.append(charge_table)
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Payments Table
+    if payments:
+        story.append(Paragraph("Payment History", HEADING_STYLE))
+        payment_data = [["Date", "Amount", "Mode", "Reference", "Notes"]]
+        for payment in payments:
+            payment_date = ''
+            if payment.get('payment_date'):
+                payment_date = payment['payment_date'].strftime('%d-%m-%Y') if isinstance(payment['payment_date'], datetime) else str(payment['payment_date'])[:10]
+            payment_data.append([
+                payment_date,
+                f"{payment.get('amount', 0):.2f}",
+                payment.get('payment_mode', ''),
+                payment.get('payment_reference_number', ''),
+                payment.get('notes', '')
+            ])
+        
+        payment_table = Table(payment_data, colWidths=[1.2*inch, 1*inch, 1*inch, 1.2*inch, 2.6*inch])
+        payment_table.setStyle(PAYMENT_TABLE_STYLE)
+        story.append(payment_table)
+        story.append(Spacer(1, 0.2*inch))
+    
+    # Summary
+    story.append(Paragraph("Bill Summary", HEADING_STYLE))
+    summary_data = [
+        ["Total Charges:", f"₹ {total_charges:.2f}"]
+    ]
+    if discount > 0:
+        summary_data.append(["Discount:", f"-₹ {discount:.2f}"])
+        summary_data.append(["Total After Discount:", f"₹ {total_after_discount:.2f}"])
+    summary_data.extend([
+        ["Total Paid:", f"₹ {total_paid:.2f}"],
+        ["Balance Amount:", f"₹ {balance:.2f}"]
+    ])
+    summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
+    # Calculate balance row index (last row)
+    balance_row_idx = len(summary_data) - 1
+    table_style = SUMMARY_TABLE_COMMANDS + [
+        ('BACKGROUND', (0, balance_row_idx), (1, balance_row_idx), colors.HexColor('#fef3c7')),
+    ]
+    # Add discount row styling if discount exists
+    if discount > 0:
+        discount_row_idx = 1  # Discount is second row
+        table_style.append(('TEXTCOLOR', (0, discount_row_idx), (1, discount_row_idx), colors.HexColor('#f59e0b')))
+    summary_table.setStyle(TableStyle(table_style))
+    story.append(summary_table)
+
+    doc.build(story)
+    return buffer.getvalue()
@@ -0,0 +1,83 @@
+"""
+Fork-safe MongoDB access.
+
+A MongoClient owns sockets and monitor threads and must not be carried
+across fork(), so app.py never creates one at import time. MongoConnection
+creates the client on first use in each process (again in every pre-fork
+worker) with the pool and timeout settings from mongo_client_options().
+LazyDatabase stands in for the pymongo Database: `db.cases` / `db['cases']`
+resolve against the current process's client. LazyCollection is for objects
+that hold on to a collection across requests (e.g. the activity log writer).
+"""
+
+import os
+import threading
+from pymongo import MongoClient
+
+def _env_ms(name, default):
+    value = int(os.getenv(name, default))
+    return value or None  # 0 = no timeout
+
+def mongo_client_options():
+    """Pool and timeout settings for MongoClient, from the environment"""
+    return {
+        'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', 50)),
+        'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        'maxIdleTimeMS': _env_ms('MONGO_MAX_IDLE_TIME_MS', 0),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+        'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+        'socketTimeoutMS': _env_ms('MONGO_SOCKET_TIMEOUT_MS', 0),
+        'waitQueueTimeoutMS': _env_ms('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0),
+    }
+
+class MongoConnection:
+    """MongoClient created lazily, once per process"""
+
+    def __init__(self, uri, db_name, **client_options):
+        self.uri = uri
+        self.db_name = db_name
+        self.client_options = client_options
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # A client inherited from the parent process is dropped, not closed:
+                    # its sockets are shared with the parent
+                    self._client = MongoClient(self.uri, **self.client_options)
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.db_name]
+
+class LazyDatabase:
+    """Database-like proxy resolving every access against the current process's client"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def client(self):
+        return self._connection.client
+
+    def __getattr__(self, name):
+        return getattr(self._connection.database, name)
+
+    def __getitem__(self, name):
+        return self._connection.database[name]
+
+class LazyCollection:
+    """Collection-like proxy for long-lived holders; resolves the collection on every call"""
+
+    def __init__(self, db, name):
+        self._db = db
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._db[self.name], attr)
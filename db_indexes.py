@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Declared MongoDB indexes for every collection app.py queries.
+
+ensure_indexes(db) creates them idempotently (called at app startup unless
+ENSURE_INDEXES=0). index_report(db) lists missing, undeclared and unused
+indexes, and check_query_plans(db) explains the hot queries and reports the
+index each one uses.
+
+Usage:
+    python db_indexes.py ensure
+    python db_indexes.py report
+    python db_indexes.py explain
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# collection: [(name, keys)]
+INDEXES = {
+    'cases': [
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('admission_date_1', [('admission_date', ASCENDING)]),
+        ('patient_id_1', [('patient_id', ASCENDING)]),
+        ('case_number_1', [('case_number', ASCENDING)]),
+        ('search_keys_1', [('search_keys', ASCENDING)]),
+    ],
+    'case_charges': [
+        ('case_id_1_doctor_id_1', [('case_id', ASCENDING), ('doctor_id', ASCENDING)]),
+        ('created_at_1', [('created_at', ASCENDING)]),
+    ],
+    'case_doctor_charges': [
+        ('case_id_1_doctor_id_1', [('case_id', ASCENDING), ('doctor_id', ASCENDING)]),
+    ],
+    'doctor_charges': [
+        ('doctor_id_1_charge_master_id_1', [('doctor_id', ASCENDING), ('charge_master_id', ASCENDING)]),
+        ('charge_master_id_1', [('charge_master_id', ASCENDING)]),
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ],
+    'payments': [
+        ('case_id_1_payment_date_-1', [('case_id', ASCENDING), ('payment_date', DESCENDING)]),
+        ('payment_date_-1', [('payment_date', DESCENDING)]),
+    ],
+    'appointments': [
+        ('appointment_date_1_appointment_time_1', [('appointment_date', ASCENDING), ('appointment_time', ASCENDING)]),
+        ('case_id_1', [('case_id', ASCENDING)]),
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ],
+    'payouts': [
+        ('case_id_1_doctor_id_1', [('case_id', ASCENDING), ('doctor_id', ASCENDING)]),
+        ('date_time_-1__id_-1', [('date_time', DESCENDING), ('_id', DESCENDING)]),
+        ('doctor_id_1_date_time_-1', [('doctor_id', ASCENDING), ('date_time', DESCENDING)]),
+        ('payment_date_-1', [('payment_date', DESCENDING)]),
+    ],
+    'prescriptions': [
+        ('case_id_1', [('case_id', ASCENDING)]),
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ],
+    'case_studies': [
+        ('case_id_1', [('case_id', ASCENDING)]),
+    ],
+    'bills': [
+        ('case_id_1', [('case_id', ASCENDING)]),
+    ],
+    'patients': [
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('search_keys_1', [('search_keys', ASCENDING)]),
+        ('search_phone_1', [('search_phone', ASCENDING)]),
+    ],
+    'doctors': [
+        ('created_at_-1__id_-1', [('created_at', DESCENDING), ('_id', DESCENDING)]),
+        ('search_keys_1', [('search_keys', ASCENDING)]),
+        ('search_phone_1', [('search_phone', ASCENDING)]),
+    ],
+    'charge_master': [
+        ('search_keys_1', [('search_keys', ASCENDING)]),
+    ],
+    'users': [
+        ('username_1', [('username', ASCENDING)]),
+    ],
+    'activity_logs': [
+        ('timestamp_-1__id_-1', [('timestamp', DESCENDING), ('_id', DESCENDING)]),
+    ],
+    'monthly_report_rows': [
+        ('period_1_case_id_1', [('period', ASCENDING), ('case_id', ASCENDING)]),
+        ('case_id_1', [('case_id', ASCENDING)]),
+    ],
+}
+
+def _hot_queries():
+    """(description, collection, filter, sort, expected index) for the queries behind the hot endpoints"""
+    some_id = ObjectId()  # Any value works for plan selection
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today.replace(day=1)
+    return [
+        ('case list', 'cases', {}, [('created_at', -1)], 'created_at_-1__id_-1'),
+        ('cases admitted in month', 'cases', {'admission_date': {'$gte': month_start, '$lt': today + timedelta(days=1)}}, None, 'admission_date_1'),
+        ('case charges of a case', 'case_charges', {'case_id': some_id}, None, 'case_id_1_doctor_id_1'),
+        ('doctor charges of a case', 'case_charges', {'case_id': some_id, 'doctor_id': some_id}, None, 'case_id_1_doctor_id_1'),
+        ('legacy doctor charges of a case', 'case_doctor_charges', {'case_id': some_id}, None, 'case_id_1_doctor_id_1'),
+        ('doctor rate', 'doctor_charges', {'doctor_id': some_id, 'charge_master_id': some_id}, None, 'doctor_id_1_charge_master_id_1'),
+        ('payments of a case', 'payments', {'case_id': some_id}, [('payment_date', -1)], 'case_id_1_payment_date_-1'),
+        ('payments this month', 'payments', {'payment_date': {'$gte': month_start}}, None, 'payment_date_-1'),
+        ("today's appointments", 'appointments', {'appointment_date': {'$gte': today, '$lt': today + timedelta(days=1)}}, [('appointment_time', 1)], 'appointment_date_1_appointment_time_1'),
+        ('payout of a case and doctor', 'payouts', {'case_id': some_id, 'doctor_id': some_id}, None, 'case_id_1_doctor_id_1'),
+        ('payout list', 'payouts', {}, [('date_time', -1)], 'date_time_-1__id_-1'),
+        ('payouts of a doctor', 'payouts', {'doctor_id': some_id}, [('date_time', -1)], 'doctor_id_1_date_time_-1'),
+        ('payouts paid in range', 'payouts', {'payment_date': {'$gte': month_start, '$lt': today}}, None, 'payment_date_-1'),
+        ('activity logs', 'activity_logs', {}, [('timestamp', -1)], 'timestamp_-1__id_-1'),
+        ('login', 'users', {'username': 'x', 'is_active': True}, None, 'username_1'),
+        ('patient search', 'patients', {'search_keys': {'$all': ['ram']}}, [('created_at', -1)], 'search_keys_1'),
+        ('patient phone search', 'patients', {'search_phone': '98765'}, [('created_at', -1)], 'search_phone_1'),
+        ('case number search', 'cases', {'search_keys': {'$all': ['2026', '10']}}, None, 'search_keys_1'),
+        ('monthly report rows', 'monthly_report_rows', {'period': '2026-01'}, [('case_id', 1)], 'period_1_case_id_1'),
+    ]
+
+def _key_of(keys):
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys)
+
+def ensure_indexes(db):
+    """Create missing declared indexes. Keys already indexed under another name are left alone. Returns created names."""
+    created = []
+    for collection, indexes in INDEXES.items():
+        existing = {_key_of(info['key']) for info in db[collection].index_information().values()}
+        models = [IndexModel(keys, name=name) for name, keys in indexes if _key_of(keys) not in existing]
+        if models:
+            db[collection].create_indexes(models)
+            created.extend(f'{collection}.{model.document["name"]}' for model in models)
+    if created:
+        logging.info(f"Created indexes: {', '.join(created)}")
+    return created
+
+def index_report(db):
+    """
+    {'missing': [...], 'undeclared': [...], 'unused': [...]} as 'collection.index' names.
+    unused are indexes with no accesses since the server started ($indexStats).
+    """
+    report = {'missing': [], 'undeclared': [], 'unused': []}
+    collection_names = set(db.list_collection_names())
+    for collection in sorted(collection_names | set(INDEXES)):
+        declared = {_key_of(keys): name for name, keys in INDEXES.get(collection, [])}
+        existing = {}
+        if collection in collection_names:
+            # TTL indexes are retention settings (activity_log.ensure_retention), not query indexes
+            existing = {_key_of(info['key']): name for name, info in db[collection].index_information().items()
+                        if 'expireAfterSeconds' not in info}
+        report['missing'].extend(f'{collection}.{name}' for key, name in declared.items() if key not in existing)
+        report['undeclared'].extend(f'{collection}.{name}' for key, name in existing.items()
+                                    if key not in declared and name != '_id_')
+        if collection in collection_names:
+            try:
+                for stats in db[collection].aggregate([{'$indexStats': {}}]):
+                    if stats['name'] != '_id_' and not stats.get('accesses', {}).get('ops'):
+                        report['unused'].append(f"{collection}.{stats['name']}")
+            except Exception as e:
+                logging.warning(f"$indexStats not available for {collection}: {e}")
+    return report
+
+def _plan_indexes(plan):
+    """Index names and whether a collection scan appears in an explain() plan tree"""
+    names, collscan = set(), False
+    stack = [plan]
+    while stack:
+        stage = stack.pop()
+        if stage.get('stage') == 'COLLSCAN':
+            collscan = True
+        if stage.get('indexName'):
+            names.add(stage['indexName'])
+        stack.extend(stage.get('inputStages', []))
+        if 'inputStage' in stage:
+            stack.append(stage['inputStage'])
+        if 'queryPlan' in stage:  # SBE explain format
+            stack.append(stage['queryPlan'])
+    return names, collscan
+
+def _existing_name(db, collection, name):
+    """Name under which a declared index exists (ensure_indexes keeps same-key indexes with other names)"""
+    keys = dict(INDEXES[collection]).get(name)
+    for existing, info in db[collection].index_information().items():
+        if keys and _key_of(info['key']) == _key_of(keys):
+            return existing
+    return name
+
+def check_query_plans(db):
+    """explain() every hot query; each result says which index the winning plan uses and whether it is the expected one"""
+    results = []
+    for description, collection, query, sort, expected in _hot_queries():
+        expected = _existing_name(db, collection, expected)
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain()['queryPlanner']['winningPlan']
+        used, collscan = _plan_indexes(winning_plan)
+        results.append({
+            'query': description,
+            'collection': collection,
+            'expected_index': expected,
+            'used_indexes': sorted(used),
+            'collscan': collscan,
+            'ok': expected in used and not collscan
+        })
+    return results
+
+if __name__ == '__main__':
+    # Report the state as it is, without the startup ensure
+    os.environ['ENSURE_INDEXES'] = '0'
+    from app import db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'ensure'
+    if command == 'ensure':
+        created = ensure_indexes(db)
+        print(f"Created {len(created)} indexes" + (f": {', '.join(created)}" if created else ''))
+    elif command == 'report':
+        for kind, names in index_report(db).items():
+            print(f"{kind}: {', '.join(names) if names else '-'}")
+    elif command == 'explain':
+        for result in check_query_plans(db):
+            status = 'OK ' if result['ok'] else 'BAD'
+            used = ', '.join(result['used_indexes']) or ('COLLSCAN' if result['collscan'] else '-')
+            print(f"{status} {result['collection']}: {result['query']} -> {used} (expected {result['expected_index']})")
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,23 @@
+"""
+gunicorn settings (gunicorn -c gunicorn.conf.py wsgi:app), overridable from the environment:
+
+    WEB_WORKERS   worker processes (default 2)
+    WEB_THREADS   threads per worker (default 8); keep MONGO_MAX_POOL_SIZE >= WEB_THREADS
+    WEB_TIMEOUT   seconds before a silent worker is restarted (default 120, exports are slow)
+    HOST / PORT   bind address (default 0.0.0.0:5001)
+"""
+
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_WORKERS', 2))
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so a slow leak cannot grow without bound
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+# The app writes its own JSON access log (see instrumentation.py)
+accesslog = None
@@ -6,6 +6,7 @@ These sheets have a different structure where headers are in row 1 (after skipro
 
 import pandas as pd
 from pymongo import MongoClient
+from search_index import search_fields
 from bson import ObjectId
 from datetime import datetime
 import urllib.parse
@@ -92,6 +93,7 @@ def find_or_create_patient(db, patient_name, mobile_no=None):
         'created_at': datetime.now()
     }
     
+    patient_data.update(search_fields('patients', patient_data))
     result = db.patients.insert_one(patient_data)
     print(f"  Created new patient: {patient_name_clean} (ID: {result.inserted_id})")
     return result.inserted_id
@@ -114,6 +116,7 @@ def find_or_create_doctor(db, doctor_name):
             'isActive': True,
             'createdAt': datetime.now()
         }
+        doctor_data.update(search_fields('doctors', doctor_data))
         result = db.doctors.insert_one(doctor_data)
         print(f"  Created new doctor: Self (ID: {result.inserted_id})")
         return result.inserted_id
@@ -136,6 +139,7 @@ def find_or_create_doctor(db, doctor_name):
         'createdAt': datetime.now()
     }
     
+    doctor_data.update(search_fields('doctors', doctor_data))
     result = db.doctors.insert_one(doctor_data)
     print(f"  Created new doctor: {doctor_name_clean} (ID: {result.inserted_id})")
     return result.inserted_id
@@ -356,6 +360,7 @@ def import_additional_sheets(excel_file_path, dry_run=False):
                             'created_at': case_date
                         }
                         
+                        case_data.update(search_fields('cases', case_data))
                         case_result = db.cases.insert_one(case_data)
                         case_id = case_result.inserted_id
                         
@@ -14,6 +14,7 @@ import sys
 import os
 from datetime import datetime
 from pymongo import MongoClient
+from search_index import search_fields
 from bson import ObjectId
 from bson.errors import InvalidId
 import urllib.parse
@@ -120,6 +121,7 @@ def find_or_create_patient(db, patient_name, mobile_no=None):
         'created_at': datetime.now()
     }
     
+    patient_data.update(search_fields('patients', patient_data))
     result = db.patients.insert_one(patient_data)
     print(f"  Created new patient: {patient_name_clean} (ID: {result.inserted_id})")
     return result.inserted_id
@@ -144,6 +146,7 @@ def find_or_create_doctor(db, doctor_name):
             'isActive': True,
             'createdAt': datetime.now()
         }
+        doctor_data.update(search_fields('doctors', doctor_data))
         result = db.doctors.insert_one(doctor_data)
         print(f"  Created new doctor: Self (ID: {result.inserted_id})")
         return result.inserted_id
@@ -166,6 +169,7 @@ def find_or_create_doctor(db, doctor_name):
         'createdAt': datetime.now()
     }
     
+    doctor_data.update(search_fields('doctors', doctor_data))
     result = db.doctors.insert_one(doctor_data)
     print(f"  Created new doctor: {doctor_name_clean} (ID: {result.inserted_id})")
     return result.inserted_id
@@ -355,6 +359,7 @@ def import_cases_from_excel(excel_file_path, dry_run=False):
                         case_data['case_number'] = case_number
                         
                         # Insert case
+                        case_data.update(search_fields('cases', case_data))
                         case_result = db.cases.insert_one(case_data)
                         case_id = case_result.inserted_id
                         
@@ -0,0 +1,301 @@
+"""
+Request instrumentation: logging setup, Mongo command metrics and the access log.
+
+setup_logging() puts a QueueHandler on the root logger and writes records to
+the console and log file from a QueueListener thread, so request threads
+never wait on disk.
+
+MongoMetrics is a pymongo CommandListener. Every command is attributed to the
+Flask endpoint running in the same thread ('background' outside requests) and
+aggregated per (endpoint, collection, op): count, failures, documents
+returned and a latency histogram. It also keeps the running query count and
+Mongo time of the current request. snapshot() and prometheus() expose the
+aggregates (see /api/admin/metrics).
+
+Metrics are kept per process. Under gunicorn a request to /api/admin/metrics
+is answered by one worker with that worker's counters, so snapshot() names
+the worker (its pid) and every Prometheus sample carries a worker="<pid>"
+label. Series of different workers never overwrite each other, so
+counters do not appear to reset when successive scrapes land on different
+workers; aggregate in queries with `sum without (worker) (rate(...))`. Each
+scrape refreshes only the worker that answered it. A worker recycled by
+max_requests starts new series.
+
+init_access_log(app, metrics) writes one JSON line per request to the
+'access' logger: method, route, status, latency, Mongo queries and Mongo
+time. Static assets are skipped unless static_sample_rate is set, and full
+header dumps are only logged with log_headers=True. A request issuing more
+than metrics.query_budget commands logs a warning naming the endpoint.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from flask import request, session
+from pymongo import monitoring
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Upper bounds of the command latency histogram, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_request = threading.local()
+
+def setup_logging(level='INFO', log_file='app.log'):
+    """Route all logging through a queue; a listener thread does the formatting and I/O"""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def _command_collection(event):
+    """Collection a command targets ('-' for database-level commands)"""
+    target = event.command.get(event.command_name)
+    if isinstance(target, str):
+        return target
+    return event.command.get('collection', '-')  # getMore
+
+def _documents_returned(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    if 'value' in reply:  # findAndModify
+        return 1 if reply['value'] is not None else 0
+    return 0
+
+def _labels(**values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in values.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(values, escaped)) + '}'
+
+class MongoMetrics(monitoring.CommandListener):
+    """In-process Mongo command metrics per endpoint, plus per-request query accounting"""
+
+    def __init__(self, query_budget=0):
+        self.query_budget = query_budget
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._commands = {}  # (endpoint, collection, op) -> stats
+        self._requests = {}  # endpoint -> stats
+
+    # CommandListener callbacks run in the thread that issued the command
+
+    def started(self, event):
+        endpoint = getattr(_request, 'endpoint', None) or 'background'
+        self._inflight[(event.connection_id, event.request_id)] = (endpoint, _command_collection(event))
+
+    def _finish(self, event, failed):
+        endpoint, collection = self._inflight.pop((event.connection_id, event.request_id), ('background', '-'))
+        seconds = event.duration_micros / 1e6
+        docs = 0 if failed else _documents_returned(event.reply)
+
+        stats = getattr(_request, 'mongo', None)
+        if stats is not None:
+            stats['queries'] += 1
+            stats['micros'] += event.duration_micros
+
+        key = (endpoint, collection, event.command_name)
+        with self._lock:
+            command = self._commands.get(key)
+            if command is None:
+                command = self._commands[key] = {
+                    'count': 0, 'failed': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'docs_returned': 0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            command['count'] += 1
+            command['failed'] += failed
+            command['seconds'] += seconds
+            command['max_seconds'] = max(command['max_seconds'], seconds)
+            command['docs_returned'] += docs
+            command['buckets'][next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound),
+                                    len(LATENCY_BUCKETS))] += 1
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def start_request(self, endpoint):
+        _request.endpoint = endpoint
+        _request.mongo = {'queries': 0, 'micros': 0}
+
+    def end_request(self):
+        """Record the finished request of this thread; returns its {'queries', 'micros'}"""
+        endpoint = getattr(_request, 'endpoint', None)
+        stats = getattr(_request, 'mongo', None)
+        _request.endpoint = None
+        _request.mongo = None
+        if stats is None:
+            return None
+        over_budget = bool(self.query_budget) and stats['queries'] > self.query_budget
+        with self._lock:
+            totals = self._requests.get(endpoint)
+            if totals is None:
+                totals = self._requests[endpoint] = {'count': 0, 'queries': 0, 'max_queries': 0,
+                                                     'seconds': 0.0, 'over_budget': 0}
+            totals['count'] += 1
+            totals['queries'] += stats['queries']
+            totals['max_queries'] = max(totals['max_queries'], stats['queries'])
+            totals['seconds'] += stats['micros'] / 1e6
+            totals['over_budget'] += over_budget
+        if over_budget:
+            logging.warning(f"Query budget exceeded: {endpoint} issued {stats['queries']} Mongo commands "
+                            f"({stats['micros'] / 1000:.1f} ms, budget {self.query_budget})")
+        return stats
+
+    @contextmanager
+    def attributed_to(self, endpoint):
+        """Attribute this thread's commands to endpoint, e.g. while a streamed response is generated"""
+        previous = getattr(_request, 'endpoint', None)
+        _request.endpoint = endpoint
+        try:
+            yield
+        finally:
+            _request.endpoint = previous
+
+    def _copy(self):
+        with self._lock:
+            commands = {key: dict(stats, buckets=list(stats['buckets'])) for key, stats in self._commands.items()}
+            requests = {endpoint: dict(stats) for endpoint, stats in self._requests.items()}
+        return commands, requests
+
+    def snapshot(self):
+        """Aggregates as JSON-friendly dicts, most expensive first"""
+        commands, requests = self._copy()
+        command_rows = []
+        for (endpoint, collection, op), stats in commands.items():
+            command_rows.append({
+                'endpoint': endpoint,
+                'collection': collection,
+                'op': op,
+                'count': stats['count'],
+                'failed': stats['failed'],
+                'docs_returned': stats['docs_returned'],
+                'total_ms': round(stats['seconds'] * 1000, 1),
+                'max_ms': round(stats['max_seconds'] * 1000, 1),
+                'histogram': stats['buckets']  # counts per latency_buckets_ms, last one above them
+            })
+        request_rows = [{
+            'endpoint': endpoint,
+            'count': stats['count'],
+            'mongo_queries': stats['queries'],
+            'avg_queries': round(stats['queries'] / stats['count'], 1),
+            'max_queries': stats['max_queries'],
+            'mongo_ms': round(stats['seconds'] * 1000, 1),
+            'over_budget': stats['over_budget']
+        } for endpoint, stats in requests.items()]
+        return {
+            'worker': os.getpid(),
+            'since': self.started_at,
+            'query_budget': self.query_budget,
+            'latency_buckets_ms': [bound * 1000 for bound in LATENCY_BUCKETS],
+            'requests': sorted(request_rows, key=lambda row: row['mongo_queries'], reverse=True),
+            'commands': sorted(command_rows, key=lambda row: row['total_ms'], reverse=True)
+        }
+
+    def prometheus(self):
+        """Aggregates in the Prometheus text exposition format, labelled with this worker's pid"""
+        commands, requests = self._copy()
+        worker = os.getpid()
+        lines = []
+
+        def labels(**values):
+            return _labels(worker=worker, **values)
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def command_counter(name, field, help_text):
+            metric(name, 'counter', help_text,
+                   [f'{name}{labels(endpoint=e, collection=c, op=o)} {stats[field]}'
+                    for (e, c, o), stats in commands.items()])
+
+        command_counter('mongo_commands_total', 'count', 'Mongo commands by endpoint, collection and op.')
+        command_counter('mongo_command_failures_total', 'failed', 'Failed Mongo commands.')
+        command_counter('mongo_documents_returned_total', 'docs_returned', 'Documents returned by Mongo commands.')
+
+        samples = []
+        for (e, c, o), stats in commands.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats['buckets']):
+                cumulative += count
+                samples.append(f'mongo_command_duration_seconds_bucket{labels(endpoint=e, collection=c, op=o, le=bound)} {cumulative}')
+            samples.append(f'mongo_command_duration_seconds_sum{labels(endpoint=e, collection=c, op=o)} {stats["seconds"]:.6f}')
+            samples.append(f'mongo_command_duration_seconds_count{labels(endpoint=e, collection=c, op=o)} {stats["count"]}')
+        metric('mongo_command_duration_seconds', 'histogram', 'Mongo command latency.', samples)
+
+        for name, field, help_text in (
+            ('http_requests_total', 'count', 'Requests by endpoint.'),
+            ('http_request_mongo_commands_total', 'queries', 'Mongo commands issued by requests of an endpoint.'),
+            ('http_request_query_budget_exceeded_total', 'over_budget', 'Requests over the Mongo query budget.'),
+        ):
+            metric(name, 'counter', help_text,
+                   [f'{name}{labels(endpoint=e)} {stats[field]}' for e, stats in requests.items()])
+        return '\n'.join(lines) + '\n'
+
+def _is_static():
+    return request.endpoint == 'static' or request.path.startswith('/static/')
+
+def init_access_log(app, metrics, static_sample_rate=0.0, log_headers=False):
+    """Register the access-log and per-request metrics hooks on app"""
+    access_logger = logging.getLogger('access')
+
+    @app.before_request
+    def start_access_log():
+        _request.started = time.perf_counter()
+        metrics.start_request(request.endpoint)
+        if log_headers:
+            access_logger.debug('Headers: %s', request.headers)
+            access_logger.debug('Cookies: %s', request.cookies)
+            access_logger.debug('Session: %s', dict(session))
+
+    @app.after_request
+    def write_access_log(response):
+        started = getattr(_request, 'started', None)
+        if started is None:
+            return response
+        _request.started = None
+        mongo = metrics.end_request() or {'queries': 0, 'micros': 0}
+        if _is_static() and (not static_sample_rate or random.random() >= static_sample_rate):
+            return response
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info(json.dumps({
+                'method': request.method,
+                'route': request.url_rule.rule if request.url_rule else None,
+                'path': request.path,
+                'status': response.status_code,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+                'mongo_queries': mongo['queries'],
+                'mongo_ms': round(mongo['micros'] / 1000, 1),
+                'user_id': request.headers.get('X-User-Id')
+            }))
+        return response
+
+    @app.teardown_request
+    def end_access_log(exc):
+        # Requests that never reached after_request
+        if getattr(_request, 'started', None) is not None:
+            _request.started = None
+            metrics.end_request()
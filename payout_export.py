@@ -0,0 +1,159 @@
+"""
+Streaming payouts Excel export.
+
+Rows are written with openpyxl's write_only mode, so the workbook never holds
+more than the row being written; the finished file is spooled to a temporary
+file and streamed from there. write_only sheets emit their column widths
+before the first row, so widths are sized from the header and the first
+batch of rows (WIDTH_SAMPLE_ROWS) and the remaining rows are written as they
+come.
+"""
+
+import tempfile
+from copy import copy
+from datetime import datetime
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+
+HEADERS = [
+    'Date & Time',
+    'Case Number',
+    'Patient Name',
+    'Doctor Name',
+    'OPD/IPD',
+    'Total Charge Amount',
+    'Doctor Charge Amount',
+    'Payment Status',
+    'Payment Date',
+    'Payment Mode',
+    'Payment Reference',
+    'Partial Payment Amount',
+    'Payment Comment'
+]
+AMOUNT_COLUMNS = {5, 6, 11}  # 0-based: total charge, doctor charge, partial payment
+AMOUNT_FORMAT = '#,##0.00'
+MAX_COLUMN_WIDTH = 50
+WIDTH_SAMPLE_ROWS = 1000
+
+HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center")
+BOLD_FONT = Font(bold=True)
+STATUS_FILLS = {
+    'paid': PatternFill(start_color="d4edda", end_color="d4edda", fill_type="solid"),
+    'partial_paid': PatternFill(start_color="cfe2ff", end_color="cfe2ff", fill_type="solid"),
+    'pending': PatternFill(start_color="fff3cd", end_color="fff3cd", fill_type="solid"),
+    'cancelled': PatternFill(start_color="fff3cd", end_color="fff3cd", fill_type="solid"),
+}
+
+def payout_row(payout):
+    """Cell values of one payout (doctor_name must already be resolved)"""
+    date_time = payout.get('date_time', '')
+    if date_time:
+        date_time = date_time.strftime('%Y-%m-%d %H:%M:%S') if isinstance(date_time, datetime) else str(date_time)
+
+    payment_date = payout.get('payment_date', '')
+    if payment_date:
+        payment_date = payment_date.strftime('%Y-%m-%d') if isinstance(payment_date, datetime) else str(payment_date)
+
+    return [
+        date_time,
+        payout.get('case_number', ''),
+        payout.get('patient_name', ''),
+        payout.get('doctor_name', ''),
+        payout.get('case_type', ''),
+        payout.get('total_charge_amount', 0),
+        payout.get('doctor_charge_amount', 0),
+        payout.get('payment_status', ''),
+        payment_date,
+        payout.get('payment_mode', ''),
+        payout.get('payment_reference_number', ''),
+        payout.get('partial_payment_amount', 0),
+        payout.get('payment_comment', '')
+    ]
+
+class PayoutExcelWriter:
+    """Write payout batches into a write_only workbook; save() returns a rewound temporary file"""
+
+    def __init__(self, title="Payouts Report"):
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(title)
+        self.widths = [len(header) for header in HEADERS]
+        self.total_charge = 0
+        self.total_doctor_charge = 0
+        self.rows_written = 0
+        self._pending = []  # rows held back until the column widths are known
+        self._styles = {}
+
+    def _cell(self, value, font=None, fill=None, alignment=None, number_format=None):
+        """WriteOnlyCell with the given style; each style combination is registered with the workbook once"""
+        key = (id(font), id(fill), id(alignment), number_format)
+        style = self._styles.get(key)
+        if style is None:
+            template = WriteOnlyCell(self.ws)
+            if font:
+                template.font = font
+            if fill:
+                template.fill = fill
+            if alignment:
+                template.alignment = alignment
+            if number_format:
+                template.number_format = number_format
+            style = self._styles[key] = template._style
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell._style = copy(style)
+        return cell
+
+    def _track(self, values):
+        for index, value in enumerate(values):
+            if value:
+                self.widths[index] = max(self.widths[index], len(str(value)))
+
+    def _start(self):
+        """Fix the column widths and write the header (the first write emits the sheet's <cols>)"""
+        for index, width in enumerate(self.widths, 1):
+            self.ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+        self.ws.append([self._cell(header, HEADER_FONT, HEADER_FILL, HEADER_ALIGNMENT) for header in HEADERS])
+        for values, status in self._pending:
+            self._append(values, status)
+        self._pending = None
+
+    def _append(self, values, status):
+        fill = STATUS_FILLS.get(status)
+        self.ws.append([
+            self._cell(value, fill=fill,
+                       number_format=AMOUNT_FORMAT if index in AMOUNT_COLUMNS and isinstance(value, (int, float)) else None)
+            for index, value in enumerate(values)
+        ])
+
+    def write(self, payouts):
+        for payout in payouts:
+            values = payout_row(payout)
+            self.total_charge += payout.get('total_charge_amount', 0)
+            self.total_doctor_charge += payout.get('doctor_charge_amount', 0)
+            self.rows_written += 1
+            if self._pending is not None:
+                self._track(values)
+                self._pending.append((values, payout.get('payment_status')))
+                if len(self._pending) >= WIDTH_SAMPLE_ROWS:
+                    self._start()
+            else:
+                self._append(values, payout.get('payment_status'))
+
+    def save(self):
+        if self._pending is not None:
+            self._start()
+        # Blank row, then the totals
+        self.ws.append([])
+        summary = [None] * len(HEADERS)
+        summary[0] = self._cell("TOTAL", BOLD_FONT)
+        summary[5] = self._cell(self.total_charge, BOLD_FONT, number_format=AMOUNT_FORMAT)
+        summary[6] = self._cell(self.total_doctor_charge, BOLD_FONT, number_format=AMOUNT_FORMAT)
+        self.ws.append(summary)
+
+        output = tempfile.TemporaryFile()
+        self.wb.save(output)
+        output.seek(0)
+        return output
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rebuild the case_ledgers collection from case_charges, case_doctor_charges and payments.
+
+Usage:
+    python rebuild_case_ledgers.py                      # all cases (also drops ledgers of deleted cases)
+    python rebuild_case_ledgers.py CASE-2026-1001 ...   # only the given case numbers / case ids
+"""
+
+import sys
+from app import db, parse_object_id, rebuild_case_ledgers
+
+def resolve_case_ids(args):
+    case_ids = []
+    for arg in args:
+        case = db.cases.find_one({'case_number': arg}, {'_id': 1})
+        if not case:
+            case_id = parse_object_id(arg)
+            case = db.cases.find_one({'_id': case_id}, {'_id': 1}) if case_id else None
+        if case:
+            case_ids.append(case['_id'])
+        else:
+            print(f"Case not found: {arg}")
+    return case_ids
+
+if __name__ == "__main__":
+    case_ids = resolve_case_ids(sys.argv[1:]) if len(sys.argv) > 1 else None
+    rebuilt = rebuild_case_ledgers(case_ids)
+    print(f"Rebuilt {rebuilt} case ledgers.")
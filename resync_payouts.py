@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Reconcile payout amounts with the case charges they come from.
+
+Usage:
+    python resync_payouts.py --report                        # list payouts whose amounts differ
+    python resync_payouts.py                                 # rewrite them
+    python resync_payouts.py --from 2026-01-01 --to 2026-01-31   # only cases with doctor charges created in range
+"""
+
+import sys
+from datetime import datetime, timedelta
+from app import payout_reconciliation, resync_payouts
+
+def parse_args(args):
+    report = '--report' in args
+    start = end = None
+    if '--from' in args:
+        start = datetime.strptime(args[args.index('--from') + 1], '%Y-%m-%d')
+    if '--to' in args:
+        end = datetime.strptime(args[args.index('--to') + 1], '%Y-%m-%d') + timedelta(days=1)
+    return report, start, end
+
+if __name__ == "__main__":
+    report, start, end = parse_args(sys.argv[1:])
+    if report:
+        mismatches = payout_reconciliation(start=start, end=end)
+        for row in mismatches:
+            print(f"{row['case_number']} / {row['doctor_name']} ({row['payment_status']}): "
+                  f"total {row['stored_total_charge_amount']} -> {row['expected_total_charge_amount']}, "
+                  f"doctor {row['stored_doctor_charge_amount']} -> {row['expected_doctor_charge_amount']}")
+        print(f"{len(mismatches)} payouts out of sync.")
+    else:
+        print(f"Resynced {resync_payouts(start=start, end=end)} payouts.")
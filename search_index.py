@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tokenized search keys for patients, doctors, cases and charge_master.
+
+Every searchable document carries:
+  search_keys   normalized word tokens of its search fields plus their prefixes
+  search_phone  prefixes of the digit-only phone number (and of its last 10 digits)
+
+Both fields are indexed (see db_indexes.py), so a search is an indexed
+equality match on the prefixes of the typed words instead of an unanchored
+$regex scan. Write handlers call search_fields() before inserts and
+reindex_document() after updates.
+
+Documents written without search keys (e.g. by older versions) are indexed
+by warm_up() at startup (backfill with missing_only=True).
+
+Usage:
+    python search_index.py backfill [--missing] [collection ...]
+"""
+
+import re
+import sys
+import unicodedata
+from pymongo import UpdateOne
+
+SEARCH_FIELDS = {
+    'patients': ['name', 'phone', 'email', 'address'],
+    'doctors': ['name', 'specialization', 'phone', 'email'],
+    'cases': ['case_number'],
+    'charge_master': ['name', 'category', 'charge_category'],
+}
+
+PHONE_FIELD = 'phone'
+SEARCH_KEY_FIELDS = ('search_keys', 'search_phone')
+
+MAX_PREFIX_LEN = 12  # longer tokens are indexed (and searched) by their first 12 characters
+MIN_PHONE_DIGITS = 3
+
+_TOKEN_SPLIT = re.compile(r'[^0-9a-z]+')
+
+def normalize(text):
+    """Lowercase, strip accents"""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(normalize(text)) if token]
+
+def _prefixes(token):
+    return [token[:length] for length in range(1, min(len(token), MAX_PREFIX_LEN) + 1)]
+
+def _digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+def search_fields(collection, doc):
+    """{'search_keys': [...], 'search_phone': [...]} for a (full) document of a searchable collection"""
+    keys = set()
+    for field in SEARCH_FIELDS[collection]:
+        value = doc.get(field)
+        if value is None or value == '':
+            continue
+        for token in tokenize(value):
+            keys.update(_prefixes(token))
+    fields = {'search_keys': sorted(keys)}
+    if PHONE_FIELD in SEARCH_FIELDS[collection]:
+        digits = _digits(doc.get(PHONE_FIELD))
+        phone_keys = set()
+        for number in {digits, digits[-10:]}:
+            phone_keys.update(number[:length] for length in range(MIN_PHONE_DIGITS, len(number) + 1))
+        fields['search_phone'] = sorted(phone_keys)
+    return fields
+
+def search_query(collection, text):
+    """Mongo filter matching documents whose words start with every typed word (or whose phone starts with the typed digits)"""
+    tokens = [token[:MAX_PREFIX_LEN] for token in tokenize(text)]
+    if not tokens:
+        return {}
+    conditions = [{'search_keys': {'$all': tokens}}]
+    if PHONE_FIELD in SEARCH_FIELDS[collection]:
+        digits = _digits(text)
+        # Only digits and phone punctuation typed, e.g. "98765 43210" or "+91-98765"
+        if len(digits) >= MIN_PHONE_DIGITS and not re.search(r'[^\d\s+\-()]', text):
+            conditions.append({'search_phone': digits})
+    return conditions[0] if len(conditions) == 1 else {'$or': conditions}
+
+def reindex_document(db, collection, doc_id):
+    """Recompute the search keys of one stored document (after an update)"""
+    doc = db[collection].find_one({'_id': doc_id}, {field: 1 for field in SEARCH_FIELDS[collection]})
+    if doc:
+        db[collection].update_one({'_id': doc_id}, {'$set': search_fields(collection, doc)})
+
+def backfill(db, collections=None, batch_size=1000, missing_only=False):
+    """Recompute search keys for every document (missing_only: documents without any). Returns {collection: count}."""
+    counts = {}
+    query = {'search_keys': {'$exists': False}} if missing_only else {}
+    for collection in collections or SEARCH_FIELDS:
+        projection = {field: 1 for field in SEARCH_FIELDS[collection]}
+        ops = []
+        counts[collection] = 0
+        for doc in db[collection].find(query, projection):
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': search_fields(collection, doc)}))
+            if len(ops) >= batch_size:
+                db[collection].bulk_write(ops, ordered=False)
+                counts[collection] += len(ops)
+                ops = []
+        if ops:
+            db[collection].bulk_write(ops, ordered=False)
+            counts[collection] += len(ops)
+    return counts
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print(__doc__)
+        sys.exit(1)
+    from app import db
+
+    args = sys.argv[2:]
+    missing_only = '--missing' in args
+    collections = [arg for arg in args if arg != '--missing'] or None
+    for collection, count in backfill(db, collections, missing_only=missing_only).items():
+        print(f"{collection}: {count} documents indexed")
@@ -56,14 +56,45 @@ function loadCalendar() {
 
     // Load appointments and render calendar
     loadCalendarAppointments();
+    loadTodaySchedule();
 }
 
-// Load appointments for calendar
+// Local YYYY-MM-DD of a date (calendar cells are local midnights)
+function formatCalendarDate(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}-${month}-${day}`;
+}
+
+// First and last day shown by the current view
+function getCalendarRange() {
+    if (currentCalendarView === 'month') {
+        const year = currentCalendarDate.getFullYear();
+        const month = currentCalendarDate.getMonth();
+        return [new Date(year, month, 1), new Date(year, month + 1, 0)];
+    }
+    const startOfWeek = getStartOfWeek(currentCalendarDate);
+    const endOfWeek = new Date(startOfWeek);
+    endOfWeek.setDate(endOfWeek.getDate() + 6);
+    return [startOfWeek, endOfWeek];
+}
+
+// All appointments from start to end (inclusive)
+function fetchCalendarAppointments(start, end) {
+    return fetch(`${API_BASE}/appointments/calendar?start=${formatCalendarDate(start)}&end=${formatCalendarDate(end)}`)
+        .then(res => {
+            if (!res.ok) throw new Error(`HTTP ${res.status}`);
+            return res.json();
+        })
+        .then(data => data.appointments || []);
+}
+
+// Load appointments of the visible range and render calendar
 function loadCalendarAppointments() {
-    fetch(`${API_BASE}/appointments?limit=1000`)
-        .then(res => res.json())
-        .then(data => {
-            calendarAppointments = data.appointments || [];
+    const [start, end] = getCalendarRange();
+    fetchCalendarAppointments(start, end)
+        .then(appointments => {
+            calendarAppointments = appointments;
 
             // Assign colors to doctors
             assignDoctorColors();
@@ -71,9 +102,6 @@ function loadCalendarAppointments() {
             // Render calendar
             renderCalendar();
 
-            // Render today's schedule
-            renderTodaySchedule();
-
             // Render doctor legend
             renderDoctorLegend();
         })
@@ -84,6 +112,18 @@ function loadCalendarAppointments() {
         });
 }
 
+// Load today's schedule (independent of the visible range)
+function loadTodaySchedule() {
+    const today = new Date();
+    fetchCalendarAppointments(today, today)
+        .then(appointments => renderTodaySchedule(appointments))
+        .catch(err => {
+            console.error('Error loading today\'s schedule:', err);
+            document.getElementById('today-schedule').innerHTML =
+                '<div class="error-state"><p>Error loading appointments</p></div>';
+        });
+}
+
 // Assign colors to doctors
 function assignDoctorColors() {
     const doctors = new Set();
@@ -225,11 +265,14 @@ function renderWeekView() {
 }
 
 // Get appointments for a specific date
-function getAppointmentsForDate(date) {
-    const dateStr = date.toISOString().split('T')[0];
-    return calendarAppointments.filter(apt => {
+function getAppointmentsForDate(date, appointments = calendarAppointments) {
+    const dateStr = formatCalendarDate(date);
+    return appointments.filter(apt => {
         if (!apt.appointment_date) return false;
-        const aptDateStr = new Date(apt.appointment_date).toISOString().split('T')[0];
+        // 'YYYY-MM-DD' strings as stored, or HTTP dates for datetime values
+        const aptDateStr = /^\d{4}-\d{2}-\d{2}/.test(apt.appointment_date)
+            ? apt.appointment_date.slice(0, 10)
+            : new Date(apt.appointment_date).toISOString().split('T')[0];
         return aptDateStr === dateStr;
     });
 }
@@ -259,9 +302,9 @@ function renderDayAppointments(appointments) {
 }
 
 // Render today's schedule
-function renderTodaySchedule() {
+function renderTodaySchedule(appointments) {
     const today = new Date();
-    const todayAppointments = getAppointmentsForDate(today);
+    const todayAppointments = getAppointmentsForDate(today, appointments);
 
     const scheduleDiv = document.getElementById('today-schedule');
 
@@ -316,8 +359,7 @@ function navigateCalendar(direction) {
         currentCalendarDate.setDate(currentCalendarDate.getDate() + (direction * 7));
     }
 
-    renderCalendar();
-    renderTodaySchedule();
+    loadCalendarAppointments();
 }
 
 // Switch calendar view
@@ -330,7 +372,7 @@ function switchCalendarView(view) {
     });
     event.target.classList.add('active');
 
-    renderCalendar();
+    loadCalendarAppointments();
 }
 
 // Get start of week (Sunday)
@@ -360,6 +360,14 @@ function loadModule(moduleName, event) {
 // Make loadModule globally accessible
 window.loadModule = loadModule;
 
+// ==================== LOOKUPS ====================
+
+// Dropdown lists (active doctors, charge master, charge categories) from one compact request.
+// The response carries an ETag, so repeat calls are answered with 304 and served from cache.
+function loadLookups() {
+    return fetch(`${API_BASE}/bootstrap`, { credentials: 'include' }).then(r => r.json());
+}
+
 // ==================== DOCTORS MODULE ====================
 
 let currentDoctorsPage = 1;
@@ -604,14 +612,13 @@ function loadDoctorCharges(page = 1) {
 
     Promise.all([
         fetch(`${API_BASE}/doctor-charges?page=${page}&limit=${doctorChargesPageLimit}`).then(r => r.json()),
-        fetch(`${API_BASE}/doctors?limit=1000`).then(r => r.json()),
-        fetch(`${API_BASE}/charge-master?limit=1000`).then(r => r.json())
-    ]).then(([chargesResponse, doctorsResponse, chargeMasterResponse]) => {
+        loadLookups()
+    ]).then(([chargesResponse, lookups]) => {
         // Handle response format
         const charges = chargesResponse.charges || [];
         const total = chargesResponse.total !== undefined ? chargesResponse.total : charges.length;
-        const doctors = Array.isArray(doctorsResponse) ? doctorsResponse : (doctorsResponse.doctors || []);
-        const chargeMaster = Array.isArray(chargeMasterResponse) ? chargeMasterResponse : (chargeMasterResponse.charges || []);
+        const doctors = lookups.doctors || [];
+        const chargeMaster = lookups.charges || [];
 
         const html = `
             <div class="module-content">
@@ -1665,7 +1672,7 @@ function showCaseChargeForm(caseId, chargeId = null) {
             }
 
             return Promise.all([
-                fetch(`${API_BASE}/charge-master?limit=1000`, { credentials: 'include' }).then(r => r.json()),
+                loadLookups(),
                 fetch(`${API_BASE}/doctors`, { credentials: 'include' }).then(r => r.json()),
                 caseData
             ]);
@@ -1737,7 +1744,7 @@ function showCaseChargeForm(caseId, chargeId = null) {
             if (chargeId) {
                 Promise.all([
                     fetch(`${API_BASE}/case-charges/${chargeId}`).then(r => r.json()),
-                    fetch(`${API_BASE}/charge-master?limit=1000`).then(r => r.json())
+                    loadLookups()
                 ]).then(([charge, chargeMasterResponse]) => {
                     // Populate form fields
                     Object.keys(charge).forEach(key => {
@@ -1941,12 +1948,9 @@ function deleteCaseCharge(id, caseId) {
 }
 
 function showCaseDoctorChargeForm(caseId, chargeId = null) {
-    Promise.all([
-        fetch(`${API_BASE}/doctors?limit=1000`, { credentials: 'include' }).then(r => r.json()),
-        fetch(`${API_BASE}/charge-master?limit=1000`, { credentials: 'include' }).then(r => r.json())
-    ]).then(([doctorsData, chargeMasterData]) => {
-        const doctors = doctorsData.doctors || doctorsData;
-        let chargeMaster = chargeMasterData.charges || chargeMasterData;
+    loadLookups().then((lookups) => {
+        const doctors = lookups.doctors || [];
+        let chargeMaster = lookups.charges || [];
 
         // Filter for DOCTOR category and Sort by Name Ascending
         chargeMaster = chargeMaster.filter(c =>
@@ -2204,7 +2208,7 @@ let selectedPatientName = '';
 
 function showAppointmentForm(appointmentId = null) {
     Promise.all([
-        fetch(`${API_BASE}/doctors?limit=1000`).then(r => r.json())
+        loadLookups()
     ]).then(([doctorsResponse]) => {
         const doctors = Array.isArray(doctorsResponse) ? doctorsResponse : (doctorsResponse.doctors || []);
 
@@ -2767,10 +2771,9 @@ function showPrescriptionUploadForm(caseId) {
             document.body.insertAdjacentHTML('beforeend', html);
 
             // Load doctors
-            fetch(`${API_BASE}/doctors?limit=1000`)
-                .then(res => res.json())
+            loadLookups()
                 .then(data => {
-                    const doctors = Array.isArray(data) ? data : (data.doctors || []);
+                    const doctors = data.doctors || [];
                     const doctorSelect = document.getElementById('prescriptionDoctorSelect');
                     if (doctorSelect) {
                         doctorSelect.innerHTML = '<option value="">Select Doctor</option>' +
@@ -4062,7 +4065,7 @@ function loadChargeMaster() {
 function showChargeMasterForm(chargeId = null) {
     Promise.all([
         chargeId ? fetch(`${API_BASE}/charge-master/${chargeId}`).then(res => res.json()) : Promise.resolve(null),
-        fetch(`${API_BASE}/charge-category-master`).then(res => res.json())
+        loadLookups().then(lookups => lookups.categories)
     ]).then(([charge, categories]) => {
         const title = chargeId ? 'Edit Charge' : 'Add Charge';
         const categoryOptions = Array.isArray(categories) ? categories.map(c => `<option value="${c.name || ''}">`).join('') : '';
@@ -4364,7 +4367,7 @@ function updatePayoutStatus(payoutId, status) {
     // If status is 'paid' or 'partial_paid', show payment form
     if (status === 'paid' || status === 'partial_paid') {
         // Get the payout record to get doctor_charge_amount
-        fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000`)
+        fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000&charge_details=0`)
             .then(res => res.json())
             .then(data => {
                 const payout = data.payouts?.find(p => p.id === payoutId);
@@ -4503,7 +4506,7 @@ function savePayment(event, payoutId, doctorChargeAmount, targetStatus) {
         }
 
         // Get existing partial amount from the payout record
-        fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000`)
+        fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000&charge_details=0`)
             .then(res => res.json())
             .then(data => {
                 const payout = data.payouts?.find(p => p.id === payoutId);
@@ -4576,7 +4579,7 @@ function viewPayoutCase(caseId) {
 function showPayoutForm(payoutId = null) {
     Promise.all([
         fetch(`${API_BASE}/cases?limit=1000`).then(r => r.json()),
-        fetch(`${API_BASE}/doctors?limit=1000`).then(r => r.json())
+        loadLookups()
     ]).then(([casesResponse, doctorsResponse]) => {
         const cases = Array.isArray(casesResponse) ? casesResponse : (casesResponse.cases || []);
         const doctors = Array.isArray(doctorsResponse) ? doctorsResponse : (doctorsResponse.doctors || []);
@@ -4651,7 +4654,7 @@ function showPayoutForm(payoutId = null) {
 
         if (payoutId) {
             // Load payout data for editing
-            fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000`)
+            fetch(`${API_BASE}/payouts?case_id=&doctor_id=&payment_status=&page=1&limit=1000&charge_details=0`)
                 .then(res => res.json())
                 .then(data => {
                     const payout = data.payouts?.find(p => p.id === payoutId);
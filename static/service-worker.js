@@ -1,5 +1,5 @@
 // Service Worker for Hospital Management System PWA
-const CACHE_NAME = 'hospital-management-v1';
+const CACHE_NAME = 'hospital-management-v4';
 const RUNTIME_CACHE = 'hospital-runtime-v1';
 
 // Assets to cache on install
@@ -54,36 +54,7 @@ self.addEventListener('fetch', (event) => {
 
   // Handle API requests with network-first strategy
   if (event.request.url.includes('/api/')) {
-    event.respondWith(
-      fetch(event.request)
-        .then((response) => {
-          // Clone the response
-          const responseToCache = response.clone();
-          // Cache successful API responses
-          if (response.status === 200) {
-            caches.open(RUNTIME_CACHE).then((cache) => {
-              cache.put(event.request, responseToCache);
-            });
-          }
-          return response;
-        })
-        .catch(() => {
-          // Network failed, try cache
-          return caches.match(event.request).then((cachedResponse) => {
-            if (cachedResponse) {
-              return cachedResponse;
-            }
-            // Return offline response for API calls
-            return new Response(
-              JSON.stringify({ error: 'You are offline. Please check your connection.' }),
-              {
-                headers: { 'Content-Type': 'application/json' },
-                status: 503
-              }
-            );
-          });
-        })
-    );
+    event.respondWith(fetchApi(event.request));
     return;
   }
 
@@ -116,3 +87,44 @@ self.addEventListener('fetch', (event) => {
       })
   );
 });
+
+// Network-first for API calls. A cached response with an ETag (the reference lists)
+// is revalidated with If-None-Match, and a 304 is answered from the cache.
+function fetchApi(request) {
+  return caches.open(RUNTIME_CACHE).then((cache) => {
+    return cache.match(request).then((cachedResponse) => {
+      const etag = cachedResponse && cachedResponse.headers.get('ETag');
+      let networkRequest = request;
+      if (etag) {
+        const headers = new Headers(request.headers);
+        headers.set('If-None-Match', etag);
+        networkRequest = new Request(request, { headers });
+      }
+      return fetch(networkRequest)
+        .then((response) => {
+          if (response.status === 304 && cachedResponse) {
+            return cachedResponse;
+          }
+          // Cache successful API responses
+          if (response.status === 200) {
+            cache.put(request, response.clone());
+          }
+          return response;
+        })
+        .catch(() => {
+          // Network failed, try cache
+          if (cachedResponse) {
+            return cachedResponse;
+          }
+          // Return offline response for API calls
+          return new Response(
+            JSON.stringify({ error: 'You are offline. Please check your connection.' }),
+            {
+              headers: { 'Content-Type': 'application/json' },
+              status: 503
+            }
+          );
+        });
+    });
+  });
+}
@@ -0,0 +1,39 @@
+import unittest
+import time
+from app import db
+from activity_log import ActivityLogWriter
+
+class TestActivityLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.collection = db.verify_activity_logs
+        self.collection.delete_many({})
+
+    def tearDown(self):
+        self.collection.drop()
+
+    def test_flushes_on_interval(self):
+        writer = ActivityLogWriter(self.collection, batch_size=100, flush_interval=0.1)
+        for i in range(5):
+            writer.write({'i': i})
+        time.sleep(0.5)
+        self.assertEqual(self.collection.count_documents({}), 5)
+        writer.close()
+
+    def test_flushes_full_batches_and_on_close(self):
+        writer = ActivityLogWriter(self.collection, batch_size=10, flush_interval=60)
+        for i in range(25):
+            writer.write({'i': i})
+        writer.close()
+        self.assertEqual(self.collection.count_documents({}), 25)
+        self.assertEqual(writer.stats()['written'], 25)
+
+    def test_drops_instead_of_blocking_when_full(self):
+        writer = ActivityLogWriter(self.collection, queue_size=5, batch_size=100, flush_interval=60)
+        writer._ensure_thread = lambda: None  # nothing drains the queue
+        for i in range(8):
+            writer.write({'i': i})
+        self.assertEqual(writer.stats()['dropped'], 3)
+        self.assertEqual(writer.stats()['queued'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+
+import unittest
+import json
+import uuid
+from datetime import datetime
+from app import app, db, parse_object_id, serialize_doc, build_case_detail
+
+def legacy_case_detail(case_id):
+    """Reference implementation: the per-row find_one version of GET /api/cases/<id>"""
+    case = db.cases.find_one({'_id': case_id})
+    if not case:
+        return None
+
+    if 'patient_id' in case:
+        patient_id_obj = case['patient_id']
+        if isinstance(patient_id_obj, str):
+            patient_id_obj = parse_object_id(patient_id_obj)
+        if patient_id_obj:
+            patient = db.patients.find_one({'_id': patient_id_obj})
+            if patient:
+                case['patient'] = serialize_doc(patient)
+
+    if 'referred_by_id' in case and 'referred_by_type' in case and case['referred_by_id']:
+        referred_by_id_obj = case['referred_by_id']
+        if isinstance(referred_by_id_obj, str):
+            referred_by_id_obj = parse_object_id(referred_by_id_obj)
+        if referred_by_id_obj:
+            if case['referred_by_type'] == 'patient':
+                referred_by = db.patients.find_one({'_id': referred_by_id_obj})
+            else:
+                referred_by = db.doctors.find_one({'_id': referred_by_id_obj})
+            if referred_by:
+                case['referred_by_name'] = referred_by.get('name', '')
+
+    all_charges = list(db.case_charges.find({'case_id': case_id}).sort('created_at', -1))
+    hospital_charges = []
+    pathology_charges = []
+    pharmacy_charges = []
+    new_doctor_charges = []
+    for charge in all_charges:
+        ctype = charge.get('charge_type', 'hospital')
+        if 'charge_master_id' in charge:
+            charge_master = db.charge_master.find_one({'_id': charge['charge_master_id']})
+            if charge_master:
+                charge['charge_name'] = charge_master.get('name', '')
+        if 'doctor_id' in charge:
+            doctor = db.doctors.find_one({'_id': charge['doctor_id']})
+            if doctor:
+                charge['doctor_name'] = doctor.get('name', '')
+        if charge.get('is_doctor_charge'):
+            charge['amount'] = charge.get('total_amount', 0)
+            charge['date'] = charge.get('charge_date')
+            new_doctor_charges.append(charge)
+        elif ctype == 'pathology':
+            pathology_charges.append(charge)
+        elif ctype == 'pharmacy':
+            pharmacy_charges.append(charge)
+        else:
+            hospital_charges.append(charge)
+    case['charges'] = serialize_doc(hospital_charges)
+    case['pathology_charges'] = serialize_doc(pathology_charges)
+    case['pharmacy_charges'] = serialize_doc(pharmacy_charges)
+
+    case_doctor_charges = list(db.case_doctor_charges.find({'case_id': case_id}))
+    for charge in case_doctor_charges:
+        if 'doctor_id' in charge:
+            doctor = db.doctors.find_one({'_id': charge['doctor_id']})
+            if doctor:
+                charge['doctor_name'] = doctor.get('name', '')
+    case['doctor_charges'] = serialize_doc(case_doctor_charges + new_doctor_charges)
+
+    case_appointments = list(db.appointments.find({'case_id': case_id}))
+    for apt in case_appointments:
+        if 'patient_id' in apt:
+            patient = db.patients.find_one({'_id': apt['patient_id']})
+            if patient:
+                apt['patient_name'] = patient.get('name', '')
+        if 'doctor_id' in apt:
+            doctor = db.doctors.find_one({'_id': apt['doctor_id']})
+            if doctor:
+                apt['doctor_name'] = doctor.get('name', '')
+    case['appointments'] = serialize_doc(case_appointments)
+
+    case_prescriptions = list(db.prescriptions.find({'case_id': case_id}).sort('created_at', -1))
+    for pres in case_prescriptions:
+        if 'patient_id' in pres and pres['patient_id']:
+            patient = db.patients.find_one({'_id': pres['patient_id']})
+            if patient:
+                pres['patient_name'] = patient.get('name', '')
+        if 'doctor_id' in pres and pres['doctor_id']:
+            doctor = db.doctors.find_one({'_id': pres['doctor_id']})
+            if doctor:
+                pres['doctor_name'] = doctor.get('name', '')
+    case['prescriptions'] = serialize_doc(case_prescriptions)
+
+    case_studies = list(db.case_studies.find({'case_id': case_id}).sort('created_at', -1))
+    for study in case_studies:
+        if 'doctor_id' in study and study['doctor_id']:
+            doctor = db.doctors.find_one({'_id': study['doctor_id']})
+            if doctor:
+                study['doctor_name'] = doctor.get('name', '')
+    case['case_studies'] = serialize_doc(case_studies)
+
+    return serialize_doc(case)
+
+def as_json(payload):
+    """Normalize through the app's JSON provider, like jsonify does"""
+    return json.loads(app.json.dumps(payload))
+
+class TestCaseDetailEngine(unittest.TestCase):
+    COLLECTIONS = ['patients', 'doctors', 'charge_master', 'cases', 'case_charges',
+                   'case_doctor_charges', 'appointments', 'prescriptions', 'case_studies']
+
+    def setUp(self):
+        self.tag = f"fixture_{uuid.uuid4().hex}"
+        now = datetime.now()
+
+        def insert(collection, doc):
+            doc['fixture_tag'] = self.tag
+            return db[collection].insert_one(doc).inserted_id
+
+        patient_id = insert('patients', {'name': 'Fixture Patient', 'phone': '5550001111', 'created_at': now})
+        referrer_id = insert('patients', {'name': 'Fixture Referrer', 'created_at': now})
+        doctor_id = insert('doctors', {'name': 'Dr Fixture', 'specialization': 'General', 'created_at': now})
+        consult_id = insert('charge_master', {'name': 'Fixture Consultation', 'category': 'Consultation', 'amount': 500})
+        cbc_id = insert('charge_master', {'name': 'Fixture CBC', 'category': 'Pathology', 'amount': 300})
+
+        # Case 1: ObjectId patient, doctor referrer, one charge of every kind
+        self.case_ids = [insert('cases', {
+            'patient_id': patient_id, 'case_number': f'FIX-{self.tag[-6:]}-1', 'case_type': 'IPD',
+            'referred_by_type': 'doctor', 'referred_by_id': doctor_id, 'discount': 100, 'created_at': now
+        })]
+        case_id = self.case_ids[0]
+        insert('case_charges', {'case_id': case_id, 'charge_master_id': consult_id, 'doctor_id': doctor_id,
+                                'quantity': 2, 'unit_amount': 500.0, 'total_amount': 1000.0,
+                                'charge_type': 'hospital', 'created_at': datetime(2026, 1, 5, 10)})
+        insert('case_charges', {'case_id': case_id, 'charge_master_id': cbc_id, 'quantity': 1,
+                                'total_amount': 300.0, 'charge_type': 'pathology', 'created_at': datetime(2026, 1, 5, 11)})
+        insert('case_charges', {'case_id': case_id, 'charge_name': 'Tablets', 'quantity': 3,
+                                'total_amount': 90.0, 'charge_type': 'pharmacy', 'created_at': datetime(2026, 1, 5, 12)})
+        insert('case_charges', {'case_id': case_id, 'charge_master_id': consult_id, 'doctor_id': doctor_id,
+                                'charge_name': 'Stored Name', 'total_amount': 400.0, 'charge_type': 'Consultation',
+                                'is_doctor_charge': True, 'charge_date': '2026-01-05', 'created_at': datetime(2026, 1, 5, 13)})
+        insert('case_charges', {'case_id': case_id, 'charge_master_id': parse_object_id('0' * 24),
+                                'doctor_id': None, 'total_amount': 10.0, 'created_at': datetime(2026, 1, 5, 14)})
+        insert('case_doctor_charges', {'case_id': case_id, 'doctor_id': doctor_id, 'amount': 150, 'charge_name': 'Legacy'})
+        insert('appointments', {'case_id': case_id, 'patient_id': patient_id, 'doctor_id': doctor_id,
+                                'appointment_date': '2026-01-08', 'appointment_time': '10:00', 'created_at': now})
+        insert('appointments', {'case_id': case_id, 'patient_id': patient_id, 'created_at': now})
+        insert('prescriptions', {'case_id': case_id, 'patient_id': patient_id, 'doctor_id': None,
+                                 'medications': 'Paracetamol', 'created_at': now})
+        insert('case_studies', {'case_id': case_id, 'doctor_id': doctor_id, 'study_title': 'X-Ray',
+                                'details': 'Normal', 'created_at': now})
+
+        # Case 2: string patient_id, patient referrer, no children
+        self.case_ids.append(insert('cases', {
+            'patient_id': str(patient_id), 'case_number': f'FIX-{self.tag[-6:]}-2', 'case_type': 'OPD',
+            'referred_by_type': 'patient', 'referred_by_id': str(referrer_id), 'created_at': now
+        }))
+
+        # Case 3: no patient, empty referrer
+        self.case_ids.append(insert('cases', {'case_number': f'FIX-{self.tag[-6:]}-3', 'referred_by_id': '',
+                                              'referred_by_type': 'doctor', 'created_at': now}))
+
+    def tearDown(self):
+        for collection in self.COLLECTIONS:
+            db[collection].delete_many({'fixture_tag': self.tag})
+
+    def test_fixture_cases_match_legacy(self):
+        for case_id in self.case_ids:
+            with self.subTest(case_id=str(case_id)):
+                self.assertEqual(as_json(build_case_detail(case_id)), as_json(legacy_case_detail(case_id)))
+
+    def test_recent_cases_match_legacy(self):
+        for case in db.cases.find({}, {'_id': 1}).sort('created_at', -1).limit(20):
+            with self.subTest(case_id=str(case['_id'])):
+                self.assertEqual(as_json(build_case_detail(case['_id'])), as_json(legacy_case_detail(case['_id'])))
+
+    def test_missing_case(self):
+        self.assertIsNone(build_case_detail(parse_object_id('0' * 24)))
+        self.assertIsNone(build_case_detail(None))
+
+if __name__ == '__main__':
+    unittest.main()
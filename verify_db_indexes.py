@@ -0,0 +1,24 @@
+
+import unittest
+from app import db
+from db_indexes import ensure_indexes, index_report, check_query_plans
+
+class TestDbIndexes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        ensure_indexes(db)
+
+    def test_ensure_is_idempotent(self):
+        self.assertEqual(ensure_indexes(db), [])
+
+    def test_no_missing_indexes(self):
+        self.assertEqual(index_report(db)['missing'], [])
+
+    def test_hot_query_plans(self):
+        for result in check_query_plans(db):
+            with self.subTest(query=result['query']):
+                self.assertFalse(result['collscan'], f"{result['collection']}: {result['query']} does a collection scan")
+                self.assertIn(result['expected_index'], result['used_indexes'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+
+import unittest
+import json
+import time
+import uuid
+from datetime import datetime
+from app import app, db
+
+def legacy_patient_breakdown(year, month):
+    """Reference implementation: the per-case query version of GET /api/dashboard/monthly-report (patients only)"""
+    month_start = datetime(year, month, 1)
+    month_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    in_month = {'$gte': month_start, '$lt': month_end}
+
+    admitted = [c['_id'] for c in db.cases.find({'admission_date': in_month}, {'_id': 1})]
+    paid = {p['case_id'] for p in db.payments.find({'payment_date': in_month}) if p.get('case_id')}
+    all_cases = list(db.cases.find({'_id': {'$in': list(set(admitted) | paid)}}).sort('_id', 1))
+
+    patient_data = {}
+    for case in all_cases:
+        patient = db.patients.find_one({'_id': case.get('patient_id')})
+        if not patient:
+            continue
+        name = patient.get('name', 'Unknown')
+        entry = patient_data.setdefault(name, {
+            'patient_id': str(case.get('patient_id')), 'patient_name': name, 'num_cases': 0,
+            'total_payments': 0, 'total_charges': 0, 'total_discounts': 0,
+            'consultation_charges': 0, 'medical_charges': 0, 'pathology_charges': 0, 'pharmacy_charges': 0,
+            'injection_charges': 0, 'daycare_charges': 0, 'doctor_charges': 0, 'general_charges': 0,
+            'nursing_charges': 0, 'other_charges': 0, 'case_ids': [], 'admission_dates': []
+        })
+        entry['num_cases'] += 1
+        entry['case_ids'].append(str(case['_id']))
+        admission_date = case.get('admission_date')
+        if admission_date:
+            if isinstance(admission_date, str):
+                entry['admission_dates'].append({'date': admission_date, 'is_old': False})
+            else:
+                entry['admission_dates'].append({'date': admission_date.strftime('%d-%b-%Y'),
+                                                 'is_old': admission_date < month_start})
+        entry['total_discounts'] += float(case.get('discount', 0) or 0)
+
+        for payment in db.payments.find({'case_id': case['_id'], 'payment_date': in_month}):
+            entry['total_payments'] += float(payment.get('amount', 0) or 0)
+
+        for charge in db.case_charges.find({'case_id': case['_id'], 'created_at': in_month}):
+            amount = float(charge.get('total_amount', 0) or 0)
+            ctype = (charge.get('charge_type') or 'hospital').lower()
+            entry['total_charges'] += amount
+            bucket = None
+            cm = db.charge_master.find_one({'_id': charge['charge_master_id']}) if charge.get('charge_master_id') else None
+            if cm:
+                name_l = (cm.get('name') or '').lower()
+                cat = (cm.get('category') or '').lower()
+                ccat = (cm.get('charge_category') or '').lower()
+                if 'consultation' in cat or 'consultation' in ccat or ctype == 'consultation':
+                    bucket = 'consultation_charges'
+                elif 'pathology' in cat or 'pathology' in ccat or ctype == 'pathology':
+                    bucket = 'pathology_charges'
+                elif 'pharmacy' in cat or 'pharmacy' in ccat or ctype == 'pharmacy':
+                    bucket = 'pharmacy_charges'
+                elif 'injection' in cat or 'injection' in ccat:
+                    bucket = 'injection_charges'
+                elif 'daycare' in cat or 'daycare' in ccat or 'day care' in cat:
+                    bucket = 'daycare_charges'
+                elif 'nursing' in name_l or 'nursing' in cat:
+                    bucket = 'nursing_charges'
+                elif charge.get('is_doctor_charge') or 'doctor' in cat or 'doctor' in ccat or ctype == 'doctor' or 'opd_inhouse_doc' in ctype:
+                    bucket = 'doctor_charges'
+                elif 'medical' in cat or 'medical' in ccat:
+                    bucket = 'medical_charges'
+                elif 'general' in cat or 'general' in ccat:
+                    bucket = 'general_charges'
+            if not bucket:
+                if charge.get('is_doctor_charge') or ctype == 'doctor' or 'opd_inhouse_doc' in ctype:
+                    bucket = 'doctor_charges'
+                elif ctype in ('pharmacy', 'pathology', 'consultation'):
+                    bucket = f'{ctype}_charges'
+                else:
+                    bucket = 'other_charges'
+            entry[bucket] += amount
+
+        for charge in db.case_doctor_charges.find({'case_id': case['_id'], 'created_at': in_month}):
+            amount = float(charge.get('amount', 0) or 0)
+            entry['doctor_charges'] += amount
+            entry['total_charges'] += amount
+    return patient_data
+
+def rounded(patients):
+    """Order-independent, float-tolerant view of a patient list"""
+    return {p['patient_name']: {k: round(v, 2) if isinstance(v, float) else v for k, v in p.items()} for p in patients}
+
+class TestMonthlyReportEngine(unittest.TestCase):
+    COLLECTIONS = ['patients', 'charge_master', 'cases', 'case_charges', 'case_doctor_charges', 'payments']
+
+    def setUp(self):
+        self.tag = f"fixture_{uuid.uuid4().hex}"
+        self.client = app.test_client()
+
+        def insert(collection, doc):
+            doc['fixture_tag'] = self.tag
+            return db[collection].insert_one(doc).inserted_id
+
+        self.insert = insert
+        patient_id = insert('patients', {'name': f'Monthly Fixture {self.tag[-6:]}'})
+        consult_id = insert('charge_master', {'name': 'Fixture Consultation', 'category': 'Consultation'})
+        nursing_id = insert('charge_master', {'name': 'Fixture Nursing Care', 'category': 'Ward'})
+        self.case_id = insert('cases', {'patient_id': patient_id, 'case_number': f'FIX-{self.tag[-6:]}',
+                                        'admission_date': datetime(2031, 3, 4), 'discount': 50})
+        self.old_case_id = insert('cases', {'patient_id': patient_id, 'case_number': f'FIX-{self.tag[-6:]}-OLD',
+                                            'admission_date': datetime(2031, 1, 10)})
+        insert('case_charges', {'case_id': self.case_id, 'charge_master_id': consult_id, 'total_amount': 500.0,
+                                'charge_type': 'hospital', 'created_at': datetime(2031, 3, 4, 10)})
+        insert('case_charges', {'case_id': self.case_id, 'charge_master_id': nursing_id, 'total_amount': 200.0,
+                                'charge_type': 'hospital', 'created_at': datetime(2031, 3, 5, 10)})
+        insert('case_charges', {'case_id': self.case_id, 'total_amount': 90.0, 'charge_type': 'Pharmacy',
+                                'created_at': datetime(2031, 3, 6, 10)})
+        insert('case_charges', {'case_id': self.case_id, 'total_amount': 999.0, 'created_at': datetime(2031, 4, 1, 10)})
+        insert('case_doctor_charges', {'case_id': self.case_id, 'amount': 150, 'created_at': datetime(2031, 3, 7)})
+        insert('payments', {'case_id': self.case_id, 'amount': 300.0, 'payment_date': datetime(2031, 3, 8)})
+        insert('payments', {'case_id': self.old_case_id, 'amount': 100.0, 'payment_date': datetime(2031, 3, 9)})
+
+    def tearDown(self):
+        for collection in self.COLLECTIONS:
+            db[collection].delete_many({'fixture_tag': self.tag})
+        db.monthly_report_rows.delete_many({'period': '2031-03'})
+        db.monthly_report_snapshots.delete_one({'_id': '2031-03'})
+
+    def report(self, year, month, refresh=False):
+        url = f'/api/dashboard/monthly-report?year={year}&month={month}' + ('&refresh=1' if refresh else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def test_fixture_month_matches_legacy(self):
+        report = self.report(2031, 3, refresh=True)
+        self.assertEqual(rounded(report['patients']), rounded(legacy_patient_breakdown(2031, 3).values()))
+        patient = report['patients'][0]
+        self.assertEqual(patient['num_cases'], 2)
+        self.assertEqual(patient['consultation_charges'], 500)
+        self.assertEqual(patient['nursing_charges'], 200)
+        self.assertEqual(patient['pharmacy_charges'], 90)
+        self.assertEqual(patient['doctor_charges'], 150)
+        self.assertEqual(patient['total_payments'], 400)
+
+    def test_snapshot_refreshes_incrementally(self):
+        self.report(2031, 3, refresh=True)
+        built_at = db.monthly_report_snapshots.find_one({'_id': '2031-03'})['built_at']
+
+        # Writes through the API update the stored snapshot without a rebuild
+        response = self.client.post('/api/payments', json={'case_id': str(self.case_id), 'amount': 25,
+                                                           'payment_date': '2031-03-20'})
+        self.assertEqual(response.status_code, 201)
+        db.payments.update_many({'case_id': self.case_id, 'fixture_tag': {'$exists': False}}, {'$set': {'fixture_tag': self.tag}})
+
+        report = self.report(2031, 3)
+        self.assertEqual(db.monthly_report_snapshots.find_one({'_id': '2031-03'})['built_at'], built_at)
+        self.assertEqual(rounded(report['patients']), rounded(legacy_patient_breakdown(2031, 3).values()))
+
+    def test_recent_months_match_legacy(self):
+        now = datetime.now()
+        for offset in range(3):
+            month, year = (now.month - offset - 1) % 12 + 1, now.year - (1 if now.month - offset < 1 else 0)
+            with self.subTest(period=f'{year}-{month:02d}'):
+                started = time.perf_counter()
+                report = self.report(year, month, refresh=True)
+                elapsed = time.perf_counter() - started
+                print(f"{year}-{month:02d}: {report['summary']['total_cases']} cases rebuilt in {elapsed:.3f}s")
+                self.assertEqual(rounded(report['patients']), rounded(legacy_patient_breakdown(year, month).values()))
+
+                started = time.perf_counter()
+                self.report(year, month)
+                print(f"{year}-{month:02d}: served from snapshot in {time.perf_counter() - started:.3f}s")
+
+if __name__ == '__main__':
+    unittest.main()
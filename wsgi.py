@@ -0,0 +1,14 @@
+"""
+WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker imports this module after fork, so its MongoClient and
+background threads are created in the worker itself. create_app() returns
+at once and warms up in the background; /api/health answers 503 until the
+worker is ready.
+"""
+
+from app import create_app
+
+app = create_app()